@@ -201,4 +201,42 @@ router.post('/update-canvas', async (req, res) => {
   }
 });
 
+// Update the canvas state of several sessions in one request
+router.post('/update-canvas-batch', async (req, res) => {
+  try {
+    const { updates } = req.body;
+    
+    if (!Array.isArray(updates) || updates.length === 0) {
+      return res.status(400).json({ success: false, message: 'A non-empty updates array is required' });
+    }
+    
+    if (updates.some(update => !update.sessionId)) {
+      return res.status(400).json({ success: false, message: 'Session ID is required for every update' });
+    }
+    
+    const operations = updates.map(({ sessionId, canvasData, isDrawingLayer }) => ({
+      updateOne: {
+        filter: { sessionId },
+        update: {
+          $set: {
+            [isDrawingLayer ? 'drawingLayerData' : 'canvasData']: canvasData,
+            lastUpdated: Date.now()
+          }
+        }
+      }
+    }));
+    
+    const result = await Session.bulkWrite(operations, { ordered: false });
+    
+    res.status(200).json({
+      success: true,
+      message: 'Canvas states updated successfully',
+      matched: result.matchedCount
+    });
+  } catch (error) {
+    console.error('Error updating canvas states:', error);
+    res.status(500).json({ success: false, message: error.message });
+  }
+});
+
 module.exports = router;
\ No newline at end of file
@@ -16,7 +16,8 @@ app.use(cors({
   methods: ['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
   allowedHeaders: ['Content-Type', 'Authorization', 'x-auth-token']
 }));
-app.use(bodyParser.json());
+// Canvas snapshots are sent as base64 PNGs, several at a time by the batch update route
+app.use(bodyParser.json({ limit: process.env.JSON_BODY_LIMIT || '10mb' }));
 
 // Express session
 app.use(session({
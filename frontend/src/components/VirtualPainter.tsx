@@ -10,6 +10,28 @@ interface DrawAction {
   timestamp: number;
 }
 
+// Binary frame protocol understood by the Python server (see python/frame_protocol.py):
+// version (u8), message type (u8), session id length (u8), sequence (u32 BE), session id, JPEG bytes
+const FRAME_PROTOCOL_VERSION = 1;
+const FRAME_MESSAGE_TYPE = 1;
+const frameHeaderEncoder = new TextEncoder();
+
+const buildFrameHeader = (sessionId: string, sequence: number): ArrayBuffer => {
+  const sessionBytes = frameHeaderEncoder.encode(sessionId);
+  const header = new ArrayBuffer(7 + sessionBytes.length);
+  const view = new DataView(header);
+  view.setUint8(0, FRAME_PROTOCOL_VERSION);
+  view.setUint8(1, FRAME_MESSAGE_TYPE);
+  view.setUint8(2, sessionBytes.length);
+  view.setUint32(3, sequence >>> 0);
+  new Uint8Array(header, 7).set(sessionBytes);
+  return header;
+};
+
+// Canvas snapshot codecs we can display straight from a data URL, in order of preference
+// (see python/canvas_codecs.py). Lossless WebP is several times smaller than PNG.
+const SNAPSHOT_CODECS = ['webp', 'png'];
+
 // Interface for VirtualPainter props
 interface VirtualPainterProps {
   onSessionUpdate?: (isInSession: boolean, currentSessionId: string, hostStatus: boolean) => void;
@@ -47,6 +69,10 @@ const VirtualPainter = ({ onSessionUpdate, downloadRef }: VirtualPainterProps) =
   const [selectedColor, setSelectedColor] = useState('#000000');
   const requestRef = useRef<number | null>(null);
   const [frameRate, setFrameRate] = useState(5); // frames per second - increased default
+  const [serverMaxFps, setServerMaxFps] = useState<number | null>(null); // Rate limit requested by the server's flow control
+  const effectiveFrameRate = serverMaxFps ? Math.min(frameRate, serverMaxFps) : frameRate;
+  const frameSequenceRef = useRef<number>(0); // Sequence number for binary frame messages
+  const canvasSeqRef = useRef<number | null>(null); // Sequence number of the last canvas change received
   
   // Session management states
   const [sessionId, setSessionId] = useState(() => {
@@ -574,7 +600,8 @@ const handleMouseLeave = () => {
         ws.send(JSON.stringify({
           type: 'join_session',
           session_id: sessionId,
-          user_name: userName
+          user_name: userName,
+          codecs: SNAPSHOT_CODECS
         }));
       }
     };
@@ -604,6 +631,19 @@ const handleMouseLeave = () => {
         const data = JSON.parse(event.data);
         console.log('Received WebSocket message:', data.type);
         
+        // Canvas changes carry sequence numbers; request a full keyframe if any were missed
+        if (typeof data.seq === 'number') {
+          if (data.keyframe || data.type === 'session_created' || data.type === 'session_joined') {
+            canvasSeqRef.current = data.seq;
+          } else {
+            if (canvasSeqRef.current !== null && data.seq > canvasSeqRef.current + 1) {
+              console.log(`Missed canvas updates (${canvasSeqRef.current} -> ${data.seq}), requesting keyframe`);
+              ws.send(JSON.stringify({ type: 'request_keyframe' }));
+            }
+            canvasSeqRef.current = Math.max(canvasSeqRef.current ?? 0, data.seq);
+          }
+        }
+        
         // Various gesture-related message types are handled outside the switch
         if (data.type === "hand_position") {
           // Update cursor position with smoothing
@@ -826,6 +866,50 @@ const handleMouseLeave = () => {
                 }
               };
               img.src = data.canvas;
+            } else if (Array.isArray(data.patches)) {
+              // Partial update: only the tiles that changed since the last flush
+              data.patches.forEach((patch: { x: number, y: number, data: string }) => {
+                const img = new Image();
+                img.onload = () => {
+                  if (canvasRef.current) {
+                    const ctx = canvasRef.current.getContext('2d');
+                    if (ctx) ctx.drawImage(img, patch.x, patch.y);
+                  }
+                };
+                img.src = patch.data;
+              });
+            }
+            break;
+            
+          case 'stroke':
+            // Server-side gesture stroke: replay the segment instead of reloading the whole canvas
+            if (canvasRef.current) {
+              const ctx = canvasRef.current.getContext('2d');
+              if (ctx) {
+                ctx.strokeStyle = data.color;
+                ctx.lineWidth = data.size;
+                ctx.lineCap = 'round';
+                ctx.beginPath();
+                ctx.moveTo(data.start.x, data.start.y);
+                if (Array.isArray(data.points)) {
+                  // Smoothed segments come as a polyline of [x, y] points from start to end
+                  data.points.slice(1).forEach(([x, y]: [number, number]) => ctx.lineTo(x, y));
+                } else {
+                  ctx.lineTo(data.end.x, data.end.y);
+                }
+                ctx.stroke();
+              }
+            }
+            break;
+            
+          case 'stroke_ack':
+            // Only carries the sequence number of our own mouse stroke
+            break;
+            
+          case 'flow_control':
+            // The server can't process frames faster than this; older frames would just be dropped
+            if (typeof data.max_fps === 'number' && data.max_fps > 0) {
+              setServerMaxFps(data.max_fps);
             }
             break;
             
@@ -893,7 +977,8 @@ const handleMouseLeave = () => {
       wsConnection.send(JSON.stringify({
         type: 'join_session',
         session_id: storedSessionId,
-        user_name: storedUserName
+        user_name: storedUserName,
+        codecs: SNAPSHOT_CODECS
       }));
       console.log('Reconnection attempt sent with session ID:', storedSessionId);
     } else {
@@ -1184,7 +1269,7 @@ const handleMouseLeave = () => {
       // Skip frame sending if mouse drawing is enabled
       if (isMouseDrawing) {
         // Still keep the loop going, just don't send frames
-        const frameInterval = 1000 / frameRate;
+        const frameInterval = 1000 / effectiveFrameRate;
         requestRef.current = requestAnimationFrame(() => {
           setTimeout(sendFrame, frameInterval);
         });
@@ -1220,15 +1305,6 @@ const handleMouseLeave = () => {
           // Reset transform
           ctx.setTransform(1, 0, 0, 1, 0, 0);
           
-          // Reduce quality to improve performance and reduce bandwidth
-          const frame = canvas.toDataURL('image/jpeg', 0.6);
-          
-          // Validate frame data
-          if (!frame || !frame.startsWith('data:image/jpeg;base64,')) {
-            console.error("Invalid frame data generated");
-            return;
-          }
-          
           // Only send frame to server if:  
           // 1. We're not in mouse drawing mode
           // 2. We have a valid WebSocket connection
@@ -1238,10 +1314,20 @@ const handleMouseLeave = () => {
               wsConnection.readyState === WebSocket.OPEN && 
               inSession && 
               sessionId) {
-            wsConnection.send(JSON.stringify({
-              type: 'frame',
-              frame
-            }));
+            // Reduce quality to improve performance and reduce bandwidth.
+            // Frames are sent as raw JPEG bytes behind a small binary header
+            // instead of a base64 data URL inside JSON.
+            canvas.toBlob((blob) => {
+              // Validate frame data
+              if (!blob) {
+                console.error("Invalid frame data generated");
+                return;
+              }
+              if (wsConnection.readyState === WebSocket.OPEN) {
+                frameSequenceRef.current += 1;
+                wsConnection.send(new Blob([buildFrameHeader(sessionId, frameSequenceRef.current), blob]));
+              }
+            }, 'image/jpeg', 0.6);
           } else if (wsConnection && wsConnection.readyState === WebSocket.OPEN) {
             // If we're not in a session but trying to send frames, that's an issue
             // Log it once rather than repeatedly using a local variable to avoid spamming console
@@ -1263,8 +1349,8 @@ const handleMouseLeave = () => {
         }
       }
       
-      // Calculate frame interval based on frameRate
-      const frameInterval = 1000 / frameRate;
+      // Calculate frame interval based on frameRate (capped by the server's flow control)
+      const frameInterval = 1000 / effectiveFrameRate;
       requestRef.current = requestAnimationFrame(() => {
         setTimeout(sendFrame, frameInterval);
       });
@@ -1283,7 +1369,7 @@ const handleMouseLeave = () => {
         cancelAnimationFrame(requestRef.current);
       }
     };
-  }, [wsConnection, connected, frameRate, inSession, isMouseDrawing]);
+  }, [wsConnection, connected, effectiveFrameRate, inSession, isMouseDrawing]);
 
   // Session management functions
   // Modified handleCreateSession
@@ -1345,7 +1431,8 @@ const handleMouseLeave = () => {
           type: 'create_session',
           session_id: generatedSessionId,
           room_id: createRoomInput.trim(),
-          user_name: userName
+          user_name: userName,
+          codecs: SNAPSHOT_CODECS
         }));
       } else {
         console.error('WebSocket connection not open');
@@ -1435,7 +1522,8 @@ const handleMouseLeave = () => {
         wsConnection.send(JSON.stringify({
           type: 'join_session',
           session_id: joinSessionInput.trim(),
-          user_name: userName
+          user_name: userName,
+          codecs: SNAPSHOT_CODECS
         }));
       } else {
         console.error('WebSocket connection not open');
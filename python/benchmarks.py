@@ -0,0 +1,215 @@
+"""
+Micro-benchmarks for the server's canvas and gesture pipeline.
+
+Usage:
+    python benchmarks.py            # run every benchmark
+    python benchmarks.py patches    # run a single benchmark
+    python benchmarks.py restore --repeat 200
+"""
+
+import argparse
+import base64
+import io
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from canvas import Canvas
+from canvas_codecs import CODECS, get_codec
+from gestures import classify, landmark_array, stack_landmarks
+
+
+def measure(fn, repeat=50, setup=None):
+    """
+    Call fn repeat times (after one warm-up call) and return (mean seconds per call, last result).
+    setup, if given, runs before every call and is not timed.
+    """
+    if setup:
+        setup()
+    result = fn()
+    total = 0.0
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = fn()
+        total += time.perf_counter() - start
+    return total / repeat, result
+
+
+def print_row(name, seconds, size=None, unit="ms"):
+    size_text = f"{size:>10,} bytes" if size is not None else ""
+    scale = {"ms": 1e3, "us": 1e6}[unit]
+    print(f"  {name:<32} {seconds * scale:>9.3f} {unit}  {size_text}")
+
+
+def draw_typical_stroke(canvas, rng):
+    """Draw a short stroke (about what one gesture produces between two flushes)"""
+    canvas.reset_previous_points()
+    x, y = rng.uniform(0.2, 0.8, size=2)
+    for _ in range(12):
+        x = float(np.clip(x + rng.normal(0, 0.01), 0, 1))
+        y = float(np.clip(y + rng.normal(0, 0.01), 0, 1))
+        canvas.draw((x, y))
+
+
+def bench_patches(repeat):
+    """Full-canvas PNG vs dirty-tile patches after a typical stroke"""
+    rng = np.random.default_rng(0)
+    canvas = Canvas()
+
+    # Give the canvas some existing content so the full encode is realistic
+    for _ in range(20):
+        draw_typical_stroke(canvas, rng)
+    canvas.clear_dirty_tiles()
+
+    def stroke():
+        canvas.clear_dirty_tiles()
+        draw_typical_stroke(canvas, rng)
+
+    def full_encode():
+        _, buffer = cv2.imencode('.png', canvas.get_canvas())
+        return len(buffer)
+
+    def patch_encode():
+        return sum(len(patch["data"]) for patch in canvas.flush_dirty_tiles())
+
+    print("Canvas update encoding after one stroke:")
+    seconds, size = measure(full_encode, repeat, setup=stroke)
+    print_row("full canvas PNG", seconds, size)
+    seconds, size = measure(patch_encode, repeat, setup=stroke)
+    print_row("dirty tile PNG patches", seconds, size)
+
+
+def bench_restore(repeat):
+    """Restoring a stored base64 PNG: PIL decode chain vs Canvas.restore_from_base64"""
+    rng = np.random.default_rng(0)
+    source = Canvas()
+    for _ in range(40):
+        draw_typical_stroke(source, rng)
+    data_url = source.to_data_url(".png")
+    canvas = Canvas()
+
+    def pil_chain():
+        # What join_session used to do
+        canvas_bytes = base64.b64decode(data_url.split(",")[1])
+        img = Image.open(io.BytesIO(canvas_bytes))
+        cv_img = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+        return canvas.set_canvas(cv_img)
+
+    def restore():
+        return canvas.restore_from_base64(data_url)
+
+    print(f"Canvas restore from a {len(data_url):,} character PNG data URL:")
+    seconds, _ = measure(pil_chain, repeat)
+    print_row("base64 + PIL + cvtColor + copy", seconds)
+    seconds, _ = measure(restore, repeat)
+    print_row("Canvas.restore_from_base64", seconds)
+
+
+def bench_codecs(repeat):
+    """Encode/decode time vs size of a full-canvas snapshot for every codec"""
+    rng = np.random.default_rng(0)
+    canvas = Canvas()
+    for _ in range(40):
+        draw_typical_stroke(canvas, rng)
+    image = canvas.get_canvas()
+
+    variants = [("png", None), ("png", 0), ("png", 1), ("png", 6), ("png", 9)]
+    variants += [(name, None) for name in CODECS if name != "png"]
+    print("Full canvas snapshot codecs (640x480, typical whiteboard content):")
+    for name, level in variants:
+        codec = get_codec(name, level)
+        label = name if level is None else f"{name} level {level}"
+        seconds, encoded = measure(lambda: codec.encode(image), repeat)
+        print_row(f"{label} encode", seconds, len(encoded))
+        seconds, _ = measure(lambda: codec.decode(encoded), repeat)
+        print_row(f"{label} decode", seconds)
+
+
+def legacy_recognize_gesture(landmarks):
+    """HandTracker.recognize_gesture before landmarks were converted to arrays"""
+    tips = {name: landmarks.landmark[i] for name, i in
+            [("thumb", 4), ("index", 8), ("middle", 12), ("ring", 16), ("pinky", 20)]}
+    bases = {name: landmarks.landmark[i] for name, i in
+             [("thumb", 3), ("index", 5), ("middle", 9), ("ring", 13), ("pinky", 17)]}
+    index_up = tips["index"].y < bases["index"].y
+    middle_up = tips["middle"].y < bases["middle"].y
+    thumb_down = tips["thumb"].y > bases["thumb"].y
+    ring_down = tips["ring"].y > bases["ring"].y
+    pinky_down = tips["pinky"].y > bases["pinky"].y
+    index_tip, middle_tip = tips["index"], tips["middle"]
+    tip_distance = ((index_tip.x - middle_tip.x)**2 + (index_tip.y - middle_tip.y)**2 +
+                    (index_tip.z - middle_tip.z)**2)**0.5
+    if index_up and not middle_up and thumb_down and ring_down and pinky_down:
+        return "drawing"
+    if index_up and middle_up and thumb_down and ring_down and pinky_down:
+        return "erase"
+    if index_up and middle_up and not thumb_down and not ring_down and not pinky_down:
+        return "idle"
+    return "drawing"
+
+
+def bench_gestures(repeat):
+    """Per-landmark gesture classification vs the vectorized classifier, per frame and batched"""
+    rng = np.random.default_rng(0)
+    frames = 256
+    # Random hands in MediaPipe's landmark-list shape
+    hands = [SimpleNamespace(landmark=[SimpleNamespace(x=x, y=y, z=z) for x, y, z in points])
+             for points in rng.uniform(0, 1, size=(frames, 21, 3)).tolist()]
+    batch = stack_landmarks(hands)
+    assert [legacy_recognize_gesture(hand) for hand in hands] == classify(batch).tolist()
+
+    def legacy():
+        return [legacy_recognize_gesture(hand) for hand in hands]
+
+    def per_frame():
+        return [classify(landmark_array(hand)) for hand in hands]
+
+    def per_frame_lists():
+        return [classify(hand) for hand in hands]
+
+    def per_frame_arrays():
+        return [classify(points) for points in batch]
+
+    def batched():
+        return classify(batch)
+
+    print(f"Gesture classification, time per frame (averaged over {frames} frames):")
+    for name, fn in [("dicts of landmark objects", legacy),
+                     ("landmark_array + classify", per_frame),
+                     ("classify, landmark list input", per_frame_lists),
+                     ("classify, array input", per_frame_arrays),
+                     ("classify, one batch", batched)]:
+        seconds, _ = measure(fn, repeat)
+        print_row(name, seconds / frames, unit="us")
+
+
+BENCHMARKS = {
+    "patches": bench_patches,
+    "restore": bench_restore,
+    "codecs": bench_codecs,
+    "gestures": bench_gestures,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DrawWave canvas micro-benchmarks")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--repeat", type=int, default=50, help="timed iterations per measurement")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name](args.repeat)
+        print()
+
+
+if __name__ == "__main__":
+    main()
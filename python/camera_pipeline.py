@@ -0,0 +1,174 @@
+"""
+Threaded camera pipeline for the desktop painter.
+
+Reading the camera, running hand tracking and painting used to happen one
+after another on the Qt GUI thread, so the slowest step set the pace of all
+of them. Here each runs at its own rate:
+
+    CaptureThread    reads and mirrors camera frames
+    InferenceThread  runs hand tracking on the newest captured frame
+    GUI thread       shows the newest frame and applies tracking results
+
+Frames are handed over through FrameSlots, which only keep the newest frame,
+so a slow stage skips frames instead of falling behind. Results reach the GUI
+through Qt signals.
+
+Startup is kept off the GUI thread too: the capture thread opens the camera
+(trying the last working device first) while the inference thread loads
+MediaPipe, so the window can show immediately.
+"""
+
+import json
+import os
+import time
+
+import cv2
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from frame_flow import FrameSlot, RateMeter
+from gestures import INDEX_TIP
+
+# The last camera index that worked is remembered here, so later starts don't probe every device
+CAMERA_CACHE_PATH = os.environ.get("CAMERA_CACHE", os.path.join(os.path.expanduser("~"), ".drawwave_camera.json"))
+
+# Landmark chains of the hand skeleton (wrist to fingertips, and across the knuckles)
+HAND_CHAINS = [[0, 1, 2, 3, 4], [0, 5, 6, 7, 8], [9, 10, 11, 12], [13, 14, 15, 16],
+               [0, 17, 18, 19, 20], [5, 9, 13, 17]]
+
+
+def draw_landmarks(frame, points):
+    """Draw a (21, 3) landmark array onto a BGR frame"""
+    height, width = frame.shape[:2]
+    pixels = [(int(x * width), int(y * height)) for x, y in points[:, :2].tolist()]
+    for chain in HAND_CHAINS:
+        for start, end in zip(chain, chain[1:]):
+            cv2.line(frame, pixels[start], pixels[end], (255, 255, 255), 2)
+    for i, pixel in enumerate(pixels):
+        cv2.circle(frame, pixel, 6 if i == INDEX_TIP else 4, (0, 0, 255), -1)
+
+
+def load_camera_index():
+    """The camera index that worked last time, or None"""
+    try:
+        with open(CAMERA_CACHE_PATH) as f:
+            return int(json.load(f)["index"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_camera_index(index):
+    try:
+        with open(CAMERA_CACHE_PATH, "w") as f:
+            json.dump({"index": index}, f)
+    except OSError as e:
+        print(f"Could not remember camera index: {e}")
+
+
+def open_camera(max_index=4):
+    """
+    Open the first working camera and return (capture, index), or (None, None).
+    CAMERA_INDEX forces a device; otherwise the last working index is tried before probing the others.
+    """
+    cached = load_camera_index()
+    if os.environ.get("CAMERA_INDEX"):
+        candidates = [int(os.environ["CAMERA_INDEX"])]
+    else:
+        candidates = [index for index in range(max_index + 1) if index != cached]
+        if cached is not None:
+            candidates.insert(0, cached)
+
+    for index in candidates:
+        capture = cv2.VideoCapture(index)
+        if capture.isOpened():
+            if index != cached:
+                save_camera_index(index)
+            return capture, index
+        capture.release()
+    return None, None
+
+
+def create_hand_tracker():
+    # Imported here so MediaPipe loads on the inference thread instead of delaying the window
+    from hand_tracking import HandTracker
+    return HandTracker(headless=True)
+
+
+class CaptureThread(QThread):
+    camera_opened = pyqtSignal(int)  # Camera index
+    frame_ready = pyqtSignal()  # A new frame is waiting in preview_slot
+    failed = pyqtSignal(str)
+
+    def __init__(self, inference_slot=None, parent=None):
+        super().__init__(parent)
+        # Both slots hold (frame, capture timestamp); each consumer takes the newest one
+        self.inference_slot = inference_slot or FrameSlot()
+        self.preview_slot = FrameSlot()
+        self.fps = RateMeter()
+        self.capture = None
+        self._running = True
+
+    def run(self):
+        # The thread owns the capture device: it is opened and released here
+        start = time.perf_counter()
+        self.capture, index = open_camera()
+        if self.capture is None:
+            self.failed.emit("No camera found.")
+            return
+        print(f"Opened camera {index} in {time.perf_counter() - start:.2f}s")
+        self.camera_opened.emit(index)
+        try:
+            self.capture_frames()
+        finally:
+            self.capture.release()
+
+    def capture_frames(self):
+        while self._running:
+            ok, frame = self.capture.read()
+            if not ok:
+                self.failed.emit("Could not access the webcam.")
+                break
+            item = (cv2.flip(frame, 1), time.monotonic())  # Mirror the image for intuitive interaction
+            self.fps.tick()
+            self.inference_slot.put(item)
+            # Only signal when the GUI has taken the previous frame; otherwise its
+            # pending notification will pick up this newer frame anyway
+            if not self.preview_slot.put(item):
+                self.frame_ready.emit()
+
+    def stop(self):
+        self._running = False
+        self.wait()
+
+
+class InferenceThread(QThread):
+    result_ready = pyqtSignal(object)  # (landmark array or None, gesture)
+
+    def __init__(self, frames, hand_tracker=None, tracker_factory=create_hand_tracker, parent=None):
+        super().__init__(parent)
+        self.frames = frames  # FrameSlot filled by CaptureThread
+        # Without a tracker (on first start), one is created on this thread; it can be
+        # passed to the next InferenceThread once this one has stopped
+        self.hand_tracker = hand_tracker
+        self.tracker_factory = tracker_factory
+        self.fps = RateMeter()
+        self._running = True
+
+    def run(self):
+        if self.hand_tracker is None:
+            start = time.perf_counter()
+            self.hand_tracker = self.tracker_factory()
+            print(f"Loaded hand tracking in {time.perf_counter() - start:.2f}s")
+        while self._running:
+            item = self.frames.get(timeout=0.1)
+            if item is None:
+                continue
+            frame, timestamp = item
+            # The preview shares this frame, so it must not be annotated here
+            _, points, gesture, _ = self.hand_tracker.process_frame(frame, annotate=False, timestamp=timestamp)
+            self.fps.tick()
+            self.result_ready.emit((points, gesture))
+
+    def stop(self):
+        self._running = False
+        self.frames.close()
+        self.wait()
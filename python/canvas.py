@@ -1,20 +1,159 @@
+import base64
+import binascii
 import cv2
 import numpy as np
-from PIL import Image
+from canvas_history import CanvasHistory
+
+
+def to_data_url(encoded, ext=".png"):
+    """Wrap encoded image bytes in a base64 data URL"""
+    return f"data:image/{ext.lstrip('.')};base64,{base64.b64encode(encoded).decode('ascii')}"
+
+
+def spline_path(before, start, end, spacing=4, max_steps=16):
+    """
+    Pixel points of a Catmull-Rom curve from start to end, given the stroke point before start.
+    The point after end isn't known yet, so it is extrapolated from the last movement. Faster
+    movements (longer segments) get more points, about one every `spacing` pixels.
+    """
+    p0, p1, p2 = (np.asarray(point, dtype=np.float32) for point in (before, start, end))
+    p3 = 2 * p2 - p1
+    steps = int(min(max_steps, np.ceil(np.hypot(*(p2 - p1)) / spacing)))
+    if steps < 2:
+        return [tuple(start), tuple(end)]
+    t = np.linspace(0, 1, steps + 1, dtype=np.float32)[:, None]
+    points = 0.5 * (2 * p1 + (p2 - p0) * t + (2 * p0 - 5 * p1 + 4 * p2 - p3) * t ** 2 +
+                    (3 * p1 - p0 - 3 * p2 + p3) * t ** 3)
+    points = np.rint(points).astype(np.int32)
+    # Drop repeated pixels, keeping the exact end points
+    keep = np.concatenate(([True], np.any(points[1:] != points[:-1], axis=1)))
+    return [tuple(start)] + [tuple(point) for point in points[keep][1:-1].tolist()] + [tuple(end)]
+
+
+class StrokeState:
+    """
+    Where the pen of one drawer is: the previous stroke point (and the one before it, for curves)
+    of the current draw and erase strokes. The canvas has its own for local drawing; the server
+    keeps one per connection so participants of a shared canvas don't continue each other's strokes.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.previous_point_gesture = None
+        self.previous_point_erase = None
+        self.prior_point_gesture = None
+        self.prior_point_erase = None
+
 
 class Canvas:
-    def __init__(self, width=640, height=480):
+    def __init__(self, width=640, height=480, tile_size=64, history_bytes=4 * 1024 * 1024, smooth_strokes=False):
         self.width = width
         self.height = height
-        self.canvas = np.ones((height, width, 3), dtype=np.uint8) * 255
-        self.previous_point_gesture = None
-        self.previous_point_erase = None
+        # The pixel buffer is only ever modified in place, never replaced, so views of it
+        # (like the desktop CanvasWidget's QImage) stay valid for the canvas's lifetime
+        self.canvas = np.full((height, width, 3), 255, dtype=np.uint8)
+        self.stroke = StrokeState()
+        # Gesture strokes can be drawn as Catmull-Rom curves through the tracked points instead of
+        # straight lines, which needs the point before the previous one
+        self.smooth_strokes = smooth_strokes
         self.brush_size = 10
         self.color = (0, 0, 0)
-        self.history = []
-        self.redo_stack = []
         self.cursor_position = (0, 0)
         self.history_limit = 50  # Added limit to history stack
+        # Undo/redo keeps only the pixels each stroke overwrote, within a memory budget
+        self.history = CanvasHistory(max_bytes=history_bytes, max_entries=self.history_limit)
+        
+        # Dirty-tile tracking: a grid of tile_size x tile_size tiles changed since the last flush
+        self.tile_size = tile_size
+        self.dirty_tiles = np.zeros(((height + tile_size - 1) // tile_size,
+                                     (width + tile_size - 1) // tile_size), dtype=bool)
+        # Incremented on every change to the pixels, so encoded snapshots can be cached per version
+        self.version = 0
+        # Bounding box (x0, y0, x1, y1) of the pixels changed since the display last repainted
+        self.damaged_rect = None
+        
+    def mark_dirty(self, x0, y0, x1, y1):
+        """Mark the pixel rectangle [x0, x1) x [y0, y1) as changed. Every change to the pixels must call this."""
+        x0, x1 = max(0, int(x0)), min(self.width, int(x1))
+        y0, y1 = max(0, int(y0)), min(self.height, int(y1))
+        if x0 >= x1 or y0 >= y1:
+            return
+        self.version += 1
+        tile = self.tile_size
+        self.dirty_tiles[y0 // tile:(y1 - 1) // tile + 1, x0 // tile:(x1 - 1) // tile + 1] = True
+        if self.damaged_rect:
+            dx0, dy0, dx1, dy1 = self.damaged_rect
+            x0, y0, x1, y1 = min(x0, dx0), min(y0, dy0), max(x1, dx1), max(y1, dy1)
+        self.damaged_rect = (x0, y0, x1, y1)
+
+    def mark_all_dirty(self):
+        self.version += 1
+        self.dirty_tiles[:] = True
+        self.damaged_rect = (0, 0, self.width, self.height)
+
+    def take_damaged_rect(self):
+        """
+        Return and forget the bounding box of the pixels changed since the last call, or None.
+        Tracked separately from the dirty tiles, so a local display and patch broadcasts don't interfere.
+        """
+        rect, self.damaged_rect = self.damaged_rect, None
+        return rect
+
+    def clear_dirty_tiles(self):
+        """Forget pending changes, e.g. after a full snapshot was sent instead of patches"""
+        self.dirty_tiles[:] = False
+
+    def _segment_bounds(self, segment):
+        # cv2.line draws thickness/2 pixels either side of the segment, plus antialiasing slack
+        xs, ys = zip(*segment.get("points", (segment["start"], segment["end"])))
+        pad = segment["size"] // 2 + 2
+        return min(xs) - pad, min(ys) - pad, max(xs) + pad + 1, max(ys) + pad + 1
+
+    def _apply_segment(self, segment):
+        """Draw a segment onto the canvas, recording undo history and dirty tiles"""
+        bounds = self._segment_bounds(segment)
+        self.history.record(self.canvas, *bounds)
+        if "points" in segment:
+            path = np.array(segment["points"], dtype=np.int32).reshape(-1, 1, 2)
+            cv2.polylines(self.canvas, [path], False, segment["color"], segment["size"])
+        else:
+            cv2.line(self.canvas, segment["start"], segment["end"], segment["color"], segment["size"])
+        self.mark_dirty(*bounds)
+
+    def dirty_rects(self):
+        """
+        Return the changed regions as (x, y, w, h) rectangles in pixels.
+        Horizontally adjacent dirty tiles are merged into one rectangle per run.
+        """
+        rects = []
+        tile = self.tile_size
+        for row in range(self.dirty_tiles.shape[0]):
+            cols = np.flatnonzero(self.dirty_tiles[row])
+            if cols.size == 0:
+                continue
+            # Split the dirty columns of this row into runs of consecutive tiles
+            breaks = np.flatnonzero(np.diff(cols) > 1) + 1
+            for run in np.split(cols, breaks):
+                x, y = int(run[0]) * tile, row * tile
+                w = min((int(run[-1]) + 1) * tile, self.width) - x
+                h = min(y + tile, self.height) - y
+                rects.append((x, y, w, h))
+        return rects
+
+    def flush_dirty_tiles(self, ext=".png", params=None):
+        """
+        Encode the regions changed since the last flush and reset the dirty state.
+        Returns a list of {"x", "y", "w", "h", "data"} patches where data holds the
+        encoded image bytes (PNG by default, or any format cv2.imencode supports, e.g. ".webp").
+        """
+        patches = []
+        for x, y, w, h in self.dirty_rects():
+            ok, buffer = cv2.imencode(ext, self.canvas[y:y + h, x:x + w], params or [])
+            if ok:
+                patches.append({"x": x, "y": y, "w": w, "h": h, "data": buffer.tobytes()})
+        self.clear_dirty_tiles()
+        return patches
         
         
     def set_cursor_position(self, x, y):
@@ -82,48 +221,100 @@ class Canvas:
 
 
 
-    def draw(self, current_point):
+    def _segment(self, tool, start, end, color, size, before=None):
+        """
+        Describe a drawn line segment so it can be replayed by other clients. With smooth strokes and
+        a known point before start, the segment is a curve and also has the polyline "points".
+        """
+        segment = {
+            "tool": tool,
+            "start": (int(start[0]), int(start[1])),
+            "end": (int(end[0]), int(end[1])),
+            "color": tuple(int(c) for c in color),
+            "size": int(size)
+        }
+        if self.smooth_strokes and before is not None:
+            points = spline_path(before, segment["start"], segment["end"])
+            if len(points) > 2:
+                segment["points"] = points
+        return segment
+
+    def draw(self, current_point, stroke=None):
+        """
+        Draw from the previous gesture point to current_point (normalized 0-1 coordinates).
+        stroke is the drawer's StrokeState (the canvas's own by default).
+        Returns the drawn segment, or None if nothing was drawn.
+        """
+        stroke = stroke or self.stroke
         current_point = (int(current_point[0] * self.width), int(current_point[1] * self.height))
 
-        if self.previous_point_gesture is None:
-            self.previous_point_gesture = current_point
-            return  # Don't draw on the first point
+        if stroke.previous_point_gesture is None:
+            stroke.previous_point_gesture = current_point
+            return None  # Don't draw on the first point
             
         # Only draw if movement is significant
-        if self.previous_point_gesture != current_point:
-            cv2.line(self.canvas, self.previous_point_gesture, current_point, self.color, self.brush_size)
-            self.previous_point_gesture = current_point
-
-            if not self.history or not np.array_equal(self.history[-1], self.canvas):
-                self.history.append(self.canvas.copy())
-                self.redo_stack.clear()
+        if stroke.previous_point_gesture != current_point:
+            segment = self._segment("draw", stroke.previous_point_gesture, current_point, self.color, self.brush_size,
+                                    before=stroke.prior_point_gesture)
+            self._apply_segment(segment)
+            stroke.prior_point_gesture = stroke.previous_point_gesture
+            stroke.previous_point_gesture = current_point
+            return segment
+        return None
 
 
 
 
 
-    def erase(self, current_point):
+    def erase(self, current_point, stroke=None):
+        """
+        Erase from the previous erase point to current_point (normalized 0-1 coordinates).
+        stroke is the drawer's StrokeState (the canvas's own by default).
+        Returns the erased segment.
+        """
+        stroke = stroke or self.stroke
         current_point = (int(current_point[0] * self.width), int(current_point[1] * self.height))
 
-        if self.previous_point_erase is None:
-            self.previous_point_erase = current_point
+        if stroke.previous_point_erase is None:
+            stroke.previous_point_erase = current_point
 
-        cv2.line(self.canvas, self.previous_point_erase, current_point, (255, 255, 255), self.brush_size + 10)
+        segment = self._segment("erase", stroke.previous_point_erase, current_point, (255, 255, 255), self.brush_size + 10,
+                                before=stroke.prior_point_erase)
+        self._apply_segment(segment)
 
-        self.previous_point_erase = current_point
-        if not self.history or not np.array_equal(self.history[-1], self.canvas):
-            self.history.append(self.canvas.copy())
-            self.redo_stack.clear()
-                    
-        self.redo_stack.clear()
+        if current_point != stroke.previous_point_erase:
+            stroke.prior_point_erase = stroke.previous_point_erase
+        stroke.previous_point_erase = current_point
+        return segment
         
         
         
 
 
-    def reset_previous_points(self):
-        self.previous_point_gesture = None
-        self.previous_point_erase = None
+    def reset_previous_points(self, stroke=None):
+        (stroke or self.stroke).reset()
+        # Lifting the pen ends the stroke, so the next undo removes it as a whole
+        self.history.end_stroke()
+
+    def undo(self):
+        """Undo the last stroke. Returns True if anything changed."""
+        self.reset_previous_points()
+        rects = self.history.undo(self.canvas)
+        if rects is None:
+            return False
+        for x, y, w, h in rects:
+            self.mark_dirty(x, y, x + w, y + h)
+        return True
+
+    def redo(self):
+        """Redo the last undone stroke. Returns True if anything changed."""
+        self.reset_previous_points()
+        rects = self.history.redo(self.canvas)
+        if rects is None:
+            return False
+        for x, y, w, h in rects:
+            self.mark_dirty(x, y, x + w, y + h)
+        return True
 
     def change_color(self, new_color):
         self.color = tuple(new_color[:3])
@@ -132,18 +323,20 @@ class Canvas:
         self.brush_size = new_size
 
     def save(self, file_path):
+        from PIL import Image  # Only needed for saving, so not imported at startup
         image = Image.fromarray(self.canvas)
         image.save(file_path)
 
         
     def clear(self):
-        self.canvas = np.ones((self.height, self.width, 3), dtype=np.uint8) * 255
-        self.history = []
-        self.redo_stack = []
+        self.canvas[:] = 255
+        self.mark_all_dirty()
         self.reset_previous_points()
+        self.history.clear()
         
     def save(self, file_path):
         try:
+            from PIL import Image  # Only needed for saving, so not imported at startup
             image = Image.fromarray(self.canvas)
             image.save(file_path)
             return True
@@ -171,8 +364,49 @@ class Canvas:
         elif canvas_image.shape[2] == 4:  # RGBA
             canvas_image = cv2.cvtColor(canvas_image, cv2.COLOR_RGBA2BGR)
             
-        self.canvas = canvas_image.copy()
+        self.canvas[:] = canvas_image
+        self.mark_all_dirty()
+        self.history.clear()
+        return True
+
+    def restore_from_bytes(self, data):
+        """
+        Replace the canvas with an encoded image (PNG, JPEG, WebP, ...).
+        Returns False if the data can't be decoded.
+        """
+        try:
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        except cv2.error:
+            image = None  # Raised instead of returning None for empty buffers
+        if image is None:
+            return False
+        if image.shape[0] != self.height or image.shape[1] != self.width:
+            image = cv2.resize(image, (self.width, self.height))
+        # Copied into the existing buffer rather than adopted, so views of the canvas stay valid
+        self.canvas[:] = image
+        self.mark_all_dirty()
+        self.history.clear()
         return True
+
+    def restore_from_base64(self, data):
+        """Replace the canvas with a base64 encoded image, with or without a data URL prefix"""
+        if data.startswith("data:"):
+            data = data[data.find(",") + 1:]
+        try:
+            return self.restore_from_bytes(base64.b64decode(data))
+        except (binascii.Error, ValueError):
+            return False
+
+    def encode(self, ext=".png", params=None):
+        """Encode the canvas in the given image format and return the encoded bytes"""
+        ok, buffer = cv2.imencode(ext, self.canvas, params or [])
+        if not ok:
+            raise ValueError(f"Could not encode canvas as {ext}")
+        return buffer.tobytes()
+
+    def to_data_url(self, ext=".png", params=None):
+        """Encode the canvas as a base64 data URL, e.g. for sending to browsers"""
+        return to_data_url(self.encode(ext, params), ext)
         
     def draw_line(self, start_point, end_point, color=None):
         """
@@ -183,6 +417,9 @@ class Canvas:
             start_point: Tuple of (x, y) coordinates for the start of the line
             end_point: Tuple of (x, y) coordinates for the end of the line
             color: Optional BGR color tuple. If None, uses the current color
+            
+        Returns:
+            The drawn segment (tool, start, end, color and size)
         """
         if color is None:
             color = self.color
@@ -196,12 +433,9 @@ class Canvas:
         x2 = max(0, min(int(x2), self.width-1))
         y2 = max(0, min(int(y2), self.height-1))
         
-        # Draw the line
-        cv2.line(self.canvas, (x1, y1), (x2, y2), color, self.brush_size)
-        
-        # Add to history if changed
-        if not self.history or not np.array_equal(self.history[-1], self.canvas):
-            self.history.append(self.canvas.copy())
-            if len(self.history) > self.history_limit:
-                self.history.pop(0)  # Remove oldest item if we exceed limit
-            self.redo_stack.clear()
+        # Draw the line; each mouse segment is its own undo step
+        segment = self._segment("draw", (x1, y1), (x2, y2), color, self.brush_size)
+        self._apply_segment(segment)
+        self.history.end_stroke()
+
+        return segment
@@ -0,0 +1,209 @@
+"""
+Codecs for full-canvas snapshots sent to clients.
+
+Whiteboard content is mostly flat white with a few strokes, so there is a lot
+of room to trade encode time against size. Every codec encodes a BGR uint8
+canvas to bytes and decodes it back losslessly:
+
+    png      PNG at a configurable zlib level (0-9)
+    webp     lossless WebP
+    rle      QOI-style run-length encoding of identical pixels, vectorized with numpy
+    deflate  raw pixel buffer compressed with zlib
+    zstd     raw pixel buffer compressed with zstandard (only if the package is installed)
+
+png and webp snapshots can be shown by browsers directly from a data URL. The
+other codecs use a small header and are meant for clients that decode pixels
+themselves.
+"""
+
+import struct
+import zlib
+
+import cv2
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Header for the raw codecs: magic, width, height
+RAW_HEADER = struct.Struct("!4sHH")
+
+
+class CodecError(ValueError):
+    pass
+
+
+class Codec:
+    name = None
+    mime = None  # MIME type used in data URLs
+    browser_decodable = False  # True if browsers can display the data URL as an image
+
+    def __init__(self, level=None):
+        self.level = level
+
+    def encode(self, image):
+        raise NotImplementedError
+
+    def decode(self, data):
+        raise NotImplementedError
+
+
+class ImageCodec(Codec):
+    """Codecs implemented by OpenCV's image encoders"""
+    ext = None
+    browser_decodable = True
+
+    def params(self):
+        return []
+
+    def encode(self, image):
+        ok, buffer = cv2.imencode(self.ext, image, self.params())
+        if not ok:
+            raise CodecError(f"Could not encode canvas as {self.name}")
+        return buffer.tobytes()
+
+    def decode(self, data):
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise CodecError(f"Invalid {self.name} data")
+        return image
+
+
+class PngCodec(ImageCodec):
+    name = "png"
+    mime = "image/png"
+    ext = ".png"
+
+    def params(self):
+        if self.level is None:
+            return []
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(self.level)]
+
+
+class WebpCodec(ImageCodec):
+    name = "webp"
+    mime = "image/webp"
+    ext = ".webp"
+
+    def params(self):
+        # A quality above 100 selects lossless WebP in OpenCV
+        return [cv2.IMWRITE_WEBP_QUALITY, 101]
+
+
+class RawCodec(Codec):
+    """Codecs that encode the pixel buffer themselves, prefixed with RAW_HEADER"""
+    magic = None
+
+    def encode(self, image):
+        height, width = image.shape[:2]
+        return RAW_HEADER.pack(self.magic, width, height) + self.encode_pixels(np.ascontiguousarray(image))
+
+    def decode(self, data):
+        if len(data) < RAW_HEADER.size:
+            raise CodecError(f"Truncated {self.name} data")
+        magic, width, height = RAW_HEADER.unpack_from(data)
+        if magic != self.magic:
+            raise CodecError(f"Not {self.name} data")
+        return self.decode_pixels(memoryview(data)[RAW_HEADER.size:], width, height)
+
+    def encode_pixels(self, image):
+        raise NotImplementedError
+
+    def decode_pixels(self, payload, width, height):
+        raise NotImplementedError
+
+    def _pixel_array(self, pixels, width, height):
+        """BGR image from a decompressed pixel buffer, checking it matches the header's size"""
+        if len(pixels) != width * height * 3:
+            raise CodecError(f"Invalid {self.name} data: {len(pixels)} bytes for a {width}x{height} canvas")
+        return np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, 3).copy()
+
+
+class RleCodec(RawCodec):
+    """
+    Run-length encoding of identical consecutive pixels (the QOI_OP_RUN idea).
+    Payload: run count (uint32), run lengths (uint32 each), then one BGR color per run.
+    """
+    name = "rle"
+    mime = "application/x-drawwave-rle"
+    magic = b"DWRL"
+
+    def encode_pixels(self, image):
+        pixels = image.reshape(-1, 3)
+        packed = (pixels[:, 0].astype(np.uint32) << 16) | (pixels[:, 1].astype(np.uint32) << 8) | pixels[:, 2]
+        starts = np.concatenate(([0], np.flatnonzero(packed[1:] != packed[:-1]) + 1))
+        lengths = np.diff(np.append(starts, len(pixels)))
+        return (struct.pack("!I", len(starts)) + lengths.astype(">u4").tobytes() +
+                pixels[starts].tobytes())
+
+    def decode_pixels(self, payload, width, height):
+        if len(payload) < 4:
+            raise CodecError("Truncated rle data")
+        (runs,) = struct.unpack_from("!I", payload)
+        if len(payload) != 4 + runs * 7:  # A uint32 length and a BGR color per run
+            raise CodecError(f"Invalid rle data: {runs} runs in {len(payload)} bytes")
+        lengths = np.frombuffer(payload, dtype=">u4", count=runs, offset=4)
+        colors = np.frombuffer(payload, dtype=np.uint8, count=runs * 3, offset=4 + runs * 4).reshape(-1, 3)
+        if int(lengths.sum()) != width * height:
+            raise CodecError("Invalid rle data")
+        return np.repeat(colors, lengths, axis=0).reshape(height, width, 3)
+
+
+class DeflateCodec(RawCodec):
+    name = "deflate"
+    mime = "application/x-drawwave-deflate"
+    magic = b"DWDF"
+
+    def encode_pixels(self, image):
+        return zlib.compress(image, 1 if self.level is None else int(self.level))
+
+    def decode_pixels(self, payload, width, height):
+        try:
+            pixels = zlib.decompress(payload)
+        except zlib.error as e:
+            raise CodecError(f"Invalid deflate data: {e}")
+        return self._pixel_array(pixels, width, height)
+
+
+class ZstdCodec(RawCodec):
+    name = "zstd"
+    mime = "application/x-drawwave-zstd"
+    magic = b"DWZS"
+
+    def encode_pixels(self, image):
+        level = 1 if self.level is None else int(self.level)
+        return zstandard.ZstdCompressor(level=level).compress(image)
+
+    def decode_pixels(self, payload, width, height):
+        try:
+            pixels = zstandard.ZstdDecompressor().decompress(payload, max_output_size=width * height * 3)
+        except zstandard.ZstdError as e:
+            raise CodecError(f"Invalid zstd data: {e}")
+        return self._pixel_array(pixels, width, height)
+
+
+CODECS = {codec.name: codec for codec in [PngCodec, WebpCodec, RleCodec, DeflateCodec, ZstdCodec]}
+if zstandard is None:
+    del CODECS["zstd"]
+
+
+def get_codec(name, level=None):
+    """Create a codec by name. Raises CodecError for unknown or unavailable codecs."""
+    if name not in CODECS:
+        raise CodecError(f"Unknown or unavailable canvas codec '{name}' (available: {', '.join(CODECS)})")
+    return CODECS[name](level)
+
+
+def negotiate(requested, enabled):
+    """
+    Pick the first codec in the client's preference list that the server has enabled.
+    Returns None if there is no match, in which case the server default applies.
+    """
+    if not isinstance(requested, list):
+        return None
+    for name in requested:
+        if name in enabled:
+            return name
+    return None
@@ -0,0 +1,131 @@
+"""
+Undo/redo history for Canvas based on pixel patches.
+
+Instead of copying the whole canvas (~900 KB for 640x480) after every drawn
+segment, the history stores only the pixels a segment is about to overwrite.
+Segments drawn between two stroke boundaries are grouped into one entry, so
+a single undo removes a whole stroke. The history keeps a byte budget and
+drops the oldest entries once it is exceeded.
+"""
+
+from collections import deque
+
+
+class HistoryEntry:
+    """A group of (x, y, pixels) patches applied in order"""
+    def __init__(self):
+        self.patches = []
+        self.nbytes = 0
+
+    def add(self, x, y, pixels):
+        self.patches.append((x, y, pixels))
+        self.nbytes += pixels.nbytes
+
+    def swap(self, image, reverse):
+        """
+        Write the stored patches into image and return an entry holding the pixels they replaced.
+        Undo swaps in reverse order; the returned entry is kept in forward order so redo can
+        swap it back in forward order.
+        """
+        swapped = HistoryEntry()
+        patches = reversed(self.patches) if reverse else self.patches
+        for x, y, pixels in patches:
+            h, w = pixels.shape[:2]
+            region = image[y:y + h, x:x + w]
+            swapped.add(x, y, region.copy())
+            region[...] = pixels
+        if reverse:
+            swapped.patches.reverse()
+        return swapped
+
+    def bounds(self):
+        """Bounding rectangles (x, y, w, h) of every patch"""
+        return [(x, y, pixels.shape[1], pixels.shape[0]) for x, y, pixels in self.patches]
+
+
+class CanvasHistory:
+    def __init__(self, max_bytes=4 * 1024 * 1024, max_entries=50):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.current = None  # Entry being recorded for the stroke in progress
+        self.nbytes = 0
+
+    def record(self, image, x0, y0, x1, y1):
+        """
+        Save the pixels in [x0, x1) x [y0, y1) of image before they are drawn over.
+        Consecutive calls are grouped until end_stroke() is called.
+        """
+        height, width = image.shape[:2]
+        x0, x1 = max(0, int(x0)), min(width, int(x1))
+        y0, y1 = max(0, int(y0)), min(height, int(y1))
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        if self.current is None:
+            self.current = HistoryEntry()
+            # A new change invalidates everything that was undone
+            self._drop_redo()
+
+        pixels = image[y0:y1, x0:x1].copy()
+        self.current.add(x0, y0, pixels)
+        self.nbytes += pixels.nbytes
+
+        # Split very long strokes so memory stays within budget while drawing
+        if self.nbytes > self.max_bytes:
+            self.end_stroke()
+
+    def end_stroke(self):
+        """Close the entry for the current stroke so the next change starts a new one"""
+        if self.current is None:
+            return
+        if self.current.patches:
+            self.undo_stack.append(self.current)
+        self.current = None
+        self._enforce_budget()
+
+    def undo(self, image):
+        """Undo the last stroke in place. Returns the changed rectangles, or None if there is nothing to undo."""
+        self.end_stroke()
+        if not self.undo_stack:
+            return None
+        entry = self.undo_stack.pop()
+        redo_entry = entry.swap(image, reverse=True)
+        self.redo_stack.append(redo_entry)
+        self.nbytes += redo_entry.nbytes - entry.nbytes
+        return entry.bounds()
+
+    def redo(self, image):
+        """Redo the last undone stroke in place. Returns the changed rectangles, or None if there is nothing to redo."""
+        self.end_stroke()
+        if not self.redo_stack:
+            return None
+        entry = self.redo_stack.pop()
+        undo_entry = entry.swap(image, reverse=False)
+        self.undo_stack.append(undo_entry)
+        self.nbytes += undo_entry.nbytes - entry.nbytes
+        return entry.bounds()
+
+    def can_undo(self):
+        return bool(self.undo_stack) or bool(self.current and self.current.patches)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.current = None
+        self.nbytes = 0
+
+    def _drop_redo(self):
+        for entry in self.redo_stack:
+            self.nbytes -= entry.nbytes
+        self.redo_stack.clear()
+
+    def _enforce_budget(self):
+        # Drop the oldest strokes first; the stroke just recorded is always kept
+        while self.undo_stack and (len(self.undo_stack) > self.max_entries or
+                                   (self.nbytes > self.max_bytes and len(self.undo_stack) > 1)):
+            self.nbytes -= self.undo_stack.popleft().nbytes
@@ -1,6 +1,7 @@
 from PyQt5.QtWidgets import QWidget
-from PyQt5.QtGui import QPainter, QImage, QMouseEvent
-from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPainter, QImage, QMouseEvent, QColor, QPen, QFont, QRadialGradient, QRegion
+from PyQt5.QtCore import Qt, QPoint, QRect
+from frame_flow import RateMeter
 
 class CanvasWidget(QWidget):
     def __init__(self, canvas, parent=None):
@@ -15,6 +16,19 @@ class CanvasWidget(QWidget):
         self.cursor_y = 0
         self.cursor_visible = False
         self.cursor_mode = "IDLE"
+        self.paint_fps = RateMeter()  # Shown in the painter's frame rate overlay
+        
+        self.wrap_canvas()
+        self.painted_cursor_rect = None  # Where the cursor was last painted
+
+    def wrap_canvas(self):
+        """
+        Create a QImage over the canvas's own BGR buffer: painting reads the pixels directly, without
+        copying or converting them. Canvas only modifies its buffer in place, so this stays valid.
+        """
+        self.buffer = self.canvas.canvas  # Keeps the memory behind the QImage alive
+        self.image = QImage(self.buffer.data, self.canvas.width, self.canvas.height,
+                            self.canvas.width * 3, QImage.Format_BGR888)
 
     def set_drawing(self, status):
         self.drawing = status
@@ -25,19 +39,39 @@ class CanvasWidget(QWidget):
         self.cursor_y = y
         self.cursor_visible = visible
         self.cursor_mode = mode
+
+    def cursor_rect(self):
+        """Bounding box of the cursor drawn by paintEvent (glow, crosshair and mode label), or None"""
+        if not self.cursor_visible:
+            return None
+        return QRect(self.cursor_x - 28, self.cursor_y - 30, 130, 58)
+
+    def refresh(self):
+        """Schedule a repaint of only what changed: the canvas's damaged pixels and the cursor's old and new area"""
+        region = QRegion()
+        damaged = self.canvas.take_damaged_rect()
+        if damaged:
+            x0, y0, x1, y1 = damaged
+            region += QRect(x0, y0, x1 - x0, y1 - y0)
+        cursor_rect = self.cursor_rect()
+        if cursor_rect != self.painted_cursor_rect:
+            for rect in [self.painted_cursor_rect, cursor_rect]:
+                if rect is not None:
+                    region += rect
+        if not region.isEmpty():
+            self.update(region)
     
     def paintEvent(self, event):
+        self.paint_fps.tick()
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
         
-        # Draw the base canvas
-        canvas_data = self.canvas.get_canvas()
-        canvas_image = QImage(canvas_data.data,
-                             self.canvas.width,
-                             self.canvas.height,
-                             self.canvas.width * 3,
-                             QImage.Format_RGB888)
-        painter.drawImage(0, 0, canvas_image)
+        # Draw the part of the base canvas that needs repainting, straight from the canvas buffer
+        if self.canvas.canvas is not self.buffer:
+            self.wrap_canvas()
+        rect = event.rect()
+        painter.drawImage(rect, self.image, rect)
+        self.painted_cursor_rect = self.cursor_rect()
         
         # Draw cursor if visible
         if self.cursor_visible:
@@ -102,14 +136,14 @@ class CanvasWidget(QWidget):
             self.last_pos = event.pos()
             self.canvas.reset_previous_points()
             self.canvas.draw((event.x()/self.canvas.width, event.y()/self.canvas.height))
-            self.update()
+            self.refresh()
 
     def mouseMoveEvent(self, event: QMouseEvent):
         if self.drawing and getattr(self.parent(), "mode", "") == "mouse":
             current_pos = event.pos()
             self.canvas.draw((current_pos.x() / self.canvas.width, current_pos.y() / self.canvas.height))
             self.last_pos = current_pos
-            self.update()
+            self.refresh()
 
     def mouseReleaseEvent(self, event: QMouseEvent):
         if event.button() == Qt.LeftButton:
@@ -0,0 +1,114 @@
+"""
+Write-behind persistence of canvas snapshots.
+
+Saving every canvas change straight to MongoDB turns a burst of strokes into a
+burst of HTTP requests, each carrying a full base64 PNG. CanvasWriter instead
+keeps only the latest pending snapshot per session and layer, and writes the
+pending snapshots together every flush_interval seconds, when a session goes
+idle, and on shutdown.
+
+A snapshot can be given as a callable returning the data URL. It is only
+called at flush time, so a canvas that changes many times between flushes is
+encoded once. Snapshots whose write fails with a network or server error
+stay pending for the next flush, unless a newer one was scheduled for the
+same session in the meantime, and are dropped after max_retries failed
+flushes in a row. Snapshots the API rejects (e.g. for a session that no
+longer exists) are dropped right away.
+"""
+
+import asyncio
+import os
+
+from session_db import CANVAS_REJECTED, CANVAS_SAVED
+
+
+class CanvasWriter:
+    def __init__(self, session_db, flush_interval=None, max_batch=None, max_retries=None):
+        self.session_db = session_db
+        self.flush_interval = flush_interval or float(os.environ.get("CANVAS_FLUSH_INTERVAL", 2))
+        self.max_batch = max_batch or int(os.environ.get("CANVAS_FLUSH_BATCH", 16))
+        self.max_retries = max_retries or int(os.environ.get("CANVAS_FLUSH_RETRIES", 5))
+        self.max_batch_bytes = 4 * 1024 * 1024
+        self.pending = {}  # {(session_id, is_drawing_layer): data URL or callable returning one}
+        self.coalesced = 0  # Snapshots replaced by a newer one before they were written
+        self.written = 0
+        self.failed = 0  # Snapshots whose write failed and were kept for the next flush
+        self.dropped = 0  # Snapshots rejected by the API or given up on after max_retries
+        self.retries = {}  # Failed flushes in a row: {(session_id, is_drawing_layer): count}
+        self._task = None
+
+    def schedule(self, session_id, canvas_data, is_drawing_layer=False):
+        """Queue a snapshot for writing, replacing any pending snapshot of the same session and layer"""
+        key = (session_id, is_drawing_layer)
+        if key in self.pending:
+            self.coalesced += 1
+        self.pending[key] = canvas_data
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing canvas snapshots: {e}")
+
+    async def flush(self, session_id=None):
+        """Write pending snapshots now, either all of them or only those of one session"""
+        keys = [key for key in self.pending if session_id is None or key[0] == session_id]
+        if not keys:
+            return
+
+        updates = []
+        for key in keys:
+            canvas_data = self.pending.pop(key)
+            if callable(canvas_data):
+                try:
+                    canvas_data = canvas_data()
+                except Exception as e:
+                    print(f"Error encoding canvas snapshot for session {key[0]}: {e}")
+                    continue
+            if canvas_data:
+                updates.append((key[0], canvas_data, key[1]))
+
+        # Split into batches limited by count and by size, so requests stay under the API's body limit
+        batch, batch_bytes = [], 0
+        for update in updates:
+            if batch and (len(batch) >= self.max_batch or batch_bytes + len(update[1]) > self.max_batch_bytes):
+                await self._write(batch)
+                batch, batch_bytes = [], 0
+            batch.append(update)
+            batch_bytes += len(update[1])
+        if batch:
+            await self._write(batch)
+
+    async def _write(self, batch):
+        results = await self.session_db.update_canvas_states(batch)
+        for (session_id, canvas_data, is_drawing_layer), result in zip(batch, results):
+            key = (session_id, is_drawing_layer)
+            if result == CANVAS_SAVED:
+                self.written += 1
+                self.retries.pop(key, None)
+            elif result == CANVAS_REJECTED:
+                self.dropped += 1
+                self.retries.pop(key, None)
+                print(f"Dropped canvas snapshot for session {session_id}: rejected by the session API")
+            elif self.retries.get(key, 0) + 1 >= self.max_retries:
+                self.dropped += 1
+                self.retries.pop(key, None)
+                print(f"Dropped canvas snapshot for session {session_id} after {self.max_retries} failed writes")
+            else:
+                self.failed += 1
+                self.retries[key] = self.retries.get(key, 0) + 1
+                # A snapshot scheduled while this one was being written is newer and wins
+                self.pending.setdefault(key, canvas_data)
+
+    async def close(self):
+        """Stop the periodic flush and write everything still pending"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
@@ -0,0 +1,118 @@
+"""
+Per-client outbound message queues for the WebSocket server.
+
+Awaiting websocket.send() for every participant in turn lets one slow
+client delay everyone else in the session. Each connection instead gets a
+ClientChannel: a bounded queue drained by its own writer task, so a
+broadcast only enqueues and returns.
+
+Messages can be sent with a "supersede" key (e.g. "hand_position" or a full
+canvas snapshot). A newer message with the same key replaces the queued
+older one, and when the queue is full the oldest supersedable message is
+dropped first. Canvas deltas (strokes and patches) are sent with delta=True:
+a full snapshot queued with KEYFRAME_KEY already contains them, so it
+replaces the deltas queued before it, and the queued snapshot itself is
+never dropped because the deltas after it build on it. A client whose
+queue is full of messages that can't be dropped, or whose socket doesn't
+accept a message within send_timeout, is a slow consumer and gets
+disconnected.
+"""
+
+import asyncio
+from collections import deque
+
+# Close code used when disconnecting a client that can't keep up (1013 = try again later)
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# Supersede key of full canvas snapshots
+KEYFRAME_KEY = "canvas_keyframe"
+
+
+class ClientChannel:
+    def __init__(self, websocket, max_queue=256, send_timeout=5.0):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.queue = deque()  # (supersede_key, message, is_delta)
+        self.closed = False
+        self.dropped = 0  # Messages dropped because a newer one superseded them
+        self._ready = asyncio.Event()
+        self._writer_task = asyncio.create_task(self._writer())
+
+    def send(self, message, supersede=None, delta=False):
+        """
+        Queue a message for this client without waiting for it to be sent.
+        Returns False if the channel is closed or the client was disconnected as a slow consumer.
+        """
+        if self.closed:
+            return False
+
+        if supersede is not None:
+            # Only the newest message of a superseded kind is worth delivering
+            for index, (key, _, _) in enumerate(self.queue):
+                if key == supersede:
+                    del self.queue[index]
+                    self.dropped += 1
+                    break
+
+        if supersede == KEYFRAME_KEY:
+            # The full snapshot already contains every canvas delta queued before it
+            queued = len(self.queue)
+            self.queue = deque(item for item in self.queue if not item[2])
+            self.dropped += queued - len(self.queue)
+
+        if len(self.queue) >= self.max_queue and not self._drop_oldest_supersedable():
+            self._disconnect_slow_consumer(f"outbound queue full ({self.max_queue} messages)")
+            return False
+
+        self.queue.append((supersede, message, delta))
+        self._ready.set()
+        return True
+
+    def _drop_oldest_supersedable(self):
+        # The queued keyframe is kept: the deltas queued after it would be drawn on a stale canvas
+        for index, (key, _, _) in enumerate(self.queue):
+            if key is not None and key != KEYFRAME_KEY:
+                del self.queue[index]
+                self.dropped += 1
+                return True
+        return False
+
+    def _disconnect_slow_consumer(self, reason):
+        if self.closed:
+            return
+        print(f"Disconnecting slow consumer: {reason}")
+        self.close()
+        asyncio.create_task(self._close_websocket(SLOW_CONSUMER_CLOSE_CODE, "Slow consumer"))
+
+    async def _close_websocket(self, code, reason):
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    async def _writer(self):
+        while not self.closed:
+            if not self.queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            _, message, _ = self.queue.popleft()
+            try:
+                await asyncio.wait_for(self.websocket.send(message), self.send_timeout)
+            except asyncio.TimeoutError:
+                self._disconnect_slow_consumer(f"no message accepted within {self.send_timeout}s")
+            except Exception as e:
+                # Connection closed or broken; the connection handler cleans up the session
+                if not self.closed:
+                    print(f"Error sending message to client: {str(e)}")
+                self.close()
+
+    def close(self):
+        """Stop the writer task and drop anything still queued"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self._ready.set()
@@ -0,0 +1,150 @@
+"""
+Backpressure for incoming camera frames.
+
+Browsers send frames as fast as their webcam (or timer) allows. If every
+frame is processed in order, a backlog builds up whenever inference can't
+keep up and the cursor lags further and further behind the hand. Instead,
+each client gets a LatestFrameSlot holding only the newest unprocessed frame
+(older ones are dropped), and a FrameRateController that works out the rate
+the server can actually sustain so the client can be told to slow down.
+
+The desktop painter uses the same idea between threads: FrameSlot is the
+thread-safe equivalent of LatestFrameSlot, and RateMeter measures how fast
+each stage of its pipeline runs.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+# Slowest frame rate a client is ever asked to send
+MIN_CLIENT_FPS = 2
+
+
+class LatestFrameSlot:
+    """Single-slot queue: put() replaces any frame that hasn't been taken yet"""
+    def __init__(self):
+        self._item = None
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    def put(self, item):
+        """Store the newest frame. Returns True if an older pending frame was dropped."""
+        dropped = self._item is not None
+        if dropped:
+            self.dropped += 1
+        self._item = item
+        self._ready.set()
+        return dropped
+
+    async def get(self):
+        """Wait for and take the newest frame"""
+        while self._item is None:
+            self._ready.clear()
+            await self._ready.wait()
+        item, self._item = self._item, None
+        return item
+
+
+class FrameRateController:
+    """
+    Tracks how long frames take to process (including waiting for an inference
+    worker) and derives the frame rate a client should send.
+    """
+    def __init__(self, min_fps=MIN_CLIENT_FPS, max_fps=30, smoothing=0.2, headroom=0.8, min_interval=1.0):
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.smoothing = smoothing
+        self.headroom = headroom  # Ask for slightly fewer frames than we can process
+        self.min_interval = min_interval  # Minimum seconds between two advertisements
+        self.average_seconds = None
+        self.advertised_fps = None
+        self._last_advertised = 0.0
+
+    def record(self, seconds):
+        """Record the processing time of one frame"""
+        if self.average_seconds is None:
+            self.average_seconds = seconds
+        else:
+            self.average_seconds += self.smoothing * (seconds - self.average_seconds)
+
+    def target_fps(self):
+        if not self.average_seconds:
+            return self.max_fps
+        fps = self.headroom / self.average_seconds
+        return int(max(self.min_fps, min(self.max_fps, fps)))
+
+    def poll_advertisement(self):
+        """Return a new frame rate to send to the client, or None if it hasn't changed enough"""
+        now = time.monotonic()
+        if now - self._last_advertised < self.min_interval:
+            return None
+        target = self.target_fps()
+        if self.advertised_fps is not None and abs(target - self.advertised_fps) < max(1, 0.2 * self.advertised_fps):
+            return None
+        self.advertised_fps = target
+        self._last_advertised = now
+        return target
+
+
+class FrameSlot:
+    """Thread-safe single-slot queue: put() replaces any frame that hasn't been taken yet"""
+    def __init__(self):
+        self._item = None
+        self._condition = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        """Store the newest frame. Returns True if an older pending frame was dropped."""
+        with self._condition:
+            dropped = self._item is not None
+            if dropped:
+                self.dropped += 1
+            self._item = item
+            self._condition.notify()
+        return dropped
+
+    def get(self, timeout=None):
+        """Wait for and take the newest frame. Returns None on timeout or once the slot is closed."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._item is not None or self._closed, timeout)
+            item, self._item = self._item, None
+            return item
+
+    def take(self):
+        """Take the newest frame without waiting, or None if there is none"""
+        with self._condition:
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        """Wake up any thread waiting in get()"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class RateMeter:
+    """Events per second over a sliding window, e.g. frames captured or painted"""
+    def __init__(self, window=1.0):
+        self.window = window
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def tick(self):
+        now = time.monotonic()
+        with self._lock:
+            self._times.append(now)
+            self._expire(now)
+
+    def rate(self):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            return len(self._times) / self.window
+
+    def _expire(self, now):
+        while self._times and now - self._times[0] > self.window:
+            self._times.popleft()
@@ -0,0 +1,76 @@
+"""
+Binary WebSocket message protocol for camera frames.
+
+JSON frame messages carry a base64 data URL, which is a third larger on the
+wire and has to be parsed, stripped and base64-decoded before the JPEG can
+be decoded. Binary messages carry the raw JPEG bytes behind a small header:
+
+    offset  size  field
+    0       1     protocol version (1)
+    1       1     message type (1 = frame)
+    2       1     length of the session id in bytes (N)
+    3       4     sequence number (unsigned, big endian)
+    7       N     session id (UTF-8)
+    7 + N   ...   payload (JPEG bytes for frames)
+
+The payload is returned as a memoryview slice of the received message, so it
+can be handed to np.frombuffer/cv2.imdecode without copying.
+"""
+
+import struct
+
+PROTOCOL_VERSION = 1
+
+MESSAGE_TYPE_FRAME = 1
+
+MESSAGE_TYPES = {
+    MESSAGE_TYPE_FRAME: "frame",
+}
+
+HEADER = struct.Struct("!BBBI")
+
+
+class ProtocolError(ValueError):
+    """Raised when a binary message can't be parsed"""
+
+
+class BinaryMessage:
+    def __init__(self, message_type, session_id, sequence, payload):
+        self.message_type = message_type
+        self.session_id = session_id
+        self.sequence = sequence
+        self.payload = payload
+
+    @property
+    def type_name(self):
+        return MESSAGE_TYPES.get(self.message_type)
+
+
+def parse_message(data):
+    """Parse a binary WebSocket message into a BinaryMessage"""
+    view = memoryview(data)
+    if len(view) < HEADER.size:
+        raise ProtocolError(f"Binary message too short ({len(view)} bytes)")
+
+    version, message_type, session_length, sequence = HEADER.unpack_from(view)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported binary protocol version {version}")
+
+    payload_offset = HEADER.size + session_length
+    if len(view) < payload_offset:
+        raise ProtocolError("Binary message truncated inside the session id")
+
+    try:
+        session_id = bytes(view[HEADER.size:payload_offset]).decode("utf-8")
+    except UnicodeDecodeError:
+        raise ProtocolError("Session id is not valid UTF-8")
+    return BinaryMessage(message_type, session_id, sequence, view[payload_offset:])
+
+
+def build_message(message_type, session_id, sequence, payload):
+    """Build a binary message (used by tests and non-browser clients)"""
+    session_bytes = session_id.encode("utf-8")
+    if len(session_bytes) > 255:
+        raise ProtocolError("Session id is too long for the binary protocol")
+    header = HEADER.pack(PROTOCOL_VERSION, message_type, len(session_bytes), sequence & 0xFFFFFFFF)
+    return header + session_bytes + bytes(payload)
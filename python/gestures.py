@@ -0,0 +1,177 @@
+"""
+Vectorized hand landmark processing.
+
+MediaPipe returns each hand as 21 landmark objects. They are converted once per
+frame into a (21, 3) float32 array of normalized (x, y, z) coordinates, and
+finger states, gestures and fingertip midpoints are computed on that array.
+Every function also accepts a stack of hands shaped (N, 21, 3), so a batch of
+frames or hands is classified in one call. A single hand is classified with
+plain comparisons of its ten tip and base y values instead, because for so
+few numbers NumPy's per-call overhead costs more than the work itself.
+
+Per-frame classifications flicker while a hand moves between poses.
+GestureDebouncer turns them into a stable gesture that only changes after the
+new pose has been held for a few consecutive frames.
+"""
+
+import itertools
+import os
+
+import numpy as np
+
+NUM_LANDMARKS = 21
+
+# MediaPipe hand landmark indices
+THUMB_IP, THUMB_TIP = 3, 4
+INDEX_MCP, INDEX_TIP = 5, 8
+MIDDLE_MCP, MIDDLE_TIP = 9, 12
+RING_MCP, RING_TIP = 13, 16
+PINKY_MCP, PINKY_TIP = 17, 20
+
+# Fingers in the order thumb, index, middle, ring, pinky. Each tip is compared with
+# the joint below it: the IP joint for the thumb and the knuckle for the other fingers.
+FINGER_TIPS = np.array([THUMB_TIP, INDEX_TIP, MIDDLE_TIP, RING_TIP, PINKY_TIP])
+FINGER_BASES = np.array([THUMB_IP, INDEX_MCP, MIDDLE_MCP, RING_MCP, PINKY_MCP])
+THUMB, INDEX, MIDDLE, RING, PINKY = range(5)
+
+GESTURES = np.array(["drawing", "erase", "idle"])
+DRAWING, ERASE, IDLE = range(3)  # Indices into GESTURES
+
+
+def gesture_code(up, down):
+    """The gesture rules for one hand, given per-finger up/down flags in FINGER_TIPS order"""
+    others_down = down[THUMB] and down[RING] and down[PINKY]
+    # 🖊️ Drawing: Only index up
+    if up[INDEX] and not up[MIDDLE] and others_down:
+        return DRAWING
+    # 🧽 Erasing: Index + middle up, others down
+    if up[INDEX] and up[MIDDLE] and others_down:
+        return ERASE
+    # All fingers up
+    if up[INDEX] and up[MIDDLE] and not (down[THUMB] or down[RING] or down[PINKY]):
+        return IDLE
+    # Unrecognized poses fall back to drawing, as they always have
+    return DRAWING
+
+
+# Each finger is down (0), level with its base (1) or up (2). The 3**5 possible hand states are
+# numbered in base 3 and looked up in a table built once from gesture_code, so classifying a
+# hand or a whole batch is a handful of array operations.
+STATE_WEIGHTS = 3 ** np.arange(len(FINGER_TIPS) - 1, -1, -1)
+GESTURE_TABLE = np.array([
+    gesture_code([state == 2 for state in states], [state == 0 for state in states])
+    for states in itertools.product(range(3), repeat=len(FINGER_TIPS))
+], dtype=np.intp)
+
+# Plain Python versions of the above for classifying a single hand
+FINGER_PAIRS = list(zip(FINGER_TIPS.tolist(), FINGER_BASES.tolist()))
+GESTURE_CODES = GESTURE_TABLE.tolist()
+GESTURE_NAMES = GESTURES.tolist()
+
+
+def landmark_array(landmarks):
+    """Convert a MediaPipe landmark list to a (21, 3) float32 array. Arrays are returned as they are."""
+    if isinstance(landmarks, np.ndarray):
+        return landmarks
+    coordinates = (value for landmark in landmarks.landmark for value in (landmark.x, landmark.y, landmark.z))
+    return np.fromiter(coordinates, dtype=np.float32, count=NUM_LANDMARKS * 3).reshape(NUM_LANDMARKS, 3)
+
+
+def stack_landmarks(hand_landmarks):
+    """Convert several hands (e.g. result.multi_hand_landmarks) to an (N, 21, 3) array"""
+    if not hand_landmarks:
+        return np.empty((0, NUM_LANDMARKS, 3), dtype=np.float32)
+    return np.stack([landmark_array(landmarks) for landmarks in hand_landmarks])
+
+
+def finger_states(points):
+    """
+    Returns (up, down), boolean arrays shaped (..., 5) in FINGER_TIPS order.
+    Image y grows downwards, so a finger is up when its tip is above its base.
+    A finger level with its base is neither up nor down.
+    """
+    tips_y = points[..., FINGER_TIPS, 1]
+    bases_y = points[..., FINGER_BASES, 1]
+    return tips_y < bases_y, tips_y > bases_y
+
+
+def hand_code(landmarks):
+    """Classify one hand, given as a (21, 3) array or a MediaPipe landmark list, into a DRAWING/ERASE/IDLE code"""
+    if isinstance(landmarks, np.ndarray):
+        ys = landmarks[:, 1].tolist()
+    else:
+        ys = [landmark.y for landmark in landmarks.landmark]
+    code = 0
+    for tip, base in FINGER_PAIRS:
+        tip_y, base_y = ys[tip], ys[base]
+        # Same base-3 finger states as classify_codes: up (2), level (1) or down (0)
+        code = code * 3 + (2 if tip_y < base_y else 0 if tip_y > base_y else 1)
+    return GESTURE_CODES[code]
+
+
+def classify_codes(points):
+    """Classify one hand (21, 3) or a batch (N, 21, 3) into DRAWING/ERASE/IDLE codes"""
+    # +1 where the tip is above its base (up), -1 where it is below (down)
+    direction = np.sign(points[..., FINGER_BASES, 1] - points[..., FINGER_TIPS, 1])
+    states = direction.astype(np.intp) + 1
+    return GESTURE_TABLE[states @ STATE_WEIGHTS]
+
+
+def classify(points):
+    """
+    Gesture name for one hand (a (21, 3) array or a MediaPipe landmark list),
+    or an array of names for a batch of hands
+    """
+    if not isinstance(points, np.ndarray) or points.ndim == 2:
+        return GESTURE_NAMES[hand_code(points)]
+    return GESTURES[classify_codes(points)]
+
+
+def fingertip(points, tip=INDEX_TIP):
+    """Normalized (x, y) of a landmark, shaped (2,) or (N, 2)"""
+    return points[..., tip, :2]
+
+
+def midpoint(points, first=INDEX_TIP, second=MIDDLE_TIP):
+    """Normalized (x, y) halfway between two landmarks, shaped (2,) or (N, 2)"""
+    return (points[..., first, :2] + points[..., second, :2]) * 0.5
+
+
+class GestureDebouncer:
+    """
+    Gesture state machine with hysteresis. The stable gesture only switches after a different
+    gesture has been classified for `frames` consecutive frames; shorter flickers are ignored,
+    so they don't end strokes or produce gesture messages.
+    """
+    def __init__(self, frames=None, initial="idle"):
+        if frames is None:
+            frames = int(os.environ.get("GESTURE_DEBOUNCE_FRAMES", 3))
+        self.frames = max(1, frames)  # 1 switches on every frame, i.e. no debouncing
+        self.gesture = initial
+        self.candidate = None  # Gesture waiting to be confirmed
+        self.count = 0  # Consecutive frames the candidate has been seen
+        self.suppressed = 0  # Candidates that were abandoned before they were confirmed
+
+    def update(self, gesture):
+        """Feed the gesture classified for one frame and return the stable gesture"""
+        if gesture == self.gesture:
+            self._drop_candidate()
+            return self.gesture
+
+        if gesture != self.candidate:
+            self._drop_candidate()
+            self.candidate = gesture
+        self.count += 1
+        if self.count >= self.frames:
+            self.gesture = gesture
+            self.candidate, self.count = None, 0
+        return self.gesture
+
+    def reset(self, gesture="idle"):
+        self.gesture = gesture
+        self.candidate, self.count = None, 0
+
+    def _drop_candidate(self):
+        if self.candidate is not None:
+            self.suppressed += 1
+        self.candidate, self.count = None, 0
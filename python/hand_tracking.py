@@ -1,9 +1,13 @@
 import mediapipe as mp
 import cv2
-from collections import deque
+import os
+import time
+
+from gestures import INDEX_TIP, classify, fingertip, landmark_array
+from landmark_filter import OneEuroFilter
 
 class HandTracker:
-    def __init__(self):
+    def __init__(self, inference_width=None, use_roi=None, roi_margin=0.5, headless=False, smoothing=None):
         self.mp_hands = mp.solutions.hands
         self.hands = self.mp_hands.Hands(
             static_image_mode=False,
@@ -12,104 +16,154 @@ class HandTracker:
             min_tracking_confidence=0.75
         )
         self.mp_drawing = mp.solutions.drawing_utils
-        self.tip_history = deque(maxlen=5)  # For smoothing index fingertip
-        
+        # Landmark positions returned by process_frame are smoothed with a One-Euro filter
+        if smoothing is None:
+            smoothing = os.environ.get("FINGERTIP_FILTER", "1") != "0"
+        self.landmark_filter = OneEuroFilter() if smoothing else None
+
+        # Frames wider than this are downscaled before hand detection (0 keeps full resolution).
+        # Landmarks are normalized, so the gesture logic doesn't depend on the resolution.
+        if inference_width is None:
+            inference_width = int(os.environ.get("INFERENCE_WIDTH", 320))
+        self.inference_width = inference_width
+        # Once a hand is tracked, only a region around it is passed to MediaPipe
+        if use_roi is None:
+            use_roi = os.environ.get("INFERENCE_ROI", "1") != "0"
+        self.use_roi = use_roi
+        self.roi_margin = roi_margin  # Padding around the hand, as a fraction of its size on each side
+        self.roi = None  # (x0, y0, x1, y1) in full-frame pixels, or None to search the whole frame
+        # Headless trackers (used by the WebSocket server) only return landmarks and never draw
+        # the landmark overlay; annotate=True on detect_hands/process_frame still requests it
+        self.headless = headless
+        # Landmarks of the first hand found by the last detect_hands call, as a (21, 3) float32 array
+        self.points = None
         
-    def get_smoothed_tip(self, tip):
-        self.tip_history.append((tip.x, tip.y))
-        avg_x = sum(p[0] for p in self.tip_history) / len(self.tip_history)
-        avg_y = sum(p[1] for p in self.tip_history) / len(self.tip_history)
-        return (avg_x, avg_y)
         
+    def smooth_landmarks(self, points, timestamp=None):
+        """
+        Return a copy of a (21, 3) landmark array with x and y filtered over time.
+        Gestures are classified on the raw landmarks; the smoothed ones are used for drawing.
+        """
+        if self.landmark_filter is None:
+            return points
+        smoothed = points.copy()
+        smoothed[:, :2] = self.landmark_filter(points[:, :2], time.monotonic() if timestamp is None else timestamp)
+        return smoothed
+
+    def reset(self):
+        """Forget all temporal state so the tracker can be reused for another user"""
+        self.hands.reset()
+        if self.landmark_filter:
+            self.landmark_filter.reset()
+        self.roi = None
+        self.points = None
+
+    def close(self):
+        """Release the MediaPipe graph"""
+        self.hands.close()
+
+
+    def prepare_frame(self, image, roi=None):
+        """Crop a BGR frame to roi, downscale it to the inference width and convert it to RGB"""
+        if roi:
+            x0, y0, x1, y1 = roi
+            image = image[y0:y1, x0:x1]
+        height, width = image.shape[:2]
+        if self.inference_width and width > self.inference_width:
+            scaled_height = max(1, round(height * self.inference_width / width))
+            image = cv2.resize(image, (self.inference_width, scaled_height), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    def roi_around(self, points, frame_shape):
+        """Square region around the hand with some margin, or None if it would cover most of the frame"""
+        height, width = frame_shape[:2]
+        (min_x, min_y), (max_x, max_y) = points[:, :2].min(axis=0), points[:, :2].max(axis=0)
+        min_x, max_x = float(min_x) * width, float(max_x) * width
+        min_y, max_y = float(min_y) * height, float(max_y) * height
+        size = max(max_x - min_x, max_y - min_y) * (1 + 2 * self.roi_margin)
+        size = max(size, min(width, height) * 0.3)  # Small hands still get enough context
+        center_x, center_y = (min_x + max_x) / 2, (min_y + max_y) / 2
+
+        x0, x1 = int(max(0, center_x - size / 2)), int(min(width, center_x + size / 2))
+        y0, y1 = int(max(0, center_y - size / 2)), int(min(height, center_y + size / 2))
+        if x1 - x0 < 2 or y1 - y0 < 2 or (x1 - x0) * (y1 - y0) > 0.6 * width * height:
+            return None
+        return (x0, y0, x1, y1)
+
+    @staticmethod
+    def map_to_frame(hand_landmarks, roi, frame_shape):
+        """Convert landmarks detected in a cropped region to normalized full-frame coordinates (in place)"""
+        height, width = frame_shape[:2]
+        x0, y0, x1, y1 = roi
+        for landmarks in hand_landmarks:
+            for landmark in landmarks.landmark:
+                landmark.x = (x0 + landmark.x * (x1 - x0)) / width
+                landmark.y = (y0 + landmark.y * (y1 - y0)) / height
+                landmark.z = landmark.z * (x1 - x0) / width
+
+    def detect_hands(self, image, annotate=None):
+        """Run hand detection. Returns (image, result); the landmark overlay is drawn onto image if annotating."""
+        if annotate is None:
+            annotate = not self.headless
+        roi = self.roi
+        result = self.hands.process(self.prepare_frame(image, roi))
+        if roi and not result.multi_hand_landmarks:
+            # The hand left the region (or moved too fast); search the whole frame again
+            roi = None
+            result = self.hands.process(self.prepare_frame(image))
 
-    def detect_hands(self, image):
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        result = self.hands.process(image_rgb)
         if result.multi_hand_landmarks:
+            if roi:
+                self.map_to_frame(result.multi_hand_landmarks, roi, image.shape)
+            # Converted once here; the ROI, gesture and fingertip position all use this array
+            self.points = landmark_array(result.multi_hand_landmarks[0])
+            self.roi = self.roi_around(self.points, image.shape) if self.use_roi else None
+        else:
+            self.points = None
+            self.roi = None
+
+        if annotate and result.multi_hand_landmarks:
             for landmarks in result.multi_hand_landmarks:
                 self.mp_drawing.draw_landmarks(image, landmarks, self.mp_hands.HAND_CONNECTIONS)
         return image, result
 
     def get_index_finger_position(self, landmarks):
-        """Extract the position of the index finger tip from landmarks"""
-        if landmarks:
-            index_tip = landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_TIP]
+        """Extract the position of the index finger tip from landmarks (a landmark list or array)"""
+        if landmarks is not None:
             # Return normalized coordinates (0-1)
-            return (index_tip.x, index_tip.y)
+            return tuple(fingertip(landmark_array(landmarks), INDEX_TIP).tolist())
         return None
 
-    def process_frame(self, image):
-        """Process a frame and return the processed image, detected landmarks, recognized gesture, and index finger position"""
+    def process_frame(self, image, annotate=None, timestamp=None):
+        """
+        Process a frame and return the processed image, detected landmarks, recognized gesture, and index finger position.
+        Landmarks are returned as a (21, 3) float32 array (None if no hand was found), smoothed
+        over time unless smoothing is disabled; the gesture is recognized from the raw landmarks.
+        Without annotation (the default for headless trackers) the processed image is None.
+        """
+        if annotate is None:
+            annotate = not self.headless
         # First detect hands in the image
-        processed_image, result = self.detect_hands(image)
+        processed_image, result = self.detect_hands(image, annotate=annotate)
+        if not annotate:
+            processed_image = None
         
-        # Extract landmarks if hands were detected
-        landmarks = None
+        # Landmarks were already converted to an array by detect_hands
+        points = self.points
         index_position = None
-        if result.multi_hand_landmarks:
-            landmarks = result.multi_hand_landmarks[0]
-            if landmarks:
-                index_position = self.get_index_finger_position(landmarks)
-        
-        # Recognize the gesture based on the landmarks
         gesture = "idle"
-        if landmarks:
-            gesture = self.recognize_gesture(landmarks)
+        if points is not None:
+            gesture = self.recognize_gesture(points)
+            points = self.smooth_landmarks(points, timestamp)
+            index_position = self.get_index_finger_position(points)
+        elif self.landmark_filter:
+            # The next stroke starts fresh instead of being pulled towards where the hand was lost
+            self.landmark_filter.reset()
             
-        return processed_image, landmarks, gesture, index_position
+        return processed_image, points, gesture, index_position
         
     def recognize_gesture(self, landmarks):
-        if landmarks:
-            # Get fingertip and base landmarks
-            tips = {
-                "thumb": landmarks.landmark[self.mp_hands.HandLandmark.THUMB_TIP],
-                "index": landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_TIP],
-                "middle": landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_TIP],
-                "ring": landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_TIP],
-                "pinky": landmarks.landmark[self.mp_hands.HandLandmark.PINKY_TIP],
-            }
-
-            bases = {
-                "thumb": landmarks.landmark[self.mp_hands.HandLandmark.THUMB_IP],
-                "index": landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_MCP],
-                "middle": landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_MCP],
-                "ring": landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_MCP],
-                "pinky": landmarks.landmark[self.mp_hands.HandLandmark.PINKY_MCP],
-            }
-
-            # Determine finger states
-            index_up = tips["index"].y < bases["index"].y
-            middle_up = tips["middle"].y < bases["middle"].y
-            thumb_down = tips["thumb"].y > bases["thumb"].y
-            ring_down = tips["ring"].y > bases["ring"].y
-            pinky_down = tips["pinky"].y > bases["pinky"].y
-            
-            # Calculate distance between index and middle fingertips
-            index_tip = tips["index"]
-            middle_tip = tips["middle"]
-            
-            # Calculate Euclidean distance between index and middle finger tips
-            # Convert to 3D coordinates for more accurate distance measurement
-            index_pos = (index_tip.x, index_tip.y, index_tip.z)
-            middle_pos = (middle_tip.x, middle_tip.y, middle_tip.z)
-            
-            # Calculate distance
-            tip_distance = ((index_pos[0] - middle_pos[0])**2 + 
-                           (index_pos[1] - middle_pos[1])**2 + 
-                           (index_pos[2] - middle_pos[2])**2)**0.5
-            
-            # 🖊️ Drawing: Only index up
-            if index_up and not middle_up and thumb_down and ring_down and pinky_down:
-                return "drawing"
-
-            # 🧽 Erasing: Index + middle up, others down
-            if index_up and middle_up and thumb_down and ring_down and pinky_down:
-                return "erase"
-
-            # ↩️ Undo: All fingers up
-            if index_up and middle_up and not thumb_down and not ring_down and not pinky_down:
-                return "idle"
-                
-            # Idle: We'll default to idle for any unrecognized gestures
-
-        return "drawing"
\ No newline at end of file
+        """Classify a hand given as a landmark list or a (21, 3) array. See gestures.classify."""
+        if landmarks is None:
+            return "drawing"
+        return classify(landmarks)
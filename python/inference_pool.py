@@ -0,0 +1,205 @@
+"""
+Inference executors for the WebSocket server.
+
+Frame decoding and MediaPipe inference are CPU bound, so running them on the
+asyncio event loop stalls every other session while one frame is processed.
+InferenceExecutor runs them on a worker pool instead:
+
+- "thread": a ThreadPoolExecutor sharing one TrackerPool, so each client's
+  tracker can run in parallel with everyone else's.
+- "process": one single-worker process per core, each with its own
+  TrackerPool. Clients are pinned to a worker so their tracker (and its
+  temporal state) always lives in the same process. If the worker
+  processes can't be started (or break), the executor falls back to
+  thread mode.
+"""
+
+import asyncio
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+
+from tracker_pool import TrackerPool, create_server_tracker
+
+INFERENCE_MODES = ("thread", "process")
+
+# Tracker pool owned by a worker process in process mode
+_process_pool = None
+
+
+def decode_frame(image_bytes):
+    """Decode JPEG/PNG bytes into a BGR image, or None if decoding fails"""
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if frame is None or frame.size == 0:
+        return None
+    return frame
+
+
+def _run_tracker(tracker_pool, key, image_bytes):
+    frame = decode_frame(image_bytes)
+    if frame is None:
+        return None
+
+    # Trackers in the pool are headless: no overlay is drawn and no image comes back
+    _, landmarks, gesture, index_position = tracker_pool.process_frame(key, frame)
+    return landmarks, gesture, index_position
+
+
+def _init_process_worker(pool_size, idle_timeout):
+    global _process_pool
+    _process_pool = TrackerPool(max_size=pool_size, idle_timeout=idle_timeout)
+
+
+def _process_frame_in_process(key, image_bytes):
+    return _run_tracker(_process_pool, key, image_bytes)
+
+
+def _release_in_process(key):
+    _process_pool.release(key)
+
+
+def _warm_up_in_process():
+    _process_pool.warm_up()
+
+
+class InferenceExecutor:
+    """
+    Runs decode + hand tracking for incoming frames on a worker pool, using a
+    dedicated HandTracker for every client key.
+    """
+    def __init__(self, mode=None, max_workers=None, pool_size=None, idle_timeout=None,
+                 tracker_factory=create_server_tracker):
+        # Allow configuring the executor via environment variables (e.g. in Docker)
+        self.mode = (mode or os.environ.get("INFERENCE_MODE", "thread")).lower()
+        if self.mode not in INFERENCE_MODES:
+            raise ValueError(f"Unknown inference mode '{self.mode}', expected one of {INFERENCE_MODES}")
+
+        if max_workers is None:
+            max_workers = int(os.environ.get("INFERENCE_WORKERS", 0)) or os.cpu_count() or 1
+        if pool_size is None:
+            pool_size = int(os.environ.get("TRACKER_POOL_SIZE", 0)) or max(8, max_workers)
+        if idle_timeout is None:
+            idle_timeout = float(os.environ.get("TRACKER_IDLE_TIMEOUT", 60))
+        self.max_workers = max_workers
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.tracker_factory = tracker_factory  # Used by the thread mode TrackerPool
+        # MediaPipe is loaded lazily: by warm_up() in the background, or by the first frame.
+        # ready becomes True once a tracker was built either way
+        self._ready = False
+
+        if self.mode == "process":
+            # Use spawn so workers don't inherit MediaPipe/OpenCV state from the parent
+            context = multiprocessing.get_context("spawn")
+            per_worker_size = math.ceil(pool_size / max_workers)
+            self._workers = [
+                ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=context,
+                    initializer=_init_process_worker,
+                    initargs=(per_worker_size, idle_timeout)
+                )
+                for _ in range(max_workers)
+            ]
+            self._assignments = {}  # key -> worker index
+            self._worker_load = [0] * max_workers
+        else:
+            self._start_threads()
+
+        print(f"Inference executor started in {self.mode} mode with {self.max_workers} workers "
+              f"and up to {self.pool_size} trackers")
+
+    def _start_threads(self):
+        self.tracker_pool = TrackerPool(max_size=self.pool_size, idle_timeout=self.idle_timeout,
+                                        tracker_factory=self.tracker_factory)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="inference"
+        )
+
+    def _fall_back_to_threads(self, error):
+        """Switch to thread mode when the worker processes can't be started or have died"""
+        if self.mode != "process":
+            return  # Another frame already switched
+        print(f"Inference worker processes failed ({error!r}), falling back to thread mode")
+        for worker in self._workers:
+            worker.shutdown(wait=False)
+        self.mode = "thread"
+        self._start_threads()
+
+    @property
+    def ready(self):
+        if not self._ready and self.mode == "thread":
+            self._ready = self.tracker_pool.ready.is_set()
+        return self._ready
+
+    def _worker_for(self, key):
+        index = self._assignments.get(key)
+        if index is None:
+            # Pin new clients to the least loaded worker process
+            index = min(range(len(self._workers)), key=self._worker_load.__getitem__)
+            self._assignments[key] = index
+            self._worker_load[index] += 1
+        return self._workers[index]
+
+    async def process_frame(self, key, image_bytes):
+        """
+        Decode and run hand tracking on an encoded frame without blocking the event loop.
+        image_bytes may be bytes or a memoryview; in thread mode it is decoded without copying.
+        key identifies the client whose tracker should be used.
+        Returns (landmarks, gesture, index_position), or None if the frame could not be decoded.
+        """
+        loop = asyncio.get_running_loop()
+        if self.mode == "process":
+            # memoryview payloads can't be pickled across the process boundary
+            if isinstance(image_bytes, memoryview):
+                image_bytes = image_bytes.tobytes()
+            try:
+                result = await loop.run_in_executor(self._worker_for(key), _process_frame_in_process, key, image_bytes)
+            except (BrokenProcessPool, OSError) as e:
+                self._fall_back_to_threads(e)
+            else:
+                # A frame that was decoded got as far as a tracker, which means MediaPipe loaded in that worker
+                if result is not None:
+                    self._ready = True
+                return result
+        return await loop.run_in_executor(self._executor, _run_tracker, self.tracker_pool, key, image_bytes)
+
+    async def warm_up(self):
+        """Load MediaPipe and build a tracker on every worker without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        if self.mode == "process":
+            try:
+                await asyncio.gather(*(loop.run_in_executor(worker, _warm_up_in_process) for worker in self._workers))
+            except (BrokenProcessPool, OSError) as e:
+                self._fall_back_to_threads(e)
+        if self.mode == "thread":
+            await loop.run_in_executor(self._executor, self.tracker_pool.warm_up)
+        self._ready = True
+
+    def release(self, key):
+        """Give the tracker leased to key back to the pool (e.g. when the client disconnects)"""
+        if self.mode == "process":
+            index = self._assignments.pop(key, None)
+            if index is not None:
+                self._worker_load[index] -= 1
+                try:
+                    self._workers[index].submit(_release_in_process, key)
+                except BrokenProcessPool:
+                    pass  # The worker and its trackers are gone; the next frame falls back to threads
+        else:
+            # Releasing may close a tracker that is still finishing a frame, so do it off the event loop too
+            self._executor.submit(self.tracker_pool.release, key)
+
+    def shutdown(self, wait=True):
+        if self.mode == "process":
+            for worker in self._workers:
+                worker.shutdown(wait=wait)
+        else:
+            self._executor.shutdown(wait=wait)
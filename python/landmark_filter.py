@@ -0,0 +1,70 @@
+"""
+One-Euro filtering of hand landmarks.
+
+Raw MediaPipe landmarks jitter by a few pixels from frame to frame, which
+shows up as wobbly strokes. A fixed moving average removes the jitter but
+lags behind fast movements. The One-Euro filter (Casiez et al., CHI 2012) is
+a low-pass filter whose cutoff frequency rises with speed: a slow or still
+fingertip is smoothed heavily, a fast one follows the hand closely. It uses
+the actual time between samples, so it keeps working when the frame rate is
+throttled.
+
+OneEuroFilter works on NumPy arrays, so all landmarks of a hand are filtered
+in one call.
+"""
+
+import math
+import os
+
+import numpy as np
+
+from frame_flow import MIN_CLIENT_FPS
+
+# A gap this long (seconds) means the hand was gone, not just a slow frame: at the throttled
+# minimum rate samples arrive 1 / MIN_CLIENT_FPS apart, so it spans several missed frames
+RESET_AFTER = 4.0 / MIN_CLIENT_FPS
+
+
+def smoothing_factor(cutoff, dt):
+    """Exponential smoothing factor for a low-pass filter with the given cutoff (Hz)"""
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class OneEuroFilter:
+    def __init__(self, min_cutoff=None, beta=None, d_cutoff=1.0, reset_after=RESET_AFTER):
+        # min_cutoff (Hz): smoothing of a still fingertip; lower removes more jitter but adds lag
+        self.min_cutoff = min_cutoff if min_cutoff is not None else float(os.environ.get("FINGERTIP_MIN_CUTOFF", 1.0))
+        # beta: how quickly the cutoff rises with speed (in normalized coordinates per second)
+        self.beta = beta if beta is not None else float(os.environ.get("FINGERTIP_BETA", 20.0))
+        self.d_cutoff = d_cutoff  # Cutoff for the speed estimate itself
+        self.reset_after = reset_after  # Seconds without samples after which the filter starts over
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.speed = None
+        self.timestamp = None
+
+    def __call__(self, value, timestamp):
+        """Filter one sample (a float array) taken at timestamp (seconds) and return the smoothed value"""
+        value = np.asarray(value, dtype=np.float32)
+        if self.value is None or self.value.shape != value.shape or timestamp - self.timestamp > self.reset_after:
+            self.value = value
+            self.speed = np.zeros_like(value)
+            self.timestamp = timestamp
+            return value
+
+        dt = timestamp - self.timestamp
+        if dt <= 0:
+            return self.value
+        self.timestamp = timestamp
+
+        # Smoothed speed, then a cutoff that grows with it
+        alpha = smoothing_factor(self.d_cutoff, dt)
+        self.speed = alpha * (value - self.value) / dt + (1 - alpha) * self.speed
+        cutoff = self.min_cutoff + self.beta * np.abs(self.speed)
+        tau = 1.0 / (2 * np.pi * cutoff)
+        alpha = 1.0 / (1.0 + tau / dt)
+        self.value = (alpha * value + (1 - alpha) * self.value).astype(np.float32)
+        return self.value
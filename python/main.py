@@ -1,11 +1,33 @@
+import argparse
 import sys
-from PyQt5.QtWidgets import QApplication
-from virtual_painter_gui import VirtualPainterGUI  # Import the canvas GUI directly
+
+from startup_profile import StartupProfiler
+
 
 def main():
-    app = QApplication(sys.argv)
-    painter_gui = VirtualPainterGUI()  # Instantiate VirtualPainterGUI instead of StartScreen
-    painter_gui.show()  # Show the canvas window directly
+    parser = argparse.ArgumentParser(description="DrawWave desktop painter")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print a breakdown of startup time")
+    args, qt_args = parser.parse_known_args()  # Remaining arguments are passed on to Qt
+    profiler = StartupProfiler(enabled=args.profile_startup)
+
+    with profiler.phase("import PyQt5"):
+        from PyQt5.QtCore import QTimer
+        from PyQt5.QtWidgets import QApplication
+    with profiler.phase("import virtual_painter_gui"):
+        from virtual_painter_gui import VirtualPainterGUI  # Import the canvas GUI directly
+
+    with profiler.phase("QApplication()"):
+        app = QApplication(sys.argv[:1] + qt_args)
+    with profiler.phase("VirtualPainterGUI()"):
+        painter_gui = VirtualPainterGUI()  # Instantiate VirtualPainterGUI instead of StartScreen
+        painter_gui.show()  # Show the canvas window directly
+
+    def event_loop_started():
+        profiler.mark("event loop running")
+        profiler.report()
+
+    QTimer.singleShot(0, event_loop_started)
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
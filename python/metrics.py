@@ -0,0 +1,29 @@
+"""
+Lightweight in-process counters for the WebSocket server.
+"""
+
+import time
+from collections import defaultdict
+
+
+class ServerMetrics:
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.started = time.monotonic()
+
+    def increment(self, name, amount=1):
+        self.counters[name] += amount
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def snapshot(self):
+        """Return all counters and gauges as a plain dict"""
+        data = {"uptime_seconds": round(time.monotonic() - self.started, 1)}
+        data.update(self.counters)
+        data.update(self.gauges)
+        return data
+
+    def format(self):
+        return ", ".join(f"{name}={value}" for name, value in sorted(self.snapshot().items()))
@@ -1,20 +1,198 @@
+"""
+Local SQLite store for saved drawings.
+
+Each drawing is stored as a compressed image (canvas_codecs, PNG by default)
+with its session, creation time and dimensions in indexed columns, so
+drawings can be listed and filtered without decoding any pixels. A small PNG
+thumbnail is kept in a separate table and can be queried on its own.
+
+The database runs in WAL mode, so readers don't block the writer. Inserts
+commit one by one unless they are grouped with batch() or save_drawings(),
+which write them in a single transaction. Listing is paginated by id and
+exposed as generators, so only one page of rows is in memory at a time.
+
+Databases from older versions, which pickled arbitrary objects into a
+drawings(id, data) table, are kept as drawings_legacy (drawings_legacy_2, ...
+if that name is taken) and not read.
+"""
+
 import sqlite3
-import pickle
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+import cv2
+
+from canvas_codecs import get_codec
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS drawings (
+        id INTEGER PRIMARY KEY,
+        session_id TEXT,
+        created_at REAL NOT NULL,
+        width INTEGER NOT NULL,
+        height INTEGER NOT NULL,
+        codec TEXT NOT NULL,
+        data BLOB NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS drawing_thumbnails (
+        drawing_id INTEGER PRIMARY KEY REFERENCES drawings(id) ON DELETE CASCADE,
+        width INTEGER NOT NULL,
+        height INTEGER NOT NULL,
+        data BLOB NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS drawings_session ON drawings(session_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS drawings_created ON drawings(created_at)",
+    "CREATE INDEX IF NOT EXISTS drawings_size ON drawings(width, height)",
+]
+
+# Columns returned when listing drawings (everything except the pixel data)
+METADATA_COLUMNS = ["id", "session_id", "created_at", "width", "height", "codec"]
+
 
 class Persistence:
-    def __init__(self, db_name="drawings.db"):
-        try:
-            self.connection = sqlite3.connect(db_name)
-            self.cursor = self.connection.cursor()
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS drawings (id INTEGER PRIMARY KEY, data BLOB)''')
-        except sqlite3.Error as e:
-            print(f"[ERROR] Database connection failed: {e}")
-    
-    def save_drawing(self, data):
-        data_blob = pickle.dumps(data)  # Convert the drawing data to binary format
-        self.cursor.execute("INSERT INTO drawings (data) VALUES (?)", (data_blob,))
+    def __init__(self, db_name="drawings.db", codec="png", thumbnail_size=128):
+        self.codec = get_codec(codec)
+        self.thumbnail_size = thumbnail_size  # Longest side of thumbnails in pixels
+        self.thumbnail_codec = get_codec("png")
+        self._batch_depth = 0
+        # Errors propagate: a Persistence without a working database would fail on every call
+        self.connection = sqlite3.connect(db_name)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")  # Durable enough with WAL, far fewer fsyncs
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.cursor = self.connection.cursor()
+        self._migrate_legacy_table()
+        for statement in SCHEMA:
+            self.cursor.execute(statement)
         self.connection.commit()
 
-    def get_drawings(self):
-        self.cursor.execute("SELECT * FROM drawings")
-        return self.cursor.fetchall()
+    def _migrate_legacy_table(self):
+        columns = [row[1] for row in self.cursor.execute("PRAGMA table_info(drawings)")]
+        if columns == ["id", "data"]:
+            # Pickled rows can't be loaded safely, so they are only kept aside, without
+            # overwriting a drawings_legacy table left by an earlier migration
+            tables = {row[0] for row in self.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            name, suffix = "drawings_legacy", 1
+            while name in tables:
+                suffix += 1
+                name = f"drawings_legacy_{suffix}"
+            self.cursor.execute(f"ALTER TABLE drawings RENAME TO {name}")
+            print(f"Moved pickled drawings from an older version to the {name} table")
+
+    def close(self):
+        self.connection.close()
+
+    @contextmanager
+    def batch(self):
+        """Group the saves inside the block into one transaction (rolled back if the block raises)"""
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.connection.rollback()
+            raise
+        self._batch_depth -= 1
+        if not self._batch_depth:
+            self.connection.commit()
+
+    def make_thumbnail(self, image):
+        height, width = image.shape[:2]
+        scale = min(1.0, self.thumbnail_size / max(width, height))
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def save_drawing(self, image, session_id=None, created_at=None):
+        """Store a BGR canvas image and return the new drawing id"""
+        height, width = image.shape[:2]
+        created_at = time.time() if created_at is None else created_at
+        self.cursor.execute(
+            "INSERT INTO drawings (session_id, created_at, width, height, codec, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (session_id, created_at, width, height, self.codec.name, self.codec.encode(image)))
+        drawing_id = self.cursor.lastrowid
+        thumbnail = self.make_thumbnail(image)
+        self.cursor.execute(
+            "INSERT INTO drawing_thumbnails (drawing_id, width, height, data) VALUES (?, ?, ?, ?)",
+            (drawing_id, thumbnail.shape[1], thumbnail.shape[0], self.thumbnail_codec.encode(thumbnail)))
+        if not self._batch_depth:
+            self.connection.commit()
+        return drawing_id
+
+    def save_drawings(self, images, session_id=None):
+        """Store several images in one transaction and return their ids"""
+        with self.batch():
+            return [self.save_drawing(image, session_id) for image in images]
+
+    def load_drawing(self, drawing_id):
+        """Decode a drawing's full image, or return None if it doesn't exist"""
+        row = self.connection.execute("SELECT codec, data FROM drawings WHERE id = ?", (drawing_id,)).fetchone()
+        if row is None:
+            return None
+        codec, data = row
+        return get_codec(codec).decode(data)
+
+    def load_thumbnail(self, drawing_id):
+        """PNG bytes of a drawing's thumbnail, or None"""
+        row = self.connection.execute(
+            "SELECT data FROM drawing_thumbnails WHERE drawing_id = ?", (drawing_id,)).fetchone()
+        return row[0] if row else None
+
+    def delete_drawing(self, drawing_id):
+        self.cursor.execute("DELETE FROM drawings WHERE id = ?", (drawing_id,))
+        if not self._batch_depth:
+            self.connection.commit()
+
+    def _filters(self, session_id, since, until, min_width, min_height):
+        clauses, params = [], []
+        for clause, value in [("d.session_id = ?", session_id), ("d.created_at >= ?", since),
+                              ("d.created_at < ?", until), ("d.width >= ?", min_width),
+                              ("d.height >= ?", min_height)]:
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        return clauses, params
+
+    def _pages(self, columns, join, filters, page_size, before_id=None):
+        """Yield rows newest first, fetching page_size rows per query (keyset pagination on id)"""
+        clauses, params = self._filters(*filters)
+        last_id = before_id
+        while True:
+            where = clauses + (["d.id < ?"] if last_id is not None else [])
+            query = f"SELECT {columns} FROM drawings d {join}"
+            if where:
+                query += " WHERE " + " AND ".join(where)
+            query += " ORDER BY d.id DESC LIMIT ?"
+            rows = self.connection.execute(
+                query, params + ([last_id] if last_id is not None else []) + [page_size]).fetchall()
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1][0]
+
+    def iter_drawings(self, session_id=None, since=None, until=None, min_width=None, min_height=None,
+                      page_size=100, before_id=None):
+        """Yield metadata dicts of matching drawings, newest first, without loading pixel data"""
+        columns = ", ".join(f"d.{column}" for column in METADATA_COLUMNS)
+        filters = (session_id, since, until, min_width, min_height)
+        for row in self._pages(columns, "", filters, page_size, before_id):
+            yield dict(zip(METADATA_COLUMNS, row))
+
+    def iter_thumbnails(self, session_id=None, since=None, until=None, min_width=None, min_height=None,
+                        page_size=100):
+        """Yield (drawing id, thumbnail PNG bytes) of matching drawings, newest first"""
+        filters = (session_id, since, until, min_width, min_height)
+        rows = self._pages("d.id, t.data", "JOIN drawing_thumbnails t ON t.drawing_id = d.id", filters, page_size)
+        for drawing_id, data in rows:
+            yield drawing_id, data
+
+    def get_drawings(self, session_id=None, limit=100, before_id=None):
+        """One page of drawing metadata, newest first; pass the last id as before_id for the next page"""
+        return list(islice(self.iter_drawings(session_id, page_size=limit, before_id=before_id), limit))
+
+    def count_drawings(self, session_id=None):
+        if session_id is None:
+            return self.connection.execute("SELECT COUNT(*) FROM drawings").fetchone()[0]
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM drawings WHERE session_id = ?", (session_id,)).fetchone()[0]
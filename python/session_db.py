@@ -1,17 +1,36 @@
 import requests
+from requests.adapters import HTTPAdapter
+import asyncio
+import functools
 import json
 import base64
+import os
+import random
 import traceback
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Outcome of a canvas update: saved, worth retrying later (network errors and 5xx
+# answers), or rejected by the API (4xx, e.g. a session that no longer exists)
+CANVAS_SAVED = "saved"
+CANVAS_RETRY = "retry"
+CANVAS_REJECTED = "rejected"
+
+
+def backoff_delay(attempt, base=0.5, maximum=4.0):
+    """Exponential backoff with jitter for the given retry attempt (0-based)"""
+    delay = min(maximum, base * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.0)
+
 
 class SessionDB:
     """
     A class to interact with the Node.js backend for session management.
     """
-    def __init__(self, api_url=None):
+    def __init__(self, api_url=None, timeout=None, pool_size=None):
         # Get the API URL from environment variable or fall back to default
         # This allows configuring the API URL via Docker environment variables
-        import os
         # Try different possible API URLs when in Docker
         # The host.docker.internal hostname allows reaching the host machine from inside Docker
         self.api_url = api_url or os.environ.get('API_URL', None)
@@ -33,6 +52,19 @@ class SessionDB:
         self.connection_enabled = True      # Flag to track if we should keep trying to connect
         self.connection_attempts = 0        # Count connection attempts
         self.max_connection_attempts = 3    # Maximum number of retries
+
+        # Seconds to wait for the API before giving up on a request
+        self.timeout = timeout or float(os.environ.get('API_TIMEOUT', 5))
+        # One HTTP session for all calls, so connections are pooled and kept alive
+        # instead of opening a new TCP connection per request
+        pool_size = pool_size or int(os.environ.get('API_POOL_SIZE', 8))
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
+
+    def close(self):
+        self.http.close()
     
     def check_session_exists(self, session_id):
         """
@@ -40,7 +72,7 @@ class SessionDB:
         Returns a tuple (exists, session_data) where exists is a boolean and session_data is the session data if it exists.
         """
         try:
-            response = requests.get(f"{self.api_url}/sessions/{session_id}")
+            response = self.http.get(f"{self.api_url}/sessions/{session_id}", timeout=self.timeout)
             data = response.json()
             
             if response.status_code == 200 and data.get('success'):
@@ -56,7 +88,7 @@ class SessionDB:
         Returns the session data or None if the session doesn't exist.
         """
         try:
-            response = requests.get(f"{self.api_url}/sessions/{session_id}")
+            response = self.http.get(f"{self.api_url}/sessions/{session_id}", timeout=self.timeout)
             data = response.json()
             
             if response.status_code == 200 and data.get('success'):
@@ -66,81 +98,121 @@ class SessionDB:
             print(f"Error getting session: {e}")
             return None
     
-    def create_user(self, user_name, session_id, room_id):
+    def create_user(self, user_name, session_id, room_id, max_retries=3):
         """
         Create a user in MongoDB with retry logic.
         """
-        max_retries = 3
-        retry_count = 0
-        
-        while retry_count < max_retries:
-            try:
-                print(f"Attempting to create user: {user_name} for session {session_id} (attempt {retry_count + 1})")
-                response = requests.post(
-                    f"{self.api_url}/users/create",
-                    json={
-                        "userName": user_name,
-                        "sessionId": session_id,
-                        "roomId": room_id
-                    },
-                    timeout=10  # Add timeout to prevent hanging requests
-                )
-                
-                data = response.json()
-                
-                if response.status_code == 201 and data.get('success'):
-                    print(f"Successfully created user: {user_name} for session {session_id}")
-                    return True, data.get('data')
-                elif response.status_code == 400 and "already exists" in data.get('message', ''):
-                    # User or session already exists, consider this a success
-                    print(f"User already exists: {user_name} for session {session_id}")
-                    return True, None
-                else:
-                    error_msg = data.get('message', 'Unknown error')
-                    print(f"Failed to create user: {error_msg} (Status: {response.status_code})")
-                    
-                    if retry_count < max_retries - 1:
-                        retry_count += 1
-                        time.sleep(1)  # Wait before retrying
-                        continue
-                    return False, None
-            except requests.exceptions.RequestException as e:
-                print(f"Network error creating user: {e}")
-                if retry_count < max_retries - 1:
-                    retry_count += 1
-                    time.sleep(1)  # Wait before retrying
-                    continue
-                return False, None
-            except Exception as e:
-                print(f"Unexpected error creating user: {e}")
-                print(traceback.format_exc())
-                return False, None
-            
-    def update_canvas_state(self, session_id, canvas_base64, is_drawing_layer=False):
+        for attempt in range(max_retries):
+            created, user_data, retry = self.try_create_user(user_name, session_id, room_id, attempt)
+            if created or not retry or attempt == max_retries - 1:
+                return created, user_data
+            time.sleep(backoff_delay(attempt))  # Wait before retrying
+        return False, None
+
+    def try_create_user(self, user_name, session_id, room_id, attempt=0):
         """
-        Update the canvas state in MongoDB. This allows canvas persistence between sessions.
+        Make a single attempt at creating a user.
+        Returns a tuple (created, user_data, retry) where retry tells whether another attempt may succeed.
         """
         try:
-            # Remove the data URL prefix if present
-            if canvas_base64.startswith('data:image/png;base64,'):
-                canvas_base64 = canvas_base64.replace('data:image/png;base64,', '')
-                
-            response = requests.post(
-                f"{self.api_url}/sessions/update-canvas",
+            print(f"Attempting to create user: {user_name} for session {session_id} (attempt {attempt + 1})")
+            response = self.http.post(
+                f"{self.api_url}/users/create",
                 json={
+                    "userName": user_name,
                     "sessionId": session_id,
-                    "canvasData": canvas_base64,
-                    "isDrawingLayer": is_drawing_layer
-                }
+                    "roomId": room_id
+                },
+                timeout=self.timeout  # Add timeout to prevent hanging requests
             )
             
             data = response.json()
-            if response.status_code == 200 and data.get('success'):
-                return True
-            return False
+            
+            if response.status_code == 201 and data.get('success'):
+                print(f"Successfully created user: {user_name} for session {session_id}")
+                return True, data.get('data'), False
+            elif response.status_code == 400 and "already exists" in data.get('message', ''):
+                # User or session already exists, consider this a success
+                print(f"User already exists: {user_name} for session {session_id}")
+                return True, None, False
+            else:
+                error_msg = data.get('message', 'Unknown error')
+                print(f"Failed to create user: {error_msg} (Status: {response.status_code})")
+                return False, None, True
+        except requests.exceptions.RequestException as e:
+            print(f"Network error creating user: {e}")
+            return False, None, True
+        except Exception as e:
+            print(f"Unexpected error creating user: {e}")
+            print(traceback.format_exc())
+            return False, None, False
+            
+    def update_canvas_state(self, session_id, canvas_base64, is_drawing_layer=False):
+        """
+        Update the canvas state in MongoDB. This allows canvas persistence between sessions.
+        """
+        try:
+            return self.post_canvas_state(session_id, canvas_base64, is_drawing_layer) == CANVAS_SAVED
         except Exception as e:
             print(f"Error updating canvas state: {e}")
             return False
+
+    def post_canvas_state(self, session_id, canvas_base64, is_drawing_layer=False):
+        """
+        Send a canvas update to the API and return CANVAS_SAVED, CANVAS_RETRY or
+        CANVAS_REJECTED. Network errors are raised so callers can retry.
+        """
+        response = self.http.post(
+            f"{self.api_url}/sessions/update-canvas",
+            json=self._canvas_update(session_id, canvas_base64, is_drawing_layer),
+            timeout=self.timeout
+        )
+        return self._canvas_result(response, session_id)
+
+    def post_canvas_batch(self, updates):
+        """
+        Send several canvas updates, given as (session_id, canvas_base64, is_drawing_layer)
+        tuples, in one request. Returns the outcome for the whole batch (see post_canvas_state),
+        or None if the API has no batch endpoint.
+        """
+        response = self.http.post(
+            f"{self.api_url}/sessions/update-canvas-batch",
+            json={"updates": [self._canvas_update(*update) for update in updates]},
+            timeout=self.timeout
+        )
+        
+        # Older backends answer unknown routes with Express' default HTML 404 page
+        if response.status_code == 404 and 'application/json' not in response.headers.get('Content-Type', ''):
+            return None
+        return self._canvas_result(response, f"batch of {len(updates)}")
+
+    @staticmethod
+    def _canvas_result(response, target):
+        if 400 <= response.status_code < 500:
+            try:
+                message = response.json().get('message')
+            except ValueError:
+                message = response.text
+            print(f"Session API rejected canvas update for {target} ({response.status_code}): {message}")
+            return CANVAS_REJECTED
+        try:
+            data = response.json()
+        except ValueError:
+            return CANVAS_RETRY
+        if response.status_code == 200 and data.get('success'):
+            return CANVAS_SAVED
+        return CANVAS_RETRY
+
+    @staticmethod
+    def _canvas_update(session_id, canvas_base64, is_drawing_layer):
+        # Remove the data URL prefix if present
+        if canvas_base64.startswith('data:image/png;base64,'):
+            canvas_base64 = canvas_base64.replace('data:image/png;base64,', '')
+        return {
+            "sessionId": session_id,
+            "canvasData": canvas_base64,
+            "isDrawingLayer": is_drawing_layer
+        }
             
     def get_all_active_sessions(self):
         """
@@ -162,7 +234,7 @@ class SessionDB:
         
         try:
             # Set a short timeout to avoid hanging
-            response = requests.get(f"{self.api_url}/sessions/active", timeout=3)
+            response = self.http.get(f"{self.api_url}/sessions/active", timeout=min(3, self.timeout))
             data = response.json()
             
             # Reset attempts counter on success
@@ -177,7 +249,6 @@ class SessionDB:
             
             # Try alternate URLs if available
             if self.connection_attempts < self.max_connection_attempts:
-                import os
                 possible_urls = [
                     'http://localhost:5000/api',           # Standard localhost
                     'http://host.docker.internal:5000/api', # Docker for Windows/Mac special DNS
@@ -197,3 +268,82 @@ class SessionDB:
         except Exception as e:
             print(f"Error getting active sessions: {e}")
             return None
+
+
+class AsyncSessionDB:
+    """
+    Non-blocking access to the session API for the WebSocket server.
+
+    Every call runs the corresponding SessionDB request on a small dedicated
+    thread pool (sharing SessionDB's pooled keep-alive connections), so a slow
+    or unreachable backend never stalls the event loop. Retries wait with
+    asyncio.sleep and exponential backoff instead of time.sleep.
+    """
+    def __init__(self, session_db=None, max_workers=None, max_retries=3):
+        self.db = session_db or SessionDB()
+        self.max_retries = max_retries
+        self.batch_supported = True  # Cleared once the API turns out to have no batch endpoint
+        max_workers = max_workers or int(os.environ.get('API_WORKERS', 4))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="session-db")
+
+    async def _call(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def check_session_exists(self, session_id):
+        return await self._call(self.db.check_session_exists, session_id)
+
+    async def get_session(self, session_id):
+        return await self._call(self.db.get_session, session_id)
+
+    async def get_all_active_sessions(self):
+        return await self._call(self.db.get_all_active_sessions)
+
+    async def create_user(self, user_name, session_id, room_id):
+        for attempt in range(self.max_retries):
+            created, user_data, retry = await self._call(self.db.try_create_user, user_name, session_id, room_id, attempt)
+            if created or not retry or attempt == self.max_retries - 1:
+                return created, user_data
+            await asyncio.sleep(backoff_delay(attempt))
+        return False, None
+
+    async def _call_with_retry(self, fn, *args):
+        """Call fn on the executor, retrying network errors with backoff. Returns CANVAS_RETRY on failure."""
+        for attempt in range(self.max_retries):
+            try:
+                return await self._call(fn, *args)
+            except requests.exceptions.RequestException as e:
+                if attempt == self.max_retries - 1:
+                    print(f"Error updating canvas state: {e}")
+                    return CANVAS_RETRY
+                await asyncio.sleep(backoff_delay(attempt))
+            except Exception as e:
+                print(f"Error updating canvas state: {e}")
+                return CANVAS_RETRY
+        return CANVAS_RETRY
+
+    async def update_canvas_state(self, session_id, canvas_base64, is_drawing_layer=False):
+        """
+        Update the canvas state in MongoDB, retrying network errors with backoff.
+        Returns CANVAS_SAVED, CANVAS_RETRY or CANVAS_REJECTED.
+        """
+        return await self._call_with_retry(self.db.post_canvas_state, session_id, canvas_base64, is_drawing_layer)
+
+    async def update_canvas_states(self, updates):
+        """
+        Update several canvas states, given as (session_id, canvas_base64, is_drawing_layer) tuples,
+        and return the outcome of each update in order. Uses a single batch request when the API
+        supports it, otherwise one request per update.
+        """
+        if self.batch_supported and len(updates) > 1:
+            result = await self._call_with_retry(self.db.post_canvas_batch, updates)
+            if result is not None:
+                return [result] * len(updates)
+            print("Session API has no batch endpoint, sending canvas updates one at a time")
+            self.batch_supported = False
+
+        return [await self.update_canvas_state(*update) for update in updates]
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.db.close()
@@ -0,0 +1,228 @@
+"""
+Memory-bounded storage for WebSocket server sessions.
+
+Every session holds a full Canvas plus its undo history, and sessions are
+kept after their last client leaves so users can reconnect. SessionStore
+behaves like the plain {session_id: state} dict it replaces, but sessions
+without clients are hibernated to disk once they have been idle for
+idle_ttl seconds, or earlier (least recently used first) when the resident
+sessions (canvas, undo history and cached snapshots) exceed max_bytes.
+A hibernated session is a PNG of the canvas plus a JSON metadata file,
+named after a hash of the session id so ids sent by clients can never
+point outside the directory or share files. Hibernated
+sessions are listed in `hibernated` but are not part of the mapping; they
+only come back through rehydrate(), which reads and decodes the files off
+the event loop. Hibernated files older than disk_ttl seconds are deleted
+(the canvas is still saved in MongoDB).
+
+Undo history is not kept across hibernation.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+
+class SessionStore(MutableMapping):
+    def __init__(self, session_factory, canvas_factory, directory=None, max_bytes=None, idle_ttl=None,
+                 disk_ttl=None):
+        # session_factory(room_id, canvas) builds a session state; canvas_factory() builds an empty Canvas
+        self.session_factory = session_factory
+        self.canvas_factory = canvas_factory
+        self.directory = directory or os.environ.get(
+            "SESSION_HIBERNATE_DIR", os.path.join(tempfile.gettempdir(), "drawwave-sessions"))
+        self.max_bytes = max_bytes or int(os.environ.get("SESSION_MEMORY_BUDGET", 256 * 1024 * 1024))
+        self.idle_ttl = idle_ttl if idle_ttl is not None else float(os.environ.get("SESSION_IDLE_TTL", 600))
+        # Seconds hibernated files are kept on disk (0 keeps them forever)
+        self.disk_ttl = disk_ttl if disk_ttl is not None else float(
+            os.environ.get("SESSION_HIBERNATE_TTL", 7 * 24 * 3600))
+        self.resident = OrderedDict()  # Least recently used first
+        self.last_used = {}
+        self.hibernated = {}  # {session_id: time it was hibernated}
+        self.hibernations = 0
+        self.rehydrations = 0
+        self.expirations = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        # Sessions hibernated by a previous run can still be rehydrated
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                self._index_file(os.path.join(self.directory, name))
+        self.expire_hibernated()
+
+    def __getitem__(self, session_id):
+        # Hibernated sessions raise KeyError; decoding them here would block the event loop
+        state = self.resident[session_id]
+        self.touch(session_id)
+        return state
+
+    def __setitem__(self, session_id, state):
+        if session_id in self.hibernated:
+            self._remove_files(session_id)
+        self.resident[session_id] = state
+        self.touch(session_id)
+
+    def __delitem__(self, session_id):
+        if session_id not in self.resident and session_id not in self.hibernated:
+            raise KeyError(session_id)
+        self.resident.pop(session_id, None)
+        self.last_used.pop(session_id, None)
+        if session_id in self.hibernated:
+            self._remove_files(session_id)
+
+    def __contains__(self, session_id):
+        return session_id in self.resident
+
+    def __iter__(self):
+        yield from list(self.resident)
+
+    def __len__(self):
+        return len(self.resident)
+
+    def touch(self, session_id):
+        """Mark a resident session as just used"""
+        self.resident.move_to_end(session_id)
+        self.last_used[session_id] = time.monotonic()
+
+    @staticmethod
+    def session_bytes(state):
+        """Approximate memory held by one session"""
+        canvas = state["canvas"]
+        snapshots = state["snapshots"].nbytes if "snapshots" in state else 0
+        return canvas.canvas.nbytes + canvas.history.nbytes + snapshots + len(state.get("drawing_layer") or "")
+
+    def resident_bytes(self):
+        return sum(self.session_bytes(state) for state in self.resident.values())
+
+    def eviction_candidates(self):
+        """
+        Sessions that should be hibernated: idle sessions past their TTL, then the least
+        recently used idle sessions until the resident ones fit the memory budget.
+        Sessions with connected clients are never evicted.
+        """
+        now = time.monotonic()
+        total = self.resident_bytes()
+        candidates = []
+        for session_id, state in self.resident.items():
+            if state["clients"]:
+                continue
+            if total > self.max_bytes or now - self.last_used[session_id] > self.idle_ttl:
+                candidates.append(session_id)
+                total -= self.session_bytes(state)
+        return candidates
+
+    def hibernate(self, session_id):
+        """Write an idle session to disk and drop it from memory. Returns False if it is in use."""
+        state = self.resident.get(session_id)
+        if state is None or state["clients"]:
+            return False
+
+        with state["lock"]:
+            canvas = state["canvas"]
+            # Usually already encoded by the final save to MongoDB just before hibernating
+            png = state["snapshots"].encoded(".png") if "snapshots" in state else canvas.encode(".png")
+            metadata = {
+                "room_id": state.get("room_id"),
+                "seq": state.get("seq", 0),
+                "color": list(canvas.color),
+                "drawing_layer": state.get("drawing_layer"),
+                "session_id": session_id,
+                "hibernated_at": time.time()
+            }
+
+        pixels_path, metadata_path = self._paths(session_id)
+        self._write_file(pixels_path, png)
+        # The metadata file is written last and marks the session as hibernated
+        self._write_file(metadata_path, json.dumps(metadata).encode("utf-8"))
+
+        del self.resident[session_id]
+        del self.last_used[session_id]
+        self.hibernated[session_id] = metadata["hibernated_at"]
+        self.hibernations += 1
+        return True
+
+    def expire_hibernated(self):
+        """Delete hibernated sessions older than disk_ttl. Returns their ids."""
+        if not self.disk_ttl:
+            return []
+        now = time.time()
+        expired = [session_id for session_id, hibernated_at in self.hibernated.items()
+                   if now - hibernated_at > self.disk_ttl and session_id not in self.resident]
+        for session_id in expired:
+            self._remove_files(session_id)
+        self.expirations += len(expired)
+        return expired
+
+    async def rehydrate(self, session_id):
+        """
+        Return a session, reading and decoding a hibernated one in a worker thread so
+        the event loop isn't blocked. Returns None if the session doesn't exist.
+        """
+        if session_id not in self.hibernated or session_id in self.resident:
+            return self.get(session_id)
+        loop = asyncio.get_running_loop()
+        metadata, canvas = await loop.run_in_executor(None, self._read_files, session_id)
+        # The session may have been recreated or deleted while its files were read
+        if session_id in self.hibernated and session_id not in self.resident:
+            self._install(session_id, metadata, canvas)
+        return self.get(session_id)
+
+    def _read_files(self, session_id):
+        """Load the metadata and decode the canvas of a hibernated session"""
+        pixels_path, metadata_path = self._paths(session_id)
+        with open(metadata_path, "rb") as f:
+            metadata = json.loads(f.read().decode("utf-8"))
+        canvas = self.canvas_factory()
+        with open(pixels_path, "rb") as f:
+            if canvas.restore_from_bytes(f.read()):
+                canvas.clear_dirty_tiles()
+        canvas.color = tuple(metadata.get("color") or canvas.color)
+        return metadata, canvas
+
+    def _install(self, session_id, metadata, canvas):
+        state = self.session_factory(metadata.get("room_id"), canvas)
+        state["seq"] = metadata.get("seq", 0)
+        if metadata.get("drawing_layer"):
+            state["drawing_layer"] = metadata["drawing_layer"]
+
+        self._remove_files(session_id)
+        self.resident[session_id] = state
+        self.rehydrations += 1
+        print(f"Rehydrated hibernated session {session_id}")
+
+    def _index_file(self, metadata_path):
+        # Files are named by the hash of the session id, which is stored in the metadata
+        try:
+            with open(metadata_path, "rb") as f:
+                metadata = json.loads(f.read().decode("utf-8"))
+            session_id = metadata["session_id"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring unreadable hibernated session file {metadata_path}: {e}")
+            return
+        if self._paths(session_id)[1] == metadata_path:
+            self.hibernated[session_id] = metadata.get("hibernated_at") or os.path.getmtime(metadata_path)
+
+    def _paths(self, session_id):
+        name = hashlib.sha256(session_id.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, name)
+        return base + ".png", base + ".json"
+
+    def _write_file(self, path, data):
+        # Write to a temporary file first so a crash never leaves a truncated file behind
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _remove_files(self, session_id):
+        self.hibernated.pop(session_id, None)
+        for path in self._paths(session_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,59 @@
+"""
+Cache of encoded snapshots of a session canvas.
+
+Several clients joining a busy room, keyframe requests and persistence all
+need the same full-canvas PNG. SnapshotCache keeps each encoding (raw bytes
+per format, base64 data URL) until Canvas.version changes, so repeated
+requests for an unchanged canvas are a dictionary lookup.
+"""
+
+import base64
+
+from canvas import to_data_url
+
+
+class SnapshotCache:
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.version = None  # Canvas version the cached entries belong to
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def nbytes(self):
+        """Memory held by the cached entries (bytes and ASCII strings)"""
+        return sum(len(value) for value in self.entries.values())
+
+    def get(self, key, encode):
+        """Return the entry for key, calling encode() to build it if the canvas changed since it was cached"""
+        if self.canvas.version != self.version:
+            self.entries.clear()
+            self.version = self.canvas.version
+        if key in self.entries:
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        value = self.entries[key] = encode()
+        return value
+
+    def encoded(self, ext=".png", params=None):
+        """The canvas encoded in the given image format"""
+        key = ("encoded", ext, tuple(params or ()))
+        return self.get(key, lambda: self.canvas.encode(ext, params))
+
+    def data_url(self, ext=".png", params=None):
+        """The canvas as a base64 data URL"""
+        key = ("data_url", ext, tuple(params or ()))
+        return self.get(key, lambda: to_data_url(self.encoded(ext, params), ext))
+
+    def codec_encoded(self, codec):
+        """The canvas encoded with a snapshot codec from canvas_codecs"""
+        return self.get(("codec", codec.name, codec.level), lambda: codec.encode(self.canvas.canvas))
+
+    def codec_data_url(self, codec):
+        """The canvas encoded with a snapshot codec, as a data URL of the codec's MIME type"""
+        def encode():
+            encoded = base64.b64encode(self.codec_encoded(codec)).decode("ascii")
+            return f"data:{codec.mime};base64,{encoded}"
+        return self.get(("codec_data_url", codec.name, codec.level), encode)
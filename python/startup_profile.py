@@ -0,0 +1,74 @@
+"""
+Startup profiling for the entry points (--profile-startup).
+
+StartupProfiler records how long the first import of every module took, how
+long named initialization phases took, and when milestones (e.g. "listening",
+"hand tracking ready") were reached, then prints them as a table. Import times
+are cumulative: a module's time includes the modules it imported first.
+"""
+
+import builtins
+import sys
+import time
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.imports = {}  # Module name -> seconds spent on its first import
+        self.phases = []  # (name, seconds)
+        self.marks = []  # (name, seconds since the profiler was created)
+        self._original_import = None
+        if enabled:
+            self.install_import_hook()
+
+    def install_import_hook(self):
+        """Time every import of a module that isn't loaded yet"""
+        original = self._original_import = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules:
+                return original(name, globals, locals, fromlist, level)
+            start = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                self.imports.setdefault(name, time.perf_counter() - start)
+
+        builtins.__import__ = timed_import
+
+    def uninstall_import_hook(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block of initialization code"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def mark(self, name):
+        """Record that a milestone was reached"""
+        self.marks.append((name, time.perf_counter() - self.started))
+
+    def report(self, top=15):
+        """Print the breakdown (only if profiling is enabled)"""
+        if not self.enabled:
+            return
+        print("Startup profile:")
+        print("  Initialization phases:")
+        for name, seconds in self.phases:
+            print(f"    {name:<48} {seconds * 1000:>9.1f} ms")
+        print("  Milestones (since start):")
+        for name, seconds in self.marks:
+            print(f"    {name:<48} {seconds * 1000:>9.1f} ms")
+        slowest = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)[:top]
+        print(f"  Slowest first imports (cumulative, top {top}):")
+        for name, seconds in slowest:
+            print(f"    {name:<48} {seconds * 1000:>9.1f} ms")
@@ -0,0 +1,201 @@
+"""
+A pool of HandTracker instances leased to individual clients.
+
+Every HandTracker carries temporal state (MediaPipe's landmark tracking with
+static_image_mode=False and the fingertip smoothing history), so sharing one
+tracker between users mixes their frames together. TrackerPool hands each
+client its own tracker for as long as it keeps sending frames, reuses the
+MediaPipe graphs of released trackers instead of rebuilding them, evicts
+leases that have gone idle, and caps the total number of graphs. Clients
+beyond the cap are turned away rather than taking over another client's
+tracker, which would reset its tracking on every frame.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+def create_server_tracker():
+    # Imported on first use, so MediaPipe loads when the first tracker is built rather than at startup
+    from hand_tracking import HandTracker
+    # Server trackers never need the landmark overlay
+    return HandTracker(headless=True)
+
+
+class TrackerPoolFull(RuntimeError):
+    """Raised when every tracker is leased to an active client"""
+
+
+class PooledTracker:
+    """A HandTracker with the lock that serializes its use, and the lease currently holding it"""
+    def __init__(self, tracker):
+        self.tracker = tracker
+        # Held while the tracker runs inference, is reset or closed, so one MediaPipe graph
+        # never runs on two threads at once, even while it moves from one lease to the next
+        self.lock = threading.Lock()
+        self.owner = None
+        # Set when a lease ends; the next lease resets the tracker before its first frame, so
+        # releasing never waits for a frame that is still being processed
+        self.needs_reset = False
+
+
+class TrackerLease:
+    def __init__(self, key, pooled):
+        self.key = key
+        self.pooled = pooled
+        self.last_used = time.monotonic()
+
+    @property
+    def tracker(self):
+        return self.pooled.tracker
+
+
+class TrackerPool:
+    """
+    Leases a dedicated HandTracker to each key (client or session).
+    Safe to use from multiple threads. When every tracker is leased to an active
+    client, new keys are rejected with TrackerPoolFull until one is released or goes idle.
+    """
+    def __init__(self, max_size=8, idle_timeout=60.0, tracker_factory=create_server_tracker):
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.tracker_factory = tracker_factory
+        # Set once a tracker was built, i.e. MediaPipe loaded successfully
+        self.ready = threading.Event()
+        self._leases = OrderedDict()  # key -> TrackerLease, least recently used first
+        self._free = []  # PooledTrackers whose graphs are kept warm for the next lease
+        self._building = 0  # Slots reserved for trackers being built outside the lock
+        self._lock = threading.Lock()
+
+    def _build(self):
+        pooled = PooledTracker(self.tracker_factory())
+        self.ready.set()
+        return pooled
+
+    def _lease_locked(self, key, pooled):
+        lease = TrackerLease(key, pooled)
+        pooled.owner = lease
+        self._leases[key] = lease
+        return lease
+
+    def acquire(self, key):
+        """Return the lease for key, reusing or creating a tracker if needed. Raises TrackerPoolFull."""
+        discarded = []
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is not None:
+                lease.last_used = time.monotonic()
+                self._leases.move_to_end(key)
+                return lease
+
+            self._evict_idle_locked(discarded)
+
+            full = False
+            if self._free:
+                lease = self._lease_locked(key, self._free.pop())
+            elif len(self._leases) + self._building < self.max_size:
+                self._building += 1  # Reserve a slot; the tracker is built below, outside the lock
+            else:
+                full = True
+        self._close(discarded)
+        if full:
+            # Taking over another client's tracker would reset its tracking on every frame
+            raise TrackerPoolFull(f"All {self.max_size} hand trackers are in use")
+        if lease is not None:
+            return lease
+
+        # Loading MediaPipe is slow and mustn't block acquire() for clients that already have a tracker
+        try:
+            pooled = self._build()
+        except BaseException:
+            with self._lock:
+                self._building -= 1
+            raise
+        with self._lock:
+            self._building -= 1
+            lease = self._leases.get(key)
+            if lease is None:
+                return self._lease_locked(key, pooled)
+            # Another thread leased a tracker to key while this one was built; keep it warm
+            self._free.append(pooled)
+            return lease
+
+    def warm_up(self, count=1):
+        """Build trackers before the first clients arrive, so they don't wait for MediaPipe to load"""
+        for _ in range(count):
+            with self._lock:
+                if len(self._leases) + len(self._free) + self._building >= self.max_size:
+                    return
+                self._building += 1
+            # Built outside the lock: loading MediaPipe is slow and mustn't block acquire()
+            try:
+                pooled = self._build()
+            except BaseException:
+                with self._lock:
+                    self._building -= 1
+                raise
+            with self._lock:
+                self._building -= 1
+                self._free.append(pooled)
+
+    def release(self, key):
+        """Return the tracker leased to key to the pool"""
+        discarded = []
+        with self._lock:
+            lease = self._leases.pop(key, None)
+            if lease is not None:
+                self._recycle_locked(lease, discarded)
+        self._close(discarded)
+
+    def evict_idle(self):
+        """Release every lease that has not been used within idle_timeout"""
+        discarded = []
+        with self._lock:
+            count = self._evict_idle_locked(discarded)
+        self._close(discarded)
+        return count
+
+    def _evict_idle_locked(self, discarded):
+        if not self.idle_timeout:
+            return 0
+        cutoff = time.monotonic() - self.idle_timeout
+        idle_keys = [key for key, lease in self._leases.items() if lease.last_used < cutoff]
+        for key in idle_keys:
+            self._recycle_locked(self._leases.pop(key), discarded)
+        return len(idle_keys)
+
+    def _recycle_locked(self, lease, discarded):
+        # Only detaches the lease: a frame may still be running on the tracker, and waiting
+        # for it here would block every other client's acquire()
+        pooled = lease.pooled
+        pooled.owner = None
+        pooled.needs_reset = True
+        # Only keep as many warm graphs as the pool is allowed to hold
+        if len(self._leases) + len(self._free) + self._building < self.max_size:
+            self._free.append(pooled)
+        else:
+            discarded.append(pooled)
+
+    def _close(self, discarded):
+        for pooled in discarded:
+            with pooled.lock:
+                pooled.tracker.close()
+
+    def process_frame(self, key, frame):
+        """Run the tracker leased to key on a frame. Raises TrackerPoolFull if no tracker is available."""
+        while True:
+            lease = self.acquire(key)
+            pooled = lease.pooled
+            with pooled.lock:
+                # The lease may have been released or evicted since acquire() returned;
+                # then its tracker belongs to the pool (or another client) and a new lease is needed
+                if pooled.owner is lease:
+                    if pooled.needs_reset:
+                        pooled.tracker.reset()
+                        pooled.needs_reset = False
+                    return pooled.tracker.process_frame(frame)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._leases)
@@ -1,14 +1,18 @@
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QSpacerItem, QSizePolicy, QFileDialog, QColorDialog
 from PyQt5.QtGui import QImage, QPixmap, QFont
 from PyQt5.QtCore import QTimer, Qt
-import cv2
+import time
 from canvas import Canvas
 from canvas_widget import CanvasWidget
-from hand_tracking import HandTracker
+from frame_flow import FrameSlot
+from gestures import INDEX_TIP, MIDDLE_TIP, GestureDebouncer, fingertip, midpoint
+from camera_pipeline import CaptureThread, InferenceThread, draw_landmarks
 
 class VirtualPainterGUI(QWidget):
     def __init__(self):
         super().__init__()
+        self.started_at = time.perf_counter()  # For measuring time to the first camera frame
+        self.first_frame_seconds = None
         self.setWindowTitle("AI Virtual Painter - Drawing Mode")
         self.setGeometry(100, 100, 1280, 720)
         self.setStyleSheet("""
@@ -20,21 +24,6 @@ class VirtualPainterGUI(QWidget):
             }
         """)
         
-        def find_available_camera(max_index=4):
-            for idx in range(max_index + 1):
-                cap = cv2.VideoCapture(idx)
-                if cap.isOpened():
-                    cap.release()
-                    return idx
-            return None
-        
-        camera_index = find_available_camera()
-        if camera_index is not None:
-            self.capture = cv2.VideoCapture(camera_index)
-        else:
-            self.capture = None
-            print("No camera found.")
-        
         self.color_preview = QLabel()
         self.color_preview.setFixedSize(32, 32)
         self.color_preview.setStyleSheet("""
@@ -46,8 +35,10 @@ class VirtualPainterGUI(QWidget):
         """)    
  
         # Initialize components
-        self.hand_tracker = HandTracker()
-        self.canvas = Canvas()
+        # Created on the inference thread when the camera first starts, so MediaPipe loads in the background
+        self.hand_tracker = None
+        self.gesture_debouncer = GestureDebouncer()  # Ignores single-frame gesture flickers
+        self.canvas = Canvas(smooth_strokes=True)
         self.mode = "gesture"
         
         # Initialize cursor position for tracking
@@ -56,6 +47,11 @@ class VirtualPainterGUI(QWidget):
         self.cursor_visible = False
         self.cursor_mode = "IDLE"
         
+        # Camera capture and hand tracking run on their own threads (see camera_pipeline)
+        self.capture_thread = None
+        self.inference_thread = None
+        self.last_points = None  # Latest landmarks, drawn over the camera preview
+        
         # Main layout
         main_layout = QVBoxLayout()
         main_layout.setContentsMargins(20, 20, 20, 20)
@@ -75,8 +71,22 @@ class VirtualPainterGUI(QWidget):
                 border: 2px solid #c7d2fe;
             }
         """)
+        self.camera_feed_label.setAlignment(Qt.AlignCenter)
         top_section.addWidget(self.camera_feed_label)
         
+        # Frame rate overlay in the corner of the camera feed
+        self.fps_label = QLabel(self.camera_feed_label)
+        self.fps_label.move(12, 10)
+        self.fps_label.setStyleSheet("""
+            QLabel {
+                background: rgba(15, 23, 42, 160);
+                color: white;
+                border-radius: 6px;
+                padding: 4px 8px;
+                font-size: 12px;
+            }
+        """)
+        
         # Canvas widget with styled frame
         self.canvas_widget = CanvasWidget(self.canvas)
         self.canvas_widget.setFixedSize(640, 480)
@@ -155,41 +165,99 @@ class VirtualPainterGUI(QWidget):
         
         
         
-        # Initialize webcam
+        # Start the webcam threads; the window shows right away while the camera starts
+        self.start_camera_pipeline()
         
-        
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_camera_feed)
-        self.timer.start(40)
+        self.fps_timer = QTimer(self)
+        self.fps_timer.timeout.connect(self.update_fps_overlay)
+        self.fps_timer.start(500)
+        self.update_fps_overlay()
     
-    # Keep existing functional methods unchanged below...
-    # (update_camera_feed, handle_gesture, back_button_click, etc.)
-    def update_camera_feed(self):
-        if self.mode != "gesture":
-            return  # Skip camera/gesture when not in gesture mode
-        
-        if not self.capture or not self.capture.isOpened():
+    def start_camera_pipeline(self):
+        """Open the camera and start capturing and tracking frames on background threads"""
+        if self.capture_thread:
             return
-        
-        ret, frame = self.capture.read()
-        if not ret:
-            print("❌ Could not access the webcam.")
+        self.camera_feed_label.setText("Starting camera…")
+        frames = FrameSlot()
+        self.capture_thread = CaptureThread(frames, self)
+        self.inference_thread = InferenceThread(frames, self.hand_tracker, parent=self)
+        self.capture_thread.frame_ready.connect(self.show_camera_frame)
+        self.capture_thread.failed.connect(self.show_camera_error)
+        self.inference_thread.result_ready.connect(self.apply_tracking_result)
+        self.inference_thread.start()
+        self.capture_thread.start()
+    
+    def stop_camera_pipeline(self):
+        """Stop the camera threads and release the camera"""
+        for thread in [self.capture_thread, self.inference_thread]:
+            if thread:
+                thread.stop()
+        if self.inference_thread:
+            # Keep the tracker, so restarting the camera doesn't load MediaPipe again
+            self.hand_tracker = self.inference_thread.hand_tracker
+        for thread in [self.capture_thread, self.inference_thread]:
+            if thread:
+                # The threads are children of the window and would otherwise live as long as it does
+                thread.deleteLater()
+        if self.hand_tracker:
+            self.hand_tracker.reset()
+        self.capture_thread = None
+        self.inference_thread = None
+        self.last_points = None
+    
+    def show_camera_error(self, message):
+        print(f"❌ {message}")
+        self.camera_feed_label.setText(message)
+    
+    def show_camera_frame(self):
+        """Show the newest captured frame (runs on the GUI thread at the camera's rate)"""
+        item = self.capture_thread.preview_slot.take() if self.capture_thread else None
+        if item is None:
             return
+        if self.first_frame_seconds is None:
+            self.first_frame_seconds = time.perf_counter() - self.started_at
+            print(f"First camera frame {self.first_frame_seconds:.2f}s after the window was created")
+        # The inference thread may still be reading this frame, so draw on a copy
+        frame = item[0].copy()
+        if self.last_points is not None:
+            draw_landmarks(frame, self.last_points)
         
-        frame = cv2.flip(frame, 1)  # Mirror the image for intuitive interaction
-        frame, result = self.hand_tracker.detect_hands(frame)
+        # Convert the frame to a format suitable for displaying in PyQt
+        height, width, channel = frame.shape
+        bytes_per_line = 3 * width
+        q_img = QImage(frame.data, width, height, bytes_per_line, QImage.Format_BGR888)
+        pixmap = QPixmap.fromImage(q_img)
+        self.camera_feed_label.setPixmap(pixmap)
+    
+    def update_fps_overlay(self):
+        camera = self.capture_thread.fps.rate() if self.capture_thread else 0
+        inference = self.inference_thread.fps.rate() if self.inference_thread else 0
+        paint = self.canvas_widget.paint_fps.rate()
+        text = f"Camera {camera:.0f} fps · Inference {inference:.0f} fps · Paint {paint:.0f} fps"
+        if self.first_frame_seconds is not None:
+            text += f" · First frame {self.first_frame_seconds:.2f}s"
+        self.fps_label.setText(text)
+        self.fps_label.adjustSize()
+    
+    def apply_tracking_result(self, result):
+        """Apply the landmarks and gesture of one tracked frame (runs on the GUI thread)"""
+        if self.mode != "gesture":
+            return  # Skip gestures when not in gesture mode
+        
+        # Landmarks are already smoothed; the gesture was recognized from the raw ones
+        points, gesture = result
+        self.last_points = points
 
         # Process hand gestures if any landmarks are detected
-        if result.multi_hand_landmarks:
-            landmarks = result.multi_hand_landmarks[0]
-            gesture = self.hand_tracker.recognize_gesture(landmarks)
+        if points is not None:
+            gesture = self.gesture_debouncer.update(gesture)
             
             # Update cursor position to track index finger tip
-            index_tip = landmarks.landmark[8]
+            index_x, index_y = fingertip(points, INDEX_TIP).tolist()
             
             # Set cursor position in window coordinates
-            self.cursor_x = int(index_tip.x * self.canvas.width)
-            self.cursor_y = int(index_tip.y * self.canvas.height)
+            self.cursor_x = int(index_x * self.canvas.width)
+            self.cursor_y = int(index_y * self.canvas.height)
             self.cursor_visible = True
             
             # Update cursor color based on gesture
@@ -206,7 +274,7 @@ class VirtualPainterGUI(QWidget):
             print(f"Cursor position: ({self.cursor_x}, {self.cursor_y}) Mode: {self.cursor_mode}")
             
             # Process the gesture
-            self.handle_gesture(gesture, landmarks)
+            self.handle_gesture(gesture, points)
         else:
             # If no hand detected, hide cursor
             self.cursor_visible = False
@@ -214,32 +282,21 @@ class VirtualPainterGUI(QWidget):
         # Draw cursor directly on canvas widget
         self.canvas_widget.set_cursor(self.cursor_x, self.cursor_y, self.cursor_visible, self.cursor_mode)
         
-        # Always force the canvas widget to update
-        self.canvas_widget.update()
-
-        # Convert the frame to a format suitable for displaying in PyQt
-        height, width, channel = frame.shape
-        bytes_per_line = 3 * width
-        q_img = QImage(frame.data, width, height, bytes_per_line, QImage.Format_BGR888)
-        pixmap = QPixmap.fromImage(q_img)
-        self.camera_feed_label.setPixmap(pixmap)
+        # Repaint only the changed pixels and the cursor, if anything changed at all
+        self.canvas_widget.refresh()
             
             
             
             
 
-    def handle_gesture(self, gesture, landmarks, smoothed_tip=None):
-        index_tip = landmarks.landmark[8]
-
+    def handle_gesture(self, gesture, points, smoothed_tip=None):
         if gesture == "drawing":
-            # Use raw index tip for responsive drawing
-            self.canvas.draw((index_tip.x, index_tip.y))
+            # The landmarks are already One-Euro filtered, which removes jitter without lagging fast strokes
+            self.canvas.draw(tuple(fingertip(points, INDEX_TIP).tolist()))
 
         elif gesture == "erase":
             # Keep midpoint logic for erasing if preferred
-            middle_tip = landmarks.landmark[12]
-            midpoint = ((index_tip.x + middle_tip.x) / 2, (index_tip.y + middle_tip.y) / 2)
-            self.canvas.erase(midpoint)
+            self.canvas.erase(tuple(midpoint(points, INDEX_TIP, MIDDLE_TIP).tolist()))
 
         elif gesture == "idle":
             self.canvas.reset_previous_points()
@@ -253,19 +310,23 @@ class VirtualPainterGUI(QWidget):
         self.start_screen.show()
 
 
+    def closeEvent(self, event):
+        self.stop_camera_pipeline()
+        super().closeEvent(event)
+
     def enable_mouse_mode(self):
         self.mode = "mouse"
-        self.capture.release()  # Stop webcam
+        self.stop_camera_pipeline()  # Stop webcam
         print("[MODE] Mouse Drawing Enabled")
 
     def enable_gesture_mode(self):
         self.mode = "gesture"
-        self.capture = cv2.VideoCapture(0)  # Restart webcam
+        self.start_camera_pipeline()  # Restart webcam (the last working device is tried first)
         print("[MODE] Gesture Drawing Enabled")
 
     def clear_canvas(self):
         self.canvas.clear()
-        self.canvas_widget.update()
+        self.canvas_widget.refresh()
 
     def save_canvas(self):
         options = QFileDialog.Options()
@@ -2,10 +2,28 @@
 Web Server Mode for Virtual Painter
 This will start a WebSocket server that accepts video frames from a web frontend,
 processes them for hand tracking, and sends back canvas data.
+
+Run with --profile-startup to print where startup time goes (imports, initialization
+phases, and when the server started listening and hand tracking became ready).
 """
 
-from websocket_server import run_server
+import argparse
 
-if __name__ == "__main__":
+from startup_profile import StartupProfiler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DrawWave WebSocket server")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print a breakdown of startup time")
+    args = parser.parse_args()
+
+    profiler = StartupProfiler(enabled=args.profile_startup)
     print("Starting WebSocket server for Virtual Painter...")
-    run_server() 
\ No newline at end of file
+    with profiler.phase("import websocket_server"):
+        from websocket_server import run_server
+    run_server(profiler if args.profile_startup else None)
+
+
+if __name__ == "__main__":
+    main()
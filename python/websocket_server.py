@@ -2,89 +2,259 @@ import asyncio
 import websockets
 import json
 import base64
-import cv2
-import numpy as np
 import uuid
-from hand_tracking import HandTracker
-from canvas import Canvas
+import os
+import time
+from http import HTTPStatus
+from canvas import Canvas, StrokeState
+from inference_pool import InferenceExecutor
+from tracker_pool import TrackerPoolFull
+from frame_protocol import parse_message, ProtocolError, MESSAGE_TYPE_FRAME
+from client_channel import ClientChannel, KEYFRAME_KEY
+from frame_flow import LatestFrameSlot, FrameRateController
+from metrics import ServerMetrics
 import threading
-import io
-from PIL import Image
-from session_db import SessionDB
+from session_db import AsyncSessionDB
+from canvas_writer import CanvasWriter
+from session_store import SessionStore
+from snapshot_cache import SnapshotCache
+from canvas_codecs import CODECS, PngCodec, get_codec, negotiate
+from gestures import INDEX_TIP, MIDDLE_TIP, GestureDebouncer, fingertip, midpoint as fingertip_midpoint
 
 class WebSocketServer:
-    def __init__(self, host="0.0.0.0", port=8765):
+    def __init__(self, host="0.0.0.0", port=8765, inference_mode=None, inference_workers=None,
+                 snapshot_codec=None, snapshot_level=None, profiler=None):
         self.host = host
         self.port = port
-        self.sessions = {}  # Dictionary to track sessions: {session_id: {"canvas": Canvas, "clients": set()}}
+        self.profiler = profiler  # StartupProfiler when started with --profile-startup
+        # Codec for full-canvas snapshots sent to clients (see canvas_codecs). Clients may pick
+        # another enabled codec at create_session/join_session.
+        snapshot_codec = snapshot_codec or os.environ.get("SNAPSHOT_CODEC", "png")
+        if snapshot_level is None and os.environ.get("SNAPSHOT_LEVEL"):
+            snapshot_level = int(os.environ["SNAPSHOT_LEVEL"])
+        enabled_codecs = os.environ.get("SNAPSHOT_CODECS", ",".join(CODECS)).split(",")
+        self.snapshot_codecs = {name: get_codec(name, snapshot_level)
+                                for name in set(enabled_codecs + [snapshot_codec]) if name}
+        self.default_codec = self.snapshot_codecs[snapshot_codec]
+        self.client_codecs = {}  # Codec negotiated by each client: {websocket: Codec}
+        # Stroke patches are always PNG, at the configured compression level
+        self.patch_params = PngCodec(snapshot_level).params()
+        # Sessions by ID: {session_id: {"canvas": Canvas, "clients": set()}}. Idle sessions are
+        # hibernated to disk to stay within a memory budget and rehydrated by load_session.
+        self.sessions = SessionStore(self.new_session_state, self.new_canvas)
+        self.session_sweep_interval = float(os.environ.get("SESSION_SWEEP_INTERVAL", 30))
+        # Summaries of the active sessions in MongoDB, loaded at startup: {session_id: summary}
+        self.session_index = {}
+        self.loading_sessions = {}  # Sessions being loaded from MongoDB: {session_id: Future}
+        # "lazy" starts accepting connections before the session index is loaded, "eager" waits for it
+        self.restore_mode = os.environ.get("SESSION_RESTORE_MODE", "lazy")
+        self.prefetch_limit = int(os.environ.get("SESSION_PREFETCH_LIMIT", 20))
+        self.prefetch_concurrency = int(os.environ.get("SESSION_PREFETCH_CONCURRENCY", 4))
+        self.started_at = None
+        self.first_connection_at = None
         self.client_sessions = {}  # Mapping of clients to their sessions: {websocket: session_id}
-        self.hand_tracker = HandTracker()
+        self.channels = {}  # Outbound message queue for each connected client: {websocket: ClientChannel}
+        self.send_queue_size = int(os.environ.get("SEND_QUEUE_SIZE", 256))
+        self.send_timeout = float(os.environ.get("SEND_TIMEOUT", 5))
+        # Memory budget for each session's undo/redo history
+        self.undo_budget_bytes = int(os.environ.get("UNDO_BUDGET_BYTES", 4 * 1024 * 1024))
+        # Decoding and hand tracking run on a worker pool so frames don't block the event loop
+        self.inference = InferenceExecutor(mode=inference_mode, max_workers=inference_workers)
+        # Newest unprocessed camera frame for each client: {websocket: LatestFrameSlot}
+        self.frame_slots = {}
+        self.max_client_fps = int(os.environ.get("MAX_CLIENT_FPS", 30))
+        # Gesture strokes are drawn as curves through the (filtered) fingertip positions
+        self.smooth_strokes = os.environ.get("STROKE_SMOOTHING", "1") != "0"
+        # Consecutive frames a new gesture must be seen before a client switches to it
+        self.gesture_debounce_frames = int(os.environ.get("GESTURE_DEBOUNCE_FRAMES", 3))
+        # Gesture and stroke state of each client's hand: {websocket: state from new_gesture_state()}
+        self.gesture_states = {}
+        self.metrics = ServerMetrics()
+        self.metrics_log_interval = float(os.environ.get("METRICS_LOG_INTERVAL", 60))
         self.lock = threading.Lock()
-        self.session_db = SessionDB()  # Initialize connection to MongoDB via Node.js API
+        # Connection to MongoDB via the Node.js API; requests run off the event loop
+        self.session_db = AsyncSessionDB()
+        # Canvas snapshots are saved write-behind: coalesced per session and flushed periodically
+        self.canvas_writer = CanvasWriter(self.session_db)
         
         # We'll restore sessions in start_server where we have an event loop
 
+    def new_canvas(self):
+        return Canvas(history_bytes=self.undo_budget_bytes, smooth_strokes=self.smooth_strokes)
+
+    def new_session_state(self, room_id=None, canvas=None):
+        """Build the in-memory state for a session"""
+        canvas = canvas if canvas is not None else self.new_canvas()
+        return {
+            "canvas": canvas,
+            "snapshots": SnapshotCache(canvas),  # Encoded full-canvas snapshots for the current version
+            "room_id": room_id,
+            "clients": set(),
+            "lock": threading.Lock(),
+            "seq": 0  # Sequence number of the last canvas change sent to clients
+        }
+
+    def new_gesture_state(self, session_id):
+        """
+        Gesture state of one client's hand. Every participant of a session draws with their own
+        hand, so the debouncer, the previous gesture and the stroke position are kept per client.
+        """
+        return {
+            "session_id": session_id,
+            "gestures": GestureDebouncer(self.gesture_debounce_frames),  # Stable gesture of this hand
+            "prev_gesture": "idle",
+            "stroke": StrokeState()
+        }
+
     def create_session(self):
         """Create a new session and return the session ID"""
         session_id = str(uuid.uuid4())[:8]  # Generate a shorter, user-friendly ID
-        self.sessions[session_id] = {
-            "canvas": Canvas(),
-            "clients": set(),
-            "lock": threading.Lock()
-        }
+        self.sessions[session_id] = self.new_session_state()
         return session_id
 
     async def restore_sessions_from_db(self):
-        """Restore active sessions from MongoDB on server start"""
+        """
+        Load the index of active sessions from MongoDB on server start. Canvases are
+        loaded on first access; the most recently updated ones are prefetched in the background.
+        """
         try:
-            # Get all active sessions from MongoDB via API
-            all_sessions = self.session_db.get_all_active_sessions()
+            # Get all active sessions from MongoDB via API. Each failed attempt switches to
+            # the next candidate API URL, so keep trying until the client gives up.
+            all_sessions = None
+            for _ in range(self.session_db.db.max_connection_attempts):
+                all_sessions = await self.session_db.get_all_active_sessions()
+                if all_sessions is not None or not self.session_db.db.connection_enabled:
+                    break
             if all_sessions and isinstance(all_sessions, list):
-                print(f"Restoring {len(all_sessions)} sessions from MongoDB")
                 for session in all_sessions:
-                    session_id = session.get('sessionId')
-                    room_id = session.get('roomId')
-                    if session_id and session_id not in self.sessions:
-                        # Initialize with empty clients set as no one is connected yet
-                        self.sessions[session_id] = {
-                            "canvas": Canvas(),
-                            "room_id": room_id,
-                            "clients": set(),
-                            "lock": threading.Lock()
-                        }
-                        
-                        # If there's canvas data, restore it
-                        if session.get('canvasData'):
-                            try:
-                                canvas_data = f"data:image/png;base64,{session.get('canvasData')}"
-                                # TODO: Restore canvas state if needed
-                            except Exception as e:
-                                print(f"Error restoring canvas for session {session_id}: {e}")
-                                
-                        print(f"Restored session {session_id} with room {room_id}")
+                    if session.get('sessionId'):
+                        self.session_index[session['sessionId']] = session
+                print(f"Indexed {len(self.session_index)} active sessions from MongoDB")
         except Exception as e:
             print(f"Error restoring sessions from DB: {e}")
+            return
+
+        # Sessions come back most recently updated first
+        prefetch = [session_id for session_id, session in self.session_index.items()
+                    if session_id not in self.sessions
+                    and (session.get('hasCanvasData') or session.get('hasDrawingLayerData'))]
+        prefetch = prefetch[:self.prefetch_limit]
+        if prefetch:
+            semaphore = asyncio.Semaphore(self.prefetch_concurrency)
+
+            async def prefetch_session(session_id):
+                async with semaphore:
+                    await self.load_session(session_id)
 
-    async def broadcast_to_session(self, session_id, message, exclude=None):
+            started = time.monotonic()
+            await asyncio.gather(*(prefetch_session(session_id) for session_id in prefetch))
+            print(f"Prefetched {len(prefetch)} sessions in {time.monotonic() - started:.2f}s")
+
+    async def load_session(self, session_id):
+        """
+        Return the state of a session, rehydrating it from disk if it is hibernated or
+        loading it from MongoDB if it isn't known at all. Both decode the canvas off the
+        event loop, and concurrent loads of the same session share one request. Returns
+        None if the session doesn't exist.
+        """
+        if session_id in self.sessions.resident:
+            return self.sessions[session_id]
+        if session_id not in self.loading_sessions:
+            if session_id in self.sessions.hibernated:
+                future = asyncio.ensure_future(self.sessions.rehydrate(session_id))
+            else:
+                future = asyncio.ensure_future(self._load_session_from_db(session_id))
+            future.add_done_callback(lambda _: self.loading_sessions.pop(session_id, None))
+            self.loading_sessions[session_id] = future
+        # Shielded so a client disconnecting mid-join doesn't cancel the load for everyone else
+        return await asyncio.shield(self.loading_sessions[session_id])
+
+    async def _load_session_from_db(self, session_id):
+        mongo_session = await self.session_db.get_session(session_id)
+        if not mongo_session:
+            return None
+        # A client may have created the session while the request was in flight
+        if session_id in self.sessions:
+            return self.sessions[session_id]
+
+        room_id = mongo_session.get("roomId")
+        print(f"Session {session_id} found in MongoDB with room {room_id}, restoring")
+        canvas = self.new_canvas()
+        canvas_data = mongo_session.get("canvasData")
+        if canvas_data:
+            # PNG decoding runs off the event loop; nobody else can see this canvas yet
+            loop = asyncio.get_running_loop()
+            if await loop.run_in_executor(None, canvas.restore_from_base64, canvas_data):
+                canvas.clear_dirty_tiles()
+            else:
+                print(f"Error restoring canvas for session {session_id}: invalid image data")
+
+        if session_id in self.sessions:
+            return self.sessions[session_id]
+        session = self.new_session_state(room_id, canvas)
+
+        # Also restore drawing layer if available
+        drawing_data = mongo_session.get("drawingLayerData") or mongo_session.get("drawingData")
+        if drawing_data and drawing_data.startswith("data:image/png;base64,"):
+            # Store drawing layer in session for future reconnections
+            session["drawing_layer"] = drawing_data
+
+        self.sessions[session_id] = session
+        return session
+
+    def send_to_client(self, websocket, message, supersede=None, delta=False):
+        """
+        Queue a message on the client's outbound channel. Messages sent with the same
+        supersede key replace each other if the client hasn't received the older one yet.
+        Canvas deltas (delta=True) are replaced by a keyframe queued after them.
+        """
+        channel = self.channels.get(websocket)
+        if channel is None:
+            return False
+        return channel.send(message, supersede=supersede, delta=delta)
+
+    async def broadcast_to_session(self, session_id, message, exclude=None, supersede=None, delta=False):
         """Broadcast a message to all clients in a session except the excluded one"""
         if session_id not in self.sessions:
             return
 
+        # Enqueueing never waits on a client, so one slow participant can't delay the others
+        dead_clients = []
         for client in self.sessions[session_id]["clients"]:
             if client != exclude:
-                try:
-                    # Try to send the message directly without checking open attribute
-                    await client.send(message)
-                except Exception as e:
-                    # Connection might be closed or other error occurred
-                    print(f"Error sending message to client: {str(e)}")
-                    pass
+                if not self.send_to_client(client, message, supersede=supersede, delta=delta):
+                    dead_clients.append(client)
+
+        # Prune clients whose connection is gone or who were disconnected as slow consumers
+        for client in dead_clients:
+            self.sessions[session_id]["clients"].discard(client)
 
     async def handle_client(self, websocket):
+        if self.first_connection_at is None and self.started_at is not None:
+            self.first_connection_at = time.monotonic()
+            time_to_first_connection = self.first_connection_at - self.started_at
+            self.metrics.set_gauge("time_to_first_connection_seconds", round(time_to_first_connection, 3))
+            print(f"First client connected {time_to_first_connection:.2f}s after startup")
         session_id = None
+        # Identifies this connection's hand tracker in the inference pool
+        client_key = uuid.uuid4().hex
+        self.channels[websocket] = ClientChannel(websocket, max_queue=self.send_queue_size,
+                                                 send_timeout=self.send_timeout)
+        # Frames are processed one at a time by this client's frame worker; while it is busy,
+        # newer frames replace older ones in the slot instead of queueing up
+        frame_slot = LatestFrameSlot()
+        self.frame_slots[websocket] = frame_slot
+        frame_task = asyncio.create_task(self.frame_worker(websocket, client_key, frame_slot))
         try:
             async for message in websocket:
                 try:
+                    # Binary messages carry raw camera frames (see frame_protocol)
+                    if isinstance(message, (bytes, bytearray, memoryview)):
+                        if websocket in self.client_sessions:
+                            session_id = self.client_sessions[websocket]
+                        await self.handle_binary_message(websocket, session_id, client_key, message)
+                        continue
+                    
                     # Parse the incoming message
                     data = json.loads(message)
                     message_type = data.get("type")
@@ -103,21 +273,20 @@ class WebSocketServer:
                             # Validate required fields
                             if not user_name or not room_id or not session_id:
                                 print(f"Error: Missing required fields for create_session: user_name={user_name}, room_id={room_id}, session_id={session_id}")
-                                await websocket.send(json.dumps({
+                                self.send_to_client(websocket, json.dumps({
                                     "type": "error",
                                     "success": False,
                                     "message": "Missing required fields for session creation. Please try again."
                                 }))
                                 continue
     
+                            # A hibernated session, or one saved in MongoDB (possibly not indexed yet in lazy
+                            # restore mode), is restored with its canvas instead of being overwritten by a blank one
+                            await self.load_session(session_id)
+
                             # Create the session in-memory
                             if session_id not in self.sessions:
-                                self.sessions[session_id] = {
-                                    "canvas": Canvas(),
-                                    "room_id": room_id,
-                                    "clients": set(),
-                                    "lock": threading.Lock()
-                                }
+                                self.sessions[session_id] = self.new_session_state(room_id)
                                 print(f"Created new session in memory: {session_id} with room {room_id}")
                             else:
                                 print(f"Session {session_id} already exists in memory, using existing session")
@@ -126,7 +295,7 @@ class WebSocketServer:
                             self.client_sessions[websocket] = session_id
     
                             # Validate with MongoDB and add user if needed
-                            user_created, user_info = self.session_db.create_user(user_name, session_id, room_id)
+                            user_created, user_info = await self.session_db.create_user(user_name, session_id, room_id)
                             
                             if not user_created:
                                 print(f"Warning: Failed to create user in database, but proceeding with in-memory session")
@@ -134,7 +303,7 @@ class WebSocketServer:
 
                             # Get session info from database if available
                             try:
-                                session_info = self.session_db.get_session(session_id)
+                                session_info = await self.session_db.get_session(session_id)
                                 participant_count = 1  # Default to 1
                                 if session_info and "participants" in session_info:
                                     participant_count = session_info["participants"]
@@ -142,23 +311,23 @@ class WebSocketServer:
                                 print(f"Error getting session info from database: {e}")
                                 # Continue with default participant count if database query fails
 
-                            # Get current canvas state to send to the new client
-                            canvas_base64 = ""
+                            # Get current canvas state (keyframe) to send to the new client
+                            codec = self.negotiate_codec(websocket, data.get("codecs"))
+                            canvas_data_url, seq = None, 0
                             try:
-                                with self.sessions[session_id]["lock"]:
-                                    canvas_image = self.sessions[session_id]["canvas"].get_canvas()
-                                    _, buffer = cv2.imencode('.png', canvas_image)
-                                    canvas_base64 = base64.b64encode(buffer).decode('utf-8')
+                                canvas_data_url, seq = self.canvas_keyframe(session_id, codec)
                             except Exception as e:
                                 print(f"Error getting canvas state: {e}")
                                 # Continue with empty canvas if this fails
 
                             # Notify client they've created a session successfully (with canvas data if available)
-                            await websocket.send(json.dumps({
+                            self.send_to_client(websocket, json.dumps({
                                 "type": "session_created",
                                 "session_id": session_id,
                                 "room_id": room_id,
-                                "canvas": f"data:image/png;base64,{canvas_base64}" if canvas_base64 else None,
+                                "canvas": canvas_data_url,
+                                "codec": codec.name,
+                                "seq": seq,
                                 "participants": len(self.sessions[session_id]["clients"]),
                                 "success": True,
                                 "message": "Successfully created session"
@@ -180,7 +349,7 @@ class WebSocketServer:
                             
                             # Send error message back to client
                             try:
-                                await websocket.send(json.dumps({
+                                self.send_to_client(websocket, json.dumps({
                                     "type": "error",
                                     "success": False,
                                     "message": f"Failed to create session: {str(e)}"
@@ -194,67 +363,21 @@ class WebSocketServer:
                         requested_session_id = data.get("session_id")
                         user_name = data.get("user_name")
                         
-                        # First check if session exists in memory
-                        if requested_session_id in self.sessions:
+                        # Look the session up in memory, on disk (hibernated) or in MongoDB
+                        session = await self.load_session(requested_session_id) if requested_session_id else None
+                        if session:
                             session_id = requested_session_id
-                            room_id = self.sessions[session_id].get("room_id")
-                            print(f"Session {session_id} found in memory with room {room_id}")
+                            room_id = session.get("room_id")
+                            print(f"Session {session_id} found with room {room_id}")
                         else:
-                            # If not in memory, check MongoDB
-                            mongo_session = self.session_db.get_session(requested_session_id)
-                            if mongo_session:
-                                # Session exists in MongoDB but not in memory, create it
-                                session_id = requested_session_id
-                                room_id = mongo_session.get("roomId")
-                                
-                                print(f"Session {session_id} found in MongoDB with room {room_id}, restoring")
-                                
-                                canvas = Canvas()
-                                
-                                # Try to restore canvas state from MongoDB if available
-                                if mongo_session.get("canvasData"):
-                                    try:
-                                        canvas_data = f"data:image/png;base64,{mongo_session.get('canvasData')}"
-                                        # TODO: If you have a method to restore canvas state, call it here
-                                        # canvas.restore_from_base64(canvas_data)
-                                    except Exception as e:
-                                        print(f"Error restoring canvas: {e}")
-                                
-                                self.sessions[session_id] = {
-                                    "canvas": canvas,
-                                    "room_id": room_id,
-                                    "clients": set(),
-                                    "lock": threading.Lock()
-                                }
-                                
-                                # Restore canvas state if available
-                                try:
-                                    canvas_data = mongo_session.get("canvasData")
-                                    if canvas_data and canvas_data.startswith("data:image/png;base64,"):
-                                        # Extract base64 part and restore canvas
-                                        base64_data = canvas_data.split(",")[1]
-                                        canvas_bytes = base64.b64decode(base64_data)
-                                        img = Image.open(io.BytesIO(canvas_bytes))
-                                        cv_img = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-                                        self.sessions[session_id]["canvas"].set_canvas(cv_img)
-                                        
-                                    # Also restore drawing layer if available
-                                    drawing_data = mongo_session.get("drawingData")
-                                    if drawing_data and drawing_data.startswith("data:image/png;base64,"):
-                                        # Store drawing layer in session for future reconnections
-                                        self.sessions[session_id]["drawing_layer"] = drawing_data
-                                        print(f"Restored drawing layer data for session {session_id}")
-                                except Exception as e:
-                                    print(f"Error restoring canvas or drawing data: {e}")
-                            else:
-                                print(f"Session not found: {requested_session_id}")
-                                await websocket.send(json.dumps({
-                                    "type": "error",
-                                    "success": False,
-                                    "message": "Session not found or has expired. Please create a new session.",
-                                    "errorCode": "session_not_found"
-                                }))
-                                continue
+                            print(f"Session not found: {requested_session_id}")
+                            self.send_to_client(websocket, json.dumps({
+                                "type": "error",
+                                "success": False,
+                                "message": "Session not found or has expired. Please create a new session.",
+                                "errorCode": "session_not_found"
+                            }))
+                            continue
                         
                         # Session exists, add client
                         # First, check if this client is already in the session to avoid duplicates
@@ -265,13 +388,11 @@ class WebSocketServer:
                         else:
                             print(f"Client already in session {session_id}, ensuring connection is valid")
                         
-                        # Get current canvas state
-                        canvas_base64 = ""
+                        # Get current canvas state (keyframe)
+                        codec = self.negotiate_codec(websocket, data.get("codecs"))
+                        canvas_data_url, seq = None, 0
                         try:
-                            with self.sessions[session_id]["lock"]:
-                                canvas_image = self.sessions[session_id]["canvas"].get_canvas()
-                                _, buffer = cv2.imencode('.png', canvas_image)
-                                canvas_base64 = base64.b64encode(buffer).decode('utf-8')
+                            canvas_data_url, seq = self.canvas_keyframe(session_id, codec)
                         except Exception as e:
                             print(f"Error getting canvas state for join_session: {e}")
                             
@@ -283,15 +404,17 @@ class WebSocketServer:
                             except Exception as e:
                                 print(f"Error getting drawing layer for join_session: {e}")
                         
-                        # Create or update user in MongoDB
-                        self.session_db.create_user(user_name, session_id, room_id)
+                        # Create or update user in MongoDB in the background; the join doesn't depend on it
+                        asyncio.create_task(self.session_db.create_user(user_name, session_id, room_id))
 
                         # Notify the client that they've joined successfully
-                        await websocket.send(json.dumps({
+                        self.send_to_client(websocket, json.dumps({
                             "type": "session_joined",
                             "session_id": session_id,
                             "room_id": room_id,
-                            "canvas": f"data:image/png;base64,{canvas_base64}" if canvas_base64 else None,
+                            "canvas": canvas_data_url,
+                            "codec": codec.name,
+                            "seq": seq,
                             "drawing": drawing_base64 if drawing_base64 else None,
                             "participants": len(self.sessions[session_id]["clients"]),
                             "success": True,
@@ -316,7 +439,7 @@ class WebSocketServer:
                             continue
                         else:
                             print(f"Error: No active session for message type {message_type}. Client session mapping: {websocket in self.client_sessions}")
-                            await websocket.send(json.dumps({
+                            self.send_to_client(websocket, json.dumps({
                                 "type": "error",
                                 "message": "No active session. Please create or join a session.",
                                 "errorCode": "no_active_session"
@@ -324,106 +447,56 @@ class WebSocketServer:
                             continue
 
                     if message_type == "frame":
-                        # Process video frame
+                        # Legacy JSON frame message carrying a base64 data URL
                         frame_data = data.get("frame")
 
                         # Validate frame data
                         if not frame_data or ',' not in frame_data:
                             print("Error: Invalid frame data format")
-                            await websocket.send(json.dumps({
+                            self.send_to_client(websocket, json.dumps({
                                 "type": "error",
                                 "message": "Invalid frame data format"
                             }))
                             continue
 
-                        # Skip redundant check as we already checked for session validity above
-                        # This check was causing issues with session reconnection
-                        # No need to check again as the main check at the start of message processing covers this
-
                         try:
-                            # Extract base64 data
+                            # Extract and decode base64 data
                             base64_data = frame_data.replace("data:image/jpeg;base64,", "")
-                            
-                            try:
-                                # Decode base64 image
-                                image_data = base64.b64decode(base64_data)
-                                nparr = np.frombuffer(image_data, np.uint8)
-                                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                                
-                                # Skip processing if frame is invalid
-                                if frame is None or frame.size == 0:
-                                    continue
-                                
-                                # Process the frame with hand tracking
-                                # Now receiving index_position as well
-                                frame, landmarks, gesture, index_position = self.hand_tracker.process_frame(frame)
-                                
-                                if landmarks:
-                                    # Send cursor position to client if index finger is detected
-                                    if index_position:
-                                        await websocket.send(json.dumps({
-                                            "type": "hand_position",
-                                            "position": {
-                                                "x": index_position[0],  # x coordinate (0-1)
-                                                "y": index_position[1]   # y coordinate (0-1)
-                                            },
-                                            "mode": gesture
-                                        }))
-                                    
-                                    # Get the Canvas instance from the session
-                                    canvas = self.sessions[session_id]["canvas"]
-                                    
-                                    # Apply the gesture to the canvas and get points
-                                    with self.sessions[session_id]["lock"]:
-                                        self.handle_gesture(canvas, gesture, landmarks, websocket, session_id)
-                                    
-                                    # Send the updated canvas to all clients in the session
-                                    if gesture in ["drawing", "erase"]:
-                                        canvas_state = canvas.get_canvas()
-                                        
-                                        # Convert the canvas to base64
-                                        _, buffer = cv2.imencode('.png', canvas_state)
-                                        img_base64 = base64.b64encode(buffer).decode('utf-8')
-                                        
-                                        # Send the updated canvas to all clients
-                                        canvas_update = json.dumps({
-                                            "type": "canvas_update",
-                                            "canvas": f"data:image/png;base64,{img_base64}"
-                                        })
-                                        await self.broadcast_to_session(session_id, canvas_update)
-                            except Exception as e:
-                                print(f"Error processing frame: {e}")
-                                await websocket.send(json.dumps({
-                                    "type": "error",
-                                    "message": f"Error processing frame: {str(e)}"
-                                }))
+                            image_data = base64.b64decode(base64_data)
                         except Exception as e:
                             print(f"Error in frame handling: {e}")
-                            await websocket.send(json.dumps({
+                            self.send_to_client(websocket, json.dumps({
                                 "type": "error",
                                 "message": f"Error in frame handling: {str(e)}"
                             }))
                             continue
 
+                        self.queue_frame(websocket, session_id, image_data)
+
+                    elif message_type == "request_keyframe":
+                        # The client detected a gap in the canvas sequence numbers; resync it
+                        self.send_to_client(websocket, self.keyframe_message(session_id, websocket),
+                                            supersede=KEYFRAME_KEY)
+
+                    elif message_type in ["undo", "redo"]:
+                        # Undo/redo is applied to the server canvas so every client sees the same result
+                        await self.apply_history_action(session_id, message_type)
+
+                    # "undo_action" is only a notification: the web client undoes its own drawing
+                    # layer locally and sends the result as a drawing_update, so it must not also
+                    # undo the last stroke on the shared server canvas (which may be someone else's)
+
                     elif message_type == "clear_canvas":
                         if session_id in self.sessions:
                             with self.sessions[session_id]["lock"]:
                                 self.sessions[session_id]["canvas"].clear()
+                                # Everyone gets the full (blank) canvas, so no patches are pending
+                                self.sessions[session_id]["canvas"].clear_dirty_tiles()
+                                self.sessions[session_id]["seq"] += 1
 
-                                # Send updated canvas back to all clients
-                                canvas_image = self.sessions[session_id]["canvas"].get_canvas()
-                                _, buffer = cv2.imencode('.png', canvas_image)
-                                canvas_base64 = base64.b64encode(buffer).decode('utf-8')
-                                canvas_data_url = f"data:image/png;base64,{canvas_base64}"
-                                
-                                # Save canvas state to MongoDB
-                                self.session_db.update_canvas_state(session_id, canvas_data_url, is_drawing_layer=False)
-                                
-                                update_message = json.dumps({
-                                    "type": "canvas_update",
-                                    "canvas": canvas_data_url
-                                })
-                                await self.broadcast_to_session(session_id, update_message)
+                            # Send updated canvas back to all clients and save it to MongoDB
+                            self.broadcast_keyframe(session_id)
+                            self.persist_canvas(session_id)
 
                     elif message_type == "change_color":
                         if session_id in self.sessions:
@@ -460,6 +533,9 @@ class WebSocketServer:
                                     # Draw line on canvas
                                     canvas = self.sessions[session_id]["canvas"]
                                     canvas.draw_line(start_point, end_point, cv_color)
+                                    self.sessions[session_id]["seq"] += 1
+                                    seq = self.sessions[session_id]["seq"]
+                                self.persist_canvas(session_id)
                                 
                                 # Forward drawing event immediately to all other clients
                                 # This is a small message containing just the line segment data for low-latency updates
@@ -467,9 +543,16 @@ class WebSocketServer:
                                     "type": "mouse_draw",
                                     "start": start,
                                     "end": end,
-                                    "color": color
+                                    "color": color,
+                                    "seq": seq
                                 })
-                                await self.broadcast_to_session(session_id, draw_message, exclude=websocket)
+                                await self.broadcast_to_session(session_id, draw_message, exclude=websocket, delta=True)
+                                
+                                # The sender already drew the line locally, it only needs the sequence number
+                                self.send_to_client(websocket, json.dumps({
+                                    "type": "stroke_ack",
+                                    "seq": seq
+                                }))
                     
                     elif message_type == "drawing_update":
                         if session_id in self.sessions:
@@ -481,10 +564,10 @@ class WebSocketServer:
                                 with self.sessions[session_id]["lock"]:
                                     # Store the current drawing layer in memory for future reconnections
                                     self.sessions[session_id]["drawing_layer"] = drawing_data
-                                    
-                                    # Save drawing layer to MongoDB only if it's a final update (e.g., when drawing stops)
-                                    if data.get("isFinal", False):
-                                        self.session_db.update_canvas_state(session_id, drawing_data, is_drawing_layer=True)
+                                
+                                # Save drawing layer to MongoDB only if it's a final update (e.g., when drawing stops)
+                                if data.get("isFinal", False):
+                                    self.canvas_writer.schedule(session_id, drawing_data, is_drawing_layer=True)
                                 
                                 # Forward the drawing update to all other clients
                                 drawing_message = json.dumps({
@@ -495,16 +578,26 @@ class WebSocketServer:
                 
                 except Exception as e:
                     print(f"Error processing message: {e}")
-                    await websocket.send(json.dumps({"type": "error", "message": str(e)}))
+                    self.send_to_client(websocket, json.dumps({"type": "error", "message": str(e)}))
 
         except websockets.exceptions.ConnectionClosed:
             pass
         finally:
+            # Stop processing frames, return this client's hand tracker to the pool and stop its writer task
+            frame_task.cancel()
+            self.frame_slots.pop(websocket, None)
+            self.gesture_states.pop(websocket, None)
+            self.inference.release(client_key)
+            self.client_codecs.pop(websocket, None)
+            channel = self.channels.pop(websocket, None)
+            if channel:
+                channel.close()
+            
             # Clean up session and client data
             if websocket in self.client_sessions:
                 session_id = self.client_sessions[websocket]
                 if session_id in self.sessions:
-                    self.sessions[session_id]["clients"].remove(websocket)
+                    self.sessions[session_id]["clients"].discard(websocket)
 
                     # Notify remaining clients about participant leaving
                     remaining_clients = len(self.sessions[session_id]["clients"])
@@ -518,132 +611,471 @@ class WebSocketServer:
                         # so it can be restored when users refresh the page
                         # Instead, we'll mark it as inactive in memory but keep it in MongoDB
                         print(f"Last client left session {session_id}, keeping session in memory for reconnections")
+                        # Save its latest state now rather than waiting for the next periodic flush
+                        asyncio.create_task(self.canvas_writer.flush(session_id))
                         # We could optionally set a timer to clean up truly inactive sessions after a period
 
                 del self.client_sessions[websocket]
 
-    def handle_gesture(self, canvas, gesture, landmarks, websocket=None, session_id=None):
-        index_tip = landmarks.landmark[8]
-        gesture_points = []
+    def canvas_keyframe(self, session_id, codec=None):
+        """
+        The full session canvas as a data URL, encoded once per canvas version. Without a
+        codec the snapshot is a PNG, as stored in MongoDB. Returns (data_url, seq).
+        """
+        session = self.sessions[session_id]
+        with session["lock"]:
+            if codec is None:
+                return session["snapshots"].data_url(".png"), session["seq"]
+            return session["snapshots"].codec_data_url(codec), session["seq"]
+
+    def negotiate_codec(self, websocket, requested):
+        """Pick the snapshot codec for a client from its preference list (or the server default)"""
+        name = negotiate(requested, self.snapshot_codecs)
+        codec = self.snapshot_codecs[name] if name else self.default_codec
+        self.client_codecs[websocket] = codec
+        return codec
+
+    def keyframe_message(self, session_id, websocket):
+        """Build a full-canvas canvas_update message in the client's negotiated codec"""
+        codec = self.client_codecs.get(websocket, self.default_codec)
+        canvas_data_url, seq = self.canvas_keyframe(session_id, codec)
+        return json.dumps({
+            "type": "canvas_update",
+            "canvas": canvas_data_url,
+            "codec": codec.name,
+            "seq": seq,
+            "keyframe": True
+        })
+
+    def broadcast_keyframe(self, session_id):
+        """Send a full snapshot to everyone in the session; each codec is encoded at most once"""
+        for client in list(self.sessions[session_id]["clients"]):
+            # A newer full snapshot makes any queued older one redundant
+            self.send_to_client(client, self.keyframe_message(session_id, client), supersede=KEYFRAME_KEY)
+
+    def stroke_message(self, segment, seq):
+        """Build a stroke delta message from a segment returned by Canvas.draw/erase"""
+        blue, green, red = segment["color"]
+        message = {
+            "type": "stroke",
+            "seq": seq,
+            "tool": segment["tool"],
+            "start": {"x": segment["start"][0], "y": segment["start"][1]},
+            "end": {"x": segment["end"][0], "y": segment["end"][1]},
+            "color": f"#{red:02x}{green:02x}{blue:02x}",
+            "size": segment["size"]
+        }
+        if "points" in segment:
+            # Curved segments: the polyline from start to end, as [x, y] pairs
+            message["points"] = segment["points"]
+        return json.dumps(message)
+
+    async def apply_history_action(self, session_id, action):
+        """Undo or redo the last stroke on the session canvas and broadcast the changed pixels"""
+        if session_id not in self.sessions:
+            return False
+        session = self.sessions[session_id]
+        with session["lock"]:
+            canvas = session["canvas"]
+            changed = canvas.undo() if action == "undo" else canvas.redo()
+            if not changed:
+                return False
+            session["seq"] += 1
+            seq = session["seq"]
+            patches = canvas.flush_dirty_tiles(params=self.patch_params)
+        await self.broadcast_to_session(session_id, self.patch_message(patches, seq, action=action), delta=True)
+        self.persist_canvas(session_id)
+        return True
+
+    def persist_canvas(self, session_id):
+        """Schedule the session canvas to be saved; it is only encoded when the writer flushes"""
+        self.canvas_writer.schedule(session_id, lambda: self.canvas_keyframe(session_id)[0])
+
+    def patch_message(self, patches, seq, action=None):
+        """Build a canvas_update message carrying only changed tiles from Canvas.flush_dirty_tiles"""
+        message = {
+            "type": "canvas_update",
+            "seq": seq,
+            "patches": [{
+                "x": patch["x"],
+                "y": patch["y"],
+                "w": patch["w"],
+                "h": patch["h"],
+                "data": f"data:image/png;base64,{base64.b64encode(patch['data']).decode('utf-8')}"
+            } for patch in patches]
+        }
+        if action:
+            message["action"] = action
+        return json.dumps(message)
+
+    async def handle_binary_message(self, websocket, session_id, client_key, message):
+        """Handle a binary protocol message (currently only camera frames)"""
+        try:
+            binary_message = parse_message(message)
+        except ProtocolError as e:
+            print(f"Error parsing binary message: {e}")
+            self.send_to_client(websocket, json.dumps({
+                "type": "error",
+                "message": f"Invalid binary message: {str(e)}"
+            }))
+            return
+
+        if binary_message.message_type != MESSAGE_TYPE_FRAME:
+            print(f"Error: Unsupported binary message type {binary_message.message_type}")
+            return
+
+        # Frames are only accepted for the session this client has joined. As with JSON
+        # frames, frames sent before the session is established are silently skipped.
+        if not session_id or session_id not in self.sessions or binary_message.session_id != session_id:
+            return
+
+        self.queue_frame(websocket, session_id, binary_message.payload, sequence=binary_message.sequence)
+
+    def queue_frame(self, websocket, session_id, image_data, sequence=None):
+        """Hand a frame to the client's frame worker, replacing any frame it hasn't started on yet"""
+        frame_slot = self.frame_slots.get(websocket)
+        if frame_slot is None:
+            return
+        self.metrics.increment("frames_received")
+        if frame_slot.put((session_id, image_data, sequence)):
+            self.metrics.increment("frames_dropped")
+
+    async def frame_worker(self, websocket, client_key, frame_slot):
+        """Process a client's frames in order of arrival, always skipping to the newest one"""
+        frame_rate = FrameRateController(max_fps=self.max_client_fps)
+        loop = asyncio.get_running_loop()
+        while True:
+            session_id, image_data, sequence = await frame_slot.get()
+            started = loop.time()
+            await self.process_frame(websocket, session_id, client_key, image_data, sequence=sequence)
+            frame_rate.record(loop.time() - started)
+            self.metrics.increment("frames_processed")
+
+            # Tell the client how many frames per second we can actually keep up with
+            max_fps = frame_rate.poll_advertisement()
+            if max_fps is not None:
+                self.send_to_client(websocket, json.dumps({
+                    "type": "flow_control",
+                    "max_fps": max_fps,
+                    "dropped_frames": frame_slot.dropped
+                }), supersede="flow_control")
+
+    async def process_frame(self, websocket, session_id, client_key, image_data, sequence=None):
+        """Run hand tracking on an encoded camera frame and apply the resulting gesture"""
+        try:
+            # Decode and run hand tracking on the inference pool
+            try:
+                result = await self.inference.process_frame(client_key, image_data)
+            except TrackerPoolFull as e:
+                # Every tracker is in use by another client; this client gets one as soon as
+                # someone leaves or stops sending frames
+                self.metrics.increment("frames_rejected")
+                self.send_to_client(websocket, json.dumps({
+                    "type": "error",
+                    "message": f"Hand tracking is busy: {e}. Waiting for a free tracker."
+                }), supersede="tracker_busy")
+                return
+            
+            # Skip processing if frame is invalid
+            if result is None:
+                return
+            
+            points, frame_gesture, index_position = result
+            
+            # The session may have gone away while the frame was being processed
+            if session_id not in self.sessions:
+                return
+            
+            if points is not None:
+                session = self.sessions[session_id]
+                # Start over when the client moved to another session
+                state = self.gesture_states.get(websocket)
+                if state is None or state["session_id"] != session_id:
+                    state = self.gesture_states[websocket] = self.new_gesture_state(session_id)
+                # Only gestures held for a few frames change the client's gesture; single-frame
+                # flickers keep the current one so they don't split strokes or flood clients
+                gesture = state["gestures"].update(frame_gesture)
+                if gesture != frame_gesture:
+                    self.metrics.increment("gesture_frames_debounced")
+                
+                # Send cursor position to client if index finger is detected
+                if index_position:
+                    hand_position = {
+                        "type": "hand_position",
+                        "position": {
+                            "x": index_position[0],  # x coordinate (0-1)
+                            "y": index_position[1]   # y coordinate (0-1)
+                        },
+                        "mode": gesture
+                    }
+                    # Echo the frame sequence number so binary clients can measure latency
+                    if sequence is not None:
+                        hand_position["frame_seq"] = sequence
+                    self.send_to_client(websocket, json.dumps(hand_position), supersede="hand_position")
+                
+                # Get the Canvas instance from the session
+                canvas = self.sessions[session_id]["canvas"]
+                
+                # Apply the gesture to the canvas and get the drawn segment, if any
+                patches = None
+                with self.sessions[session_id]["lock"]:
+                    previous_gesture = state["prev_gesture"]
+                    segment = self.handle_gesture(canvas, gesture, points, websocket, session_id, state)
+                    if segment:
+                        self.sessions[session_id]["seq"] += 1
+                    seq = self.sessions[session_id]["seq"]
+                    
+                    # When a stroke ends, send the exact pixels it touched so every client
+                    # converges on the server canvas without a full snapshot
+                    if previous_gesture in ["drawing", "erase"] and gesture != previous_gesture:
+                        patches = canvas.flush_dirty_tiles(params=self.patch_params)
+                
+                # Send only the drawn segment to all clients in the session; full
+                # snapshots are sent on join and when a client requests a keyframe
+                if segment:
+                    await self.broadcast_to_session(session_id, self.stroke_message(segment, seq), delta=True)
+                
+                if patches:
+                    await self.broadcast_to_session(session_id, self.patch_message(patches, seq), delta=True)
+                    self.persist_canvas(session_id)
+        except Exception as e:
+            print(f"Error processing frame: {e}")
+            self.send_to_client(websocket, json.dumps({
+                "type": "error",
+                "message": f"Error processing frame: {str(e)}"
+            }))
+
+    def handle_gesture(self, canvas, gesture, points, websocket=None, session_id=None, state=None):
+        """
+        Apply a recognized gesture to the canvas. points are the hand landmarks as a (21, 3) array,
+        state the client's gesture state (see new_gesture_state).
+        Returns the drawn or erased segment, if any.
+        """
+        segment = None
+        state = state if state is not None else self.new_gesture_state(session_id)
+        stroke = state["stroke"]
         
         # Track previous gesture to detect when drawing/erasing stops
-        session_data = self.sessions.get(session_id, {})
-        prev_gesture = session_data.get("prev_gesture", "idle")
+        prev_gesture = state["prev_gesture"]
         
         # Check for gesture transitions
         is_gesture_transition = gesture != prev_gesture
         
         if gesture == "drawing":
-            point = (index_tip.x, index_tip.y)
+            point = tuple(fingertip(points, INDEX_TIP).tolist())
             
             # If we're just starting to draw (transitioning from a different gesture),
             # reset the canvas's previous point to ensure we don't connect from previous strokes
             if is_gesture_transition:
                 # Reset the drawing state to ensure a new line starts
-                canvas.reset_previous_points()
+                canvas.reset_previous_points(stroke)
                 
                 # Send a signal to the frontend to start a new drawing path
                 if websocket and session_id:
-                    asyncio.create_task(websocket.send(json.dumps({
+                    self.send_to_client(websocket, json.dumps({
                         "type": "gesture_start",
                         "gesture": "drawing"
-                    })))
+                    }))
             
             # Now draw the point
-            canvas.draw(point)
-            gesture_points.append({"x": point[0], "y": point[1]})
+            segment = canvas.draw(point, stroke)
             
             # Send gesture point to client for history tracking
             if websocket and session_id:
-                asyncio.create_task(websocket.send(json.dumps({
+                self.send_to_client(websocket, json.dumps({
                     "type": "gesture_point",
                     "gesture": "drawing",
                     "point": {"x": point[0], "y": point[1]}
-                })))
+                }))
 
         elif gesture == "erase":
-            middle_tip = landmarks.landmark[12]
-            midpoint = ((index_tip.x + middle_tip.x) / 2, (index_tip.y + middle_tip.y) / 2)
+            midpoint = tuple(fingertip_midpoint(points, INDEX_TIP, MIDDLE_TIP).tolist())
             
             # If transitioning to erasing, reset previous points
             if is_gesture_transition:
-                canvas.reset_previous_points()
+                canvas.reset_previous_points(stroke)
                 
                 # Signal to frontend
                 if websocket and session_id:
-                    asyncio.create_task(websocket.send(json.dumps({
+                    self.send_to_client(websocket, json.dumps({
                         "type": "gesture_start",
                         "gesture": "erase"
-                    })))
+                    }))
             
             # Perform erasing
-            canvas.erase(midpoint)
-            gesture_points.append({"x": midpoint[0], "y": midpoint[1]})
+            segment = canvas.erase(midpoint, stroke)
             
             # Send erase point to client
             if websocket and session_id:
-                asyncio.create_task(websocket.send(json.dumps({
+                self.send_to_client(websocket, json.dumps({
                     "type": "gesture_point",
                     "gesture": "erase",
                     "point": {"x": midpoint[0], "y": midpoint[1]}
-                })))
+                }))
 
         elif gesture == "undo":
-            # When the undo gesture is detected, send an undo action to the frontend
+            # Always reset previous points when entering undo mode (this also ends the current stroke)
+            canvas.reset_previous_points(stroke)
+            
             if websocket and session_id:
                 # First complete any ongoing drawing/erasing action
                 if prev_gesture in ["drawing", "erase"]:
                     print(f"Completing gesture: {prev_gesture} -> {gesture}")
-                    asyncio.create_task(websocket.send(json.dumps({
+                    self.send_to_client(websocket, json.dumps({
                         "type": "gesture_complete",
                         "previous": prev_gesture
-                    })))
+                    }))
                 
-                # Send the undo action signal
-                print(f"Sending undo gesture action")
-                asyncio.create_task(websocket.send(json.dumps({
-                    "type": "gesture_action",
-                    "action": "undo"
-                })))
-                
-                # Also broadcast to all other clients in the session
-                undo_message = json.dumps({
-                    "type": "gesture_action",
-                    "action": "undo"
-                })
-                asyncio.create_task(self.broadcast_to_session(session_id, undo_message, exclude=websocket))
-        
-            # Always reset previous points when entering undo mode
-            canvas.reset_previous_points()
+                # Undo once per gesture (not once per frame while the pose is held). The canvas
+                # is undone on the server and the changed pixels are broadcast to everyone.
+                if is_gesture_transition:
+                    print(f"Applying undo gesture to session {session_id}")
+                    asyncio.create_task(self.apply_history_action(session_id, "undo"))
     
         elif gesture == "idle":
             # When returning to idle after drawing/erasing, send a completion signal
             if prev_gesture in ["drawing", "erase"] and websocket and session_id:
                 print(f"Completing gesture: {prev_gesture} -> {gesture}")
-                asyncio.create_task(websocket.send(json.dumps({
+                self.send_to_client(websocket, json.dumps({
                     "type": "gesture_complete",
                     "previous": prev_gesture
-                })))
+                }))
             
             # Reset previous points when entering idle mode
-            canvas.reset_previous_points()
+            canvas.reset_previous_points(stroke)
         
         # Update the previous gesture
-        if session_id in self.sessions:
-            self.sessions[session_id]["prev_gesture"] = gesture
+        state["prev_gesture"] = gesture
             
-        return gesture_points
+        return segment
+
+    async def hibernate_idle_sessions(self):
+        """Periodically move idle sessions out of memory"""
+        while True:
+            await asyncio.sleep(self.session_sweep_interval)
+            for session_id in self.sessions.eviction_candidates():
+                try:
+                    # Save the latest canvas first; a pending snapshot would otherwise rehydrate it later
+                    await self.canvas_writer.flush(session_id)
+                    if self.sessions.hibernate(session_id):
+                        print(f"Hibernated idle session {session_id}")
+                except Exception as e:
+                    print(f"Error hibernating session {session_id}: {e}")
+            for session_id in self.sessions.expire_hibernated():
+                print(f"Deleted expired hibernated session {session_id}")
+
+    async def log_metrics(self):
+        """Periodically print the server's counters"""
+        while True:
+            await asyncio.sleep(self.metrics_log_interval)
+            self.metrics.set_gauge("clients", len(self.channels))
+            self.metrics.set_gauge("sessions", len(self.sessions) + len(self.sessions.hibernated))
+            self.metrics.set_gauge("sessions_resident", len(self.sessions.resident))
+            self.metrics.set_gauge("session_memory_bytes", self.sessions.resident_bytes())
+            self.metrics.set_gauge("sessions_hibernated_total", self.sessions.hibernations)
+            self.metrics.set_gauge("sessions_rehydrated_total", self.sessions.rehydrations)
+            self.metrics.set_gauge("sessions_expired_total", self.sessions.expirations)
+            snapshot_caches = [session["snapshots"] for session in self.sessions.resident.values()]
+            self.metrics.set_gauge("snapshot_cache_hits", sum(cache.hits for cache in snapshot_caches))
+            self.metrics.set_gauge("snapshot_cache_misses", sum(cache.misses for cache in snapshot_caches))
+            self.metrics.set_gauge("canvas_snapshots_written", self.canvas_writer.written)
+            self.metrics.set_gauge("canvas_snapshot_write_failures", self.canvas_writer.failed)
+            self.metrics.set_gauge("canvas_snapshots_dropped", self.canvas_writer.dropped)
+            self.metrics.set_gauge("canvas_snapshots_coalesced", self.canvas_writer.coalesced)
+            print(f"Metrics: {self.metrics.format()}")
+
+    def health(self):
+        """Status reported by the HTTP health check endpoints"""
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.monotonic() - self.started_at, 1) if self.started_at else 0,
+            "inference_ready": self.inference.ready,
+            "clients": len(self.channels),
+            "sessions": len(self.sessions) + len(self.sessions.hibernated)
+        }
+
+    async def process_request(self, *args):
+        """
+        websockets process_request hook answering plain HTTP health checks instead of upgrading:
+        GET /health always returns 200 once the port is bound, GET /ready returns 503 until hand
+        tracking has loaded. websockets >= 14 passes (connection, request), older versions (path, headers).
+        """
+        legacy = isinstance(args[0], str)
+        path = (args[0] if legacy else args[1].path).split("?")[0]
+        if path not in ("/health", "/ready"):
+            return None
+        health = self.health()
+        ready = path == "/health" or health["inference_ready"]
+        status = HTTPStatus.OK if ready else HTTPStatus.SERVICE_UNAVAILABLE
+        body = json.dumps(health)
+        if legacy:
+            return status, [("Content-Type", "application/json")], body.encode("utf-8")
+        response = args[0].respond(status, body)
+        del response.headers["Content-Type"]
+        response.headers["Content-Type"] = "application/json"
+        return response
+
+    async def warm_up_inference(self):
+        """Load MediaPipe in the background once the server is accepting connections"""
+        milestone = "hand tracking ready"
+        try:
+            await self.inference.warm_up()
+            print(f"Hand tracking ready ({time.monotonic() - self.started_at:.2f}s after startup)")
+        except Exception as e:
+            milestone = "hand tracking failed"
+            print(f"Error loading hand tracking: {e}")
+        if self.profiler:
+            self.profiler.mark(milestone)
+            self.profiler.report()
 
     async def start_server(self):
-        # Restore sessions from MongoDB before starting the server
-        await self.restore_sessions_from_db()
+        self.started_at = time.monotonic()
+        restore_task = None
+        if self.restore_mode == "eager":
+            # Restore sessions from MongoDB before starting the server
+            await self.restore_sessions_from_db()
+        else:
+            # Accept connections right away; sessions are loaded in the background or when joined
+            restore_task = asyncio.create_task(self.restore_sessions_from_db())
         
-        async with websockets.serve(self.handle_client, self.host, self.port):
-            print(f"WebSocket server started at ws://{self.host}:{self.port}")
-            await asyncio.Future()  # Run forever
+        metrics_task = None
+        if self.metrics_log_interval > 0:
+            metrics_task = asyncio.create_task(self.log_metrics())
+        self.canvas_writer.start()
+        sweep_task = asyncio.create_task(self.hibernate_idle_sessions())
+        warm_up_task = None
+        try:
+            async with websockets.serve(self.handle_client, self.host, self.port,
+                                        process_request=self.process_request):
+                print(f"WebSocket server started at ws://{self.host}:{self.port} "
+                      f"({time.monotonic() - self.started_at:.2f}s after startup)")
+                if self.profiler:
+                    self.profiler.mark("listening")
+                # MediaPipe only loads now, so health checks are answered while it does
+                if os.environ.get("INFERENCE_WARMUP", "1") != "0":
+                    warm_up_task = asyncio.create_task(self.warm_up_inference())
+                elif self.profiler:
+                    self.profiler.report()
+                await asyncio.Future()  # Run forever
+        finally:
+            if warm_up_task:
+                warm_up_task.cancel()
+            if metrics_task:
+                metrics_task.cancel()
+            sweep_task.cancel()
+            if restore_task:
+                restore_task.cancel()
+            self.inference.shutdown(wait=False)
+            # Write any canvas snapshots that haven't been flushed yet
+            await self.canvas_writer.close()
+            self.session_db.close()
 
-def run_server():
-    server = WebSocketServer()
+def run_server(profiler=None):
+    if profiler:
+        with profiler.phase("WebSocketServer()"):
+            server = WebSocketServer(profiler=profiler)
+    else:
+        server = WebSocketServer()
     asyncio.run(server.start_server())
 
 if __name__ == "__main__":
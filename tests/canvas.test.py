@@ -0,0 +1,251 @@
+import unittest
+import sys
+import os
+
+import cv2
+import numpy as np
+
+# The Python server modules live in ../python
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+
+from canvas import Canvas, spline_path
+from snapshot_cache import SnapshotCache
+from canvas_codecs import CODECS, CodecError, get_codec, negotiate
+
+class TestCanvasDirtyTiles(unittest.TestCase):
+    def setUp(self):
+        self.canvas = Canvas()
+        self.canvas.clear_dirty_tiles()
+
+    def test_new_canvas_has_no_dirty_tiles_after_flush(self):
+        """A flushed canvas reports no changed regions"""
+        self.assertEqual(self.canvas.dirty_rects(), [])
+        self.assertEqual(self.canvas.flush_dirty_tiles(), [])
+
+    def test_stroke_marks_only_nearby_tiles(self):
+        """Drawing a short segment only dirties the tiles around it"""
+        self.canvas.draw((0.1, 0.1))
+        self.canvas.draw((0.15, 0.12))
+
+        rects = self.canvas.dirty_rects()
+        self.assertTrue(rects)
+        for x, y, w, h in rects:
+            self.assertLess(x + w, self.canvas.width // 2)
+            self.assertLess(y + h, self.canvas.height // 2)
+
+    def test_patches_match_canvas_pixels(self):
+        """Applying the flushed patches to the previous image reproduces the canvas"""
+        before = self.canvas.get_canvas()
+        self.canvas.draw_line((100, 100), (300, 200), (0, 0, 255))
+
+        patches = self.canvas.flush_dirty_tiles()
+        for patch in patches:
+            tile = cv2.imdecode(np.frombuffer(patch["data"], np.uint8), cv2.IMREAD_COLOR)
+            before[patch["y"]:patch["y"] + patch["h"], patch["x"]:patch["x"] + patch["w"]] = tile
+
+        self.assertTrue(np.array_equal(before, self.canvas.get_canvas()))
+        self.assertEqual(self.canvas.dirty_rects(), [])
+
+    def test_damaged_rect_is_tracked_separately(self):
+        """The display's damage rectangle covers every change, even after the dirty tiles were flushed"""
+        self.assertIsNone(self.canvas.take_damaged_rect())
+        self.canvas.draw_line((10, 10), (20, 20))
+        self.canvas.flush_dirty_tiles()
+        self.canvas.draw_line((300, 200), (310, 220))
+        x0, y0, x1, y1 = self.canvas.take_damaged_rect()
+        self.assertTrue(x0 <= 10 and y0 <= 10 and x1 >= 310 and y1 >= 220)
+        self.assertIsNone(self.canvas.take_damaged_rect())
+
+    def test_clear_marks_whole_canvas_dirty(self):
+        """Clearing the canvas dirties every tile"""
+        self.canvas.clear()
+        covered = sum(w * h for _, _, w, h in self.canvas.dirty_rects())
+        self.assertEqual(covered, self.canvas.width * self.canvas.height)
+
+class TestCanvasHistory(unittest.TestCase):
+    def setUp(self):
+        self.canvas = Canvas()
+
+    def draw_stroke(self, points):
+        self.canvas.reset_previous_points()
+        for point in points:
+            self.canvas.draw(point)
+        self.canvas.reset_previous_points()
+
+    def test_undo_removes_whole_stroke_and_redo_restores_it(self):
+        """A stroke made of several segments is undone and redone as one step"""
+        blank = self.canvas.get_canvas()
+        self.draw_stroke([(0.1, 0.1), (0.2, 0.2), (0.3, 0.1), (0.4, 0.3)])
+        drawn = self.canvas.get_canvas()
+        self.assertFalse(np.array_equal(blank, drawn))
+
+        self.assertTrue(self.canvas.undo())
+        self.assertTrue(np.array_equal(blank, self.canvas.get_canvas()))
+
+        self.assertTrue(self.canvas.redo())
+        self.assertTrue(np.array_equal(drawn, self.canvas.get_canvas()))
+
+    def test_undo_overlapping_strokes_in_order(self):
+        """Undoing overlapping strokes restores each intermediate state"""
+        self.draw_stroke([(0.2, 0.2), (0.6, 0.6)])
+        first = self.canvas.get_canvas()
+        self.canvas.change_color((0, 0, 255))
+        self.draw_stroke([(0.6, 0.2), (0.2, 0.6)])
+
+        self.assertTrue(self.canvas.undo())
+        self.assertTrue(np.array_equal(first, self.canvas.get_canvas()))
+        self.assertTrue(self.canvas.undo())
+        self.assertFalse(self.canvas.undo())
+
+    def test_new_stroke_discards_redo(self):
+        """Drawing after an undo clears the redo stack"""
+        self.draw_stroke([(0.1, 0.1), (0.2, 0.2)])
+        self.canvas.undo()
+        self.draw_stroke([(0.5, 0.5), (0.6, 0.6)])
+        self.assertFalse(self.canvas.redo())
+
+    def test_history_stays_within_memory_budget(self):
+        """Old strokes are dropped once the history exceeds its byte budget"""
+        canvas = Canvas(history_bytes=64 * 1024)
+        for i in range(200):
+            canvas.reset_previous_points()
+            canvas.draw((0.1, (i % 50) / 50))
+            canvas.draw((0.9, (i % 50) / 50))
+        canvas.reset_previous_points()
+
+        # The budget may be exceeded by at most the most recent stroke
+        self.assertLess(canvas.history.nbytes, 2 * 64 * 1024)
+        self.assertTrue(canvas.undo())
+
+class TestSmoothStrokes(unittest.TestCase):
+    def test_spline_path_ends_at_samples(self):
+        """Curves pass through both samples, and short segments stay straight"""
+        path = spline_path((100, 100), (150, 100), (200, 150))
+        self.assertEqual((path[0], path[-1]), ((150, 100), (200, 150)))
+        self.assertGreater(len(path), 2)
+        self.assertEqual(spline_path((0, 0), (10, 10), (12, 11)), [(10, 10), (12, 11)])
+
+    def test_curved_segments_can_be_undone(self):
+        """Curved gesture segments carry their polyline and are undone like straight ones"""
+        canvas = Canvas(smooth_strokes=True)
+        blank = canvas.get_canvas()
+        segments = [canvas.draw(point) for point in [(0.2, 0.2), (0.3, 0.2), (0.4, 0.3), (0.45, 0.45)]]
+        self.assertIsNone(segments[0])
+        self.assertNotIn("points", segments[1])  # No earlier point to curve from yet
+        self.assertIn("points", segments[2])
+        canvas.reset_previous_points()
+        self.assertFalse(np.array_equal(canvas.get_canvas(), blank))
+        self.assertTrue(canvas.undo())
+        np.testing.assert_array_equal(canvas.get_canvas(), blank)
+
+class TestCanvasRestore(unittest.TestCase):
+    def test_data_url_round_trip(self):
+        """A canvas restored from its own data URL has identical pixels"""
+        source = Canvas()
+        source.draw_line((20, 20), (200, 150), (0, 0, 255))
+        canvas = Canvas()
+        self.assertTrue(canvas.restore_from_base64(source.to_data_url()))
+        self.assertTrue((canvas.get_canvas() == source.get_canvas()).all())
+
+    def test_restore_resizes_to_canvas(self):
+        """Images of a different size are scaled to the canvas size"""
+        _, buffer = cv2.imencode('.png', np.zeros((240, 320, 3), dtype=np.uint8))
+        canvas = Canvas()
+        self.assertTrue(canvas.restore_from_bytes(buffer.tobytes()))
+        self.assertEqual(canvas.get_canvas().shape, (480, 640, 3))
+
+    def test_pixel_buffer_is_modified_in_place(self):
+        """Restoring, setting and clearing reuse the same buffer, so views of it stay valid"""
+        canvas = Canvas()
+        buffer = canvas.canvas
+        _, encoded = cv2.imencode('.png', np.zeros((480, 640, 3), dtype=np.uint8))
+        self.assertTrue(canvas.restore_from_bytes(encoded.tobytes()))
+        self.assertTrue((buffer == 0).all())
+        canvas.set_canvas(np.full((240, 320, 3), 128, dtype=np.uint8))
+        self.assertTrue((buffer == 128).all())
+        canvas.clear()
+        self.assertIs(canvas.canvas, buffer)
+        self.assertTrue((buffer == 255).all())
+
+    def test_invalid_data_keeps_canvas(self):
+        """Undecodable data is rejected and leaves the canvas untouched"""
+        canvas = Canvas()
+        self.assertFalse(canvas.restore_from_base64("data:image/png;base64,bm90IGFuIGltYWdl"))
+        self.assertFalse(canvas.restore_from_base64("%%%"))
+        self.assertTrue((canvas.get_canvas() == 255).all())
+
+class TestSnapshotCache(unittest.TestCase):
+    def test_version_changes_with_pixels(self):
+        """Drawing, undo and clear change the version; flushing tiles does not"""
+        canvas = Canvas()
+        versions = [canvas.version]
+        canvas.draw_line((10, 10), (50, 50))
+        versions.append(canvas.version)
+        canvas.flush_dirty_tiles()
+        self.assertEqual(canvas.version, versions[-1])
+        canvas.undo()
+        versions.append(canvas.version)
+        canvas.clear()
+        versions.append(canvas.version)
+        self.assertEqual(versions, sorted(set(versions)))
+
+    def test_unchanged_canvas_is_encoded_once(self):
+        """Repeated snapshots of an unchanged canvas come from the cache"""
+        canvas = Canvas()
+        cache = SnapshotCache(canvas)
+        first = cache.data_url()
+        self.assertIs(cache.data_url(), first)
+        self.assertEqual(cache.misses, 2)  # Encoded bytes and data URL
+
+        canvas.draw_line((10, 10), (50, 50))
+        self.assertNotEqual(cache.data_url(), first)
+        self.assertEqual(cache.data_url(), canvas.to_data_url())
+
+class TestCanvasCodecs(unittest.TestCase):
+    def test_codecs_are_lossless(self):
+        """Every available codec decodes to exactly the encoded canvas"""
+        canvas = Canvas()
+        canvas.draw_line((20, 20), (200, 150), (0, 0, 255))
+        canvas.draw_line((300, 400), (600, 100), (255, 0, 0))
+        for name in CODECS:
+            codec = get_codec(name)
+            decoded = codec.decode(codec.encode(canvas.get_canvas()))
+            self.assertTrue((decoded == canvas.get_canvas()).all(), name)
+
+    def test_truncated_rle_data_raises_codec_error(self):
+        """Cut-off rle payloads are rejected with CodecError"""
+        canvas = Canvas()
+        canvas.draw_line((20, 20), (200, 150), (0, 0, 255))
+        codec = get_codec("rle")
+        data = codec.encode(canvas.get_canvas())
+        header_size = len(data) - len(codec.encode_pixels(canvas.get_canvas()))
+        for size in [header_size + 2, header_size + 8, len(data) - 1]:
+            with self.assertRaises(CodecError):
+                codec.decode(data[:size])
+
+    def test_truncated_compressed_data_raises_codec_error(self):
+        """Cut-off or wrong-size deflate and zstd payloads are rejected with CodecError"""
+        canvas = Canvas()
+        canvas.draw_line((20, 20), (200, 150), (0, 0, 255))
+        image = canvas.get_canvas()
+        for name in ["deflate", "zstd"]:
+            if name not in CODECS:
+                continue  # zstd needs the optional zstandard package
+            codec = get_codec(name)
+            data = codec.encode(image)
+            header_size = len(data) - len(codec.encode_pixels(image))
+            short = data[:header_size] + codec.encode_pixels(image[:-1])  # Valid stream, one row missing
+            for payload in [data[:header_size + 10], data[:-1], short]:
+                with self.assertRaises(CodecError, msg=name):
+                    codec.decode(payload)
+
+    def test_negotiation(self):
+        """The first enabled codec in the client's list wins"""
+        self.assertEqual(negotiate(["qoi", "webp", "png"], {"png": None, "webp": None}), "webp")
+        self.assertIsNone(negotiate(["qoi"], {"png": None}))
+        self.assertIsNone(negotiate(None, {"png": None}))
+        with self.assertRaises(CodecError):
+            get_codec("qoi")
+
+if __name__ == '__main__':
+    unittest.main()
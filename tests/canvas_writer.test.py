@@ -0,0 +1,166 @@
+import unittest
+import asyncio
+import sys
+import os
+
+# The Python server modules live in ../python
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+
+from canvas_writer import CanvasWriter
+from session_db import AsyncSessionDB, SessionDB, CANVAS_REJECTED, CANVAS_RETRY, CANVAS_SAVED
+
+class FakeAsyncSessionDB:
+    """Stands in for AsyncSessionDB; records every batch written"""
+    def __init__(self, succeed=True):
+        self.batches = []
+        self.succeed = succeed
+
+    async def update_canvas_states(self, updates):
+        self.batches.append(list(updates))
+        return [CANVAS_SAVED if self.succeed else CANVAS_RETRY] * len(updates)
+
+class FakeSessionDB:
+    """Stands in for the synchronous SessionDB behind AsyncSessionDB"""
+    def __init__(self, has_batch_endpoint=True, missing_sessions=()):
+        self.has_batch_endpoint = has_batch_endpoint
+        self.missing_sessions = missing_sessions  # Answered like the backend's 404 "Session not found"
+        self.batch_requests = []
+        self.single_requests = []
+
+    def post_canvas_batch(self, updates):
+        if not self.has_batch_endpoint:
+            return None
+        self.batch_requests.append(list(updates))
+        return CANVAS_SAVED
+
+    def post_canvas_state(self, session_id, canvas_base64, is_drawing_layer=False):
+        self.single_requests.append((session_id, canvas_base64, is_drawing_layer))
+        return CANVAS_REJECTED if session_id in self.missing_sessions else CANVAS_SAVED
+
+class FakeResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+        self.headers = {"Content-Type": "application/json"}
+        self.text = str(data)
+
+    def json(self):
+        if self.data is None:
+            raise ValueError("No JSON body")
+        return self.data
+
+class TestCanvasWriter(unittest.TestCase):
+    def test_snapshots_are_coalesced_and_encoded_once(self):
+        """Only the newest snapshot of each session and layer is written, and callables are called at flush time"""
+        db = FakeAsyncSessionDB()
+        writer = CanvasWriter(db, flush_interval=60, max_batch=16)
+        calls = []
+        writer.schedule("a", "data:old")
+        writer.schedule("a", lambda: calls.append("a") or "data:new")
+        writer.schedule("a", "data:layer", is_drawing_layer=True)
+        writer.schedule("b", "data:b")
+        self.assertEqual(calls, [])
+
+        asyncio.run(writer.flush())
+        self.assertEqual(calls, ["a"])
+        self.assertEqual(sorted(db.batches[0]), [("a", "data:layer", True), ("a", "data:new", False), ("b", "data:b", False)])
+        self.assertEqual((writer.coalesced, writer.written, writer.pending), (1, 3, {}))
+
+    def test_flush_of_one_session(self):
+        db = FakeAsyncSessionDB()
+        writer = CanvasWriter(db, flush_interval=60)
+        writer.schedule("a", "data:a")
+        writer.schedule("b", "data:b")
+        asyncio.run(writer.flush("a"))
+        self.assertEqual(db.batches, [[("a", "data:a", False)]])
+        self.assertIn(("b", False), writer.pending)
+
+    def test_batches_are_split_by_count_and_size(self):
+        db = FakeAsyncSessionDB()
+        writer = CanvasWriter(db, flush_interval=60, max_batch=2)
+        writer.max_batch_bytes = 100
+        for session_id in "abc":
+            writer.schedule(session_id, "x" * 10)
+        writer.schedule("big", "x" * 95)
+        asyncio.run(writer.flush())
+        self.assertEqual([len(batch) for batch in db.batches], [2, 1, 1])
+        self.assertTrue(all(sum(len(update[1]) for update in batch) <= 100 for batch in db.batches))
+
+    def test_failed_writes_stay_pending(self):
+        """A failed write is retried on the next flush unless a newer snapshot was scheduled"""
+        db = FakeAsyncSessionDB(succeed=False)
+        writer = CanvasWriter(db, flush_interval=60)
+
+        async def run():
+            writer.schedule("a", "data:a1")
+            writer.schedule("b", "data:b1")
+            original = db.update_canvas_states
+
+            async def write_while_scheduling(updates):
+                writer.schedule("b", "data:b2")  # Arrives while the write is in flight
+                return await original(updates)
+            db.update_canvas_states = write_while_scheduling
+            await writer.flush()
+            db.update_canvas_states = original
+
+        asyncio.run(run())
+        self.assertEqual(writer.pending, {("a", False): "data:a1", ("b", False): "data:b2"})
+        self.assertEqual((writer.written, writer.failed), (0, 2))
+
+        db.succeed = True
+        asyncio.run(writer.flush())
+        self.assertEqual(sorted(db.batches[-1]), [("a", "data:a1", False), ("b", "data:b2", False)])
+        self.assertEqual(writer.pending, {})
+
+    def test_falls_back_to_single_requests_without_batch_endpoint(self):
+        """Against a backend without the batch endpoint, updates are sent one at a time"""
+        for has_batch_endpoint in (True, False):
+            session_db = FakeSessionDB(has_batch_endpoint)
+            db = AsyncSessionDB(session_db=session_db, max_workers=1)
+            writer = CanvasWriter(db, flush_interval=60)
+            writer.schedule("a", "data:a")
+            writer.schedule("b", "data:b")
+            asyncio.run(writer.flush())
+            db.executor.shutdown()
+
+            self.assertEqual(writer.written, 2)
+            self.assertEqual(db.batch_supported, has_batch_endpoint)
+            self.assertEqual(len(session_db.batch_requests), 1 if has_batch_endpoint else 0)
+            self.assertEqual(len(session_db.single_requests), 0 if has_batch_endpoint else 2)
+
+    def test_rejected_updates_are_dropped_and_saved_ones_are_not_resent(self):
+        """A 404 for one session doesn't fail the others, and the rejected snapshot isn't retried"""
+        session_db = FakeSessionDB(has_batch_endpoint=False, missing_sessions=("gone",))
+        db = AsyncSessionDB(session_db=session_db, max_workers=1)
+        writer = CanvasWriter(db, flush_interval=60)
+        writer.schedule("a", "data:a")
+        writer.schedule("gone", "data:gone")
+        asyncio.run(writer.flush())
+        asyncio.run(writer.flush())
+        db.executor.shutdown()
+
+        self.assertEqual(len(session_db.single_requests), 2)
+        self.assertEqual((writer.written, writer.dropped, writer.failed), (1, 1, 0))
+        self.assertEqual(writer.pending, {})
+
+    def test_retries_are_capped(self):
+        """A snapshot that keeps failing is dropped after max_retries flushes"""
+        db = FakeAsyncSessionDB(succeed=False)
+        writer = CanvasWriter(db, flush_interval=60, max_retries=3)
+        writer.schedule("a", "data:a")
+        for _ in range(5):
+            asyncio.run(writer.flush())
+        self.assertEqual(len(db.batches), 3)
+        self.assertEqual((writer.failed, writer.dropped), (2, 1))
+        self.assertEqual((writer.pending, writer.retries), ({}, {}))
+
+    def test_canvas_results_from_responses(self):
+        """Client errors are permanent; server errors and unreadable answers are retried"""
+        self.assertEqual(SessionDB._canvas_result(FakeResponse(200, {"success": True}), "a"), CANVAS_SAVED)
+        self.assertEqual(SessionDB._canvas_result(FakeResponse(404, {"message": "Session not found"}), "a"),
+                         CANVAS_REJECTED)
+        self.assertEqual(SessionDB._canvas_result(FakeResponse(500, {"success": False}), "a"), CANVAS_RETRY)
+        self.assertEqual(SessionDB._canvas_result(FakeResponse(502, None), "a"), CANVAS_RETRY)
+
+if __name__ == '__main__':
+    unittest.main()
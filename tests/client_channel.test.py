@@ -0,0 +1,155 @@
+import unittest
+import asyncio
+import sys
+import os
+
+# The Python server modules live in ../python
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+
+from client_channel import KEYFRAME_KEY, SLOW_CONSUMER_CLOSE_CODE, ClientChannel
+
+class FakeWebSocket:
+    """Records sent messages; send() blocks until unblock() while blocked"""
+    def __init__(self, blocked=False, fail=False):
+        self.sent = []
+        self.closed_with = None
+        self.fail = fail
+        self.gate = asyncio.Event()
+        if not blocked:
+            self.gate.set()
+
+    async def send(self, message):
+        if self.fail:
+            raise ConnectionError("connection reset")
+        await self.gate.wait()
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=""):
+        self.closed_with = (code, reason)
+
+async def settle():
+    # Let the writer task and any close tasks run
+    for _ in range(50):
+        await asyncio.sleep(0)
+
+class TestClientChannel(unittest.TestCase):
+    def test_messages_are_delivered_in_order(self):
+        async def run():
+            websocket = FakeWebSocket()
+            channel = ClientChannel(websocket)
+            for i in range(3):
+                self.assertTrue(channel.send(f"m{i}"))
+            await settle()
+            channel.close()
+            return websocket.sent
+        self.assertEqual(asyncio.run(run()), ["m0", "m1", "m2"])
+
+    def test_newer_message_supersedes_queued_one(self):
+        """Only the newest queued message of a supersede kind is delivered"""
+        async def run():
+            websocket = FakeWebSocket(blocked=True)
+            channel = ClientChannel(websocket)
+            channel.send("first")
+            await settle()  # "first" is now being sent; the rest stays queued
+            channel.send("cursor 1", supersede="hand_position")
+            channel.send("stroke")
+            channel.send("cursor 2", supersede="hand_position")
+            websocket.gate.set()
+            await settle()
+            channel.close()
+            return websocket.sent, channel.dropped
+        sent, dropped = asyncio.run(run())
+        self.assertEqual(sent, ["first", "stroke", "cursor 2"])
+        self.assertEqual(dropped, 1)
+
+    def test_full_queue_drops_oldest_supersedable(self):
+        async def run():
+            websocket = FakeWebSocket(blocked=True)
+            channel = ClientChannel(websocket, max_queue=3)
+            channel.send("in flight")
+            await settle()
+            channel.send("cursor", supersede="hand_position")
+            channel.send("snapshot", supersede="canvas_keyframe")
+            channel.send("stroke 1")
+            self.assertTrue(channel.send("stroke 2"))  # Full: the cursor makes room
+            self.assertEqual([message for _, message, _ in channel.queue], ["snapshot", "stroke 1", "stroke 2"])
+            self.assertFalse(channel.closed)
+            channel.close()
+        asyncio.run(run())
+
+    def test_keyframe_replaces_queued_deltas(self):
+        """A queued keyframe drops the canvas deltas queued before it, but not other messages"""
+        async def run():
+            websocket = FakeWebSocket(blocked=True)
+            channel = ClientChannel(websocket)
+            channel.send("in flight")
+            await settle()
+            channel.send("stroke 1", delta=True)
+            channel.send("joined")
+            channel.send("keyframe 1", supersede=KEYFRAME_KEY)
+            channel.send("stroke 2", delta=True)
+            channel.send("keyframe 2", supersede=KEYFRAME_KEY)
+            channel.send("stroke 3", delta=True)
+            self.assertEqual([message for _, message, _ in channel.queue], ["joined", "keyframe 2", "stroke 3"])
+            self.assertEqual(channel.dropped, 3)
+            channel.close()
+        asyncio.run(run())
+
+    def test_full_queue_never_drops_the_keyframe(self):
+        """Deltas after a keyframe need it, so a full queue disconnects instead of dropping it"""
+        async def run():
+            websocket = FakeWebSocket(blocked=True)
+            channel = ClientChannel(websocket, max_queue=3)
+            channel.send("in flight")
+            await settle()
+            channel.send("keyframe", supersede=KEYFRAME_KEY)
+            channel.send("stroke 1", delta=True)
+            channel.send("cursor", supersede="hand_position")
+            self.assertTrue(channel.send("stroke 2", delta=True))  # The cursor makes room
+            self.assertEqual([message for _, message, _ in channel.queue], ["keyframe", "stroke 1", "stroke 2"])
+            self.assertFalse(channel.send("stroke 3", delta=True))
+            await settle()
+            self.assertTrue(channel.closed)
+        asyncio.run(run())
+
+    def test_slow_consumer_is_disconnected_when_queue_is_full(self):
+        """A queue full of messages that can't be dropped disconnects the client"""
+        async def run():
+            websocket = FakeWebSocket(blocked=True)
+            channel = ClientChannel(websocket, max_queue=2)
+            channel.send("in flight")
+            await settle()
+            channel.send("stroke 1")
+            channel.send("stroke 2")
+            self.assertFalse(channel.send("stroke 3"))
+            await settle()
+            self.assertTrue(channel.closed)
+            self.assertFalse(channel.send("stroke 4"))
+            return websocket.closed_with
+        self.assertEqual(asyncio.run(run())[0], SLOW_CONSUMER_CLOSE_CODE)
+
+    def test_send_timeout_disconnects(self):
+        """A client that doesn't accept a message within send_timeout is disconnected"""
+        async def run():
+            websocket = FakeWebSocket(blocked=True)
+            channel = ClientChannel(websocket, send_timeout=0.01)
+            channel.send("never accepted")
+            await asyncio.sleep(0.05)
+            await settle()
+            return channel.closed, websocket.closed_with
+        closed, closed_with = asyncio.run(run())
+        self.assertTrue(closed)
+        self.assertEqual(closed_with[0], SLOW_CONSUMER_CLOSE_CODE)
+
+    def test_failing_socket_closes_channel(self):
+        """A broken connection closes the channel without a slow-consumer close"""
+        async def run():
+            websocket = FakeWebSocket(fail=True)
+            channel = ClientChannel(websocket)
+            channel.send("message")
+            await settle()
+            return channel.closed, channel.send("next"), websocket.closed_with
+        self.assertEqual(asyncio.run(run()), (True, False, None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import asyncio
+import sys
+import os
+import threading
+
+# The Python server modules live in ../python
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+
+from frame_flow import FrameRateController, FrameSlot, LatestFrameSlot
+
+class TestLatestFrameSlot(unittest.TestCase):
+    def test_only_newest_frame_is_kept(self):
+        """Frames replaced before they were taken are counted as dropped"""
+        async def run():
+            slot = LatestFrameSlot()
+            self.assertFalse(slot.put("frame 1"))
+            self.assertTrue(slot.put("frame 2"))
+            self.assertTrue(slot.put("frame 3"))
+            first = await slot.get()
+            self.assertFalse(slot.put("frame 4"))  # The slot was empty again
+            return first, await slot.get(), slot.dropped
+        self.assertEqual(asyncio.run(run()), ("frame 3", "frame 4", 2))
+
+    def test_get_waits_for_a_frame(self):
+        async def run():
+            slot = LatestFrameSlot()
+            waiter = asyncio.create_task(slot.get())
+            await asyncio.sleep(0)
+            self.assertFalse(waiter.done())
+            slot.put("frame")
+            return await asyncio.wait_for(waiter, 1)
+        self.assertEqual(asyncio.run(run()), "frame")
+
+class TestFrameSlot(unittest.TestCase):
+    def test_drops_and_close(self):
+        slot = FrameSlot()
+        slot.put(1)
+        slot.put(2)
+        self.assertEqual((slot.get(timeout=0.1), slot.dropped), (2, 1))
+        self.assertIsNone(slot.get(timeout=0.01))
+
+        waiter = threading.Thread(target=lambda: results.append(slot.get()))
+        results = []
+        waiter.start()
+        slot.close()
+        waiter.join(1)
+        self.assertEqual(results, [None])
+
+class TestFrameRateController(unittest.TestCase):
+    def make_controller(self, **kwargs):
+        controller = FrameRateController(min_interval=0, **kwargs)
+        controller.smoothing = 1.0  # Follow the latest measurement exactly
+        return controller
+
+    def test_target_is_clamped(self):
+        controller = self.make_controller(min_fps=2, max_fps=30)
+        self.assertEqual(controller.target_fps(), 30)  # Nothing measured yet
+        controller.record(0.001)
+        self.assertEqual(controller.target_fps(), 30)
+        controller.record(0.04)
+        self.assertEqual(controller.target_fps(), 20)  # 0.8 headroom / 40 ms
+        controller.record(5.0)
+        self.assertEqual(controller.target_fps(), 2)
+
+    def test_small_changes_are_not_advertised(self):
+        """A new rate is only advertised once it differs by at least 20% (and 1 fps)"""
+        controller = self.make_controller()
+        controller.record(0.04)
+        self.assertEqual(controller.poll_advertisement(), 20)
+        controller.record(0.8 / 17.5)  # 17 fps: within 20% of 20
+        self.assertIsNone(controller.poll_advertisement())
+        controller.record(0.8 / 23.5)
+        self.assertIsNone(controller.poll_advertisement())
+        controller.record(0.8 / 15.5)  # 15 fps: 25% lower
+        self.assertEqual(controller.poll_advertisement(), 15)
+        controller.record(0.8 / 14.5)  # Compared with the last advertised rate, not the first
+        self.assertIsNone(controller.poll_advertisement())
+
+    def test_advertisements_are_rate_limited(self):
+        controller = FrameRateController(min_interval=60)
+        controller.smoothing = 1.0
+        controller.record(0.04)
+        self.assertEqual(controller.poll_advertisement(), 20)
+        controller.record(0.4)
+        self.assertIsNone(controller.poll_advertisement())  # A big change, but too soon
+        controller._last_advertised -= 61
+        self.assertEqual(controller.poll_advertisement(), 2)
+
+if __name__ == '__main__':
+    unittest.main()
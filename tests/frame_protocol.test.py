@@ -0,0 +1,51 @@
+import unittest
+import sys
+import os
+
+# The Python server modules live in ../python
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+
+from frame_protocol import HEADER, MESSAGE_TYPE_FRAME, PROTOCOL_VERSION, ProtocolError, build_message, parse_message
+
+class TestFrameProtocol(unittest.TestCase):
+    def test_round_trip(self):
+        """A built frame message parses back to the same fields, with the payload as a view"""
+        payload = b"\xff\xd8jpeg bytes\xff\xd9"
+        message = parse_message(build_message(MESSAGE_TYPE_FRAME, "abc123", 42, payload))
+
+        self.assertEqual(message.type_name, "frame")
+        self.assertEqual(message.session_id, "abc123")
+        self.assertEqual(message.sequence, 42)
+        self.assertIsInstance(message.payload, memoryview)
+        self.assertEqual(bytes(message.payload), payload)
+
+    def test_sequence_wraps_and_empty_session(self):
+        message = parse_message(build_message(MESSAGE_TYPE_FRAME, "", 2 ** 32 + 5, b""))
+        self.assertEqual((message.session_id, message.sequence, bytes(message.payload)), ("", 5, b""))
+
+    def test_truncated_header(self):
+        """Messages shorter than the header or cut off inside the session id are rejected"""
+        data = build_message(MESSAGE_TYPE_FRAME, "abc123", 1, b"")
+        with self.assertRaises(ProtocolError):
+            parse_message(data[:HEADER.size - 1])
+        with self.assertRaises(ProtocolError):
+            parse_message(data[:HEADER.size + 3])
+
+    def test_bad_version(self):
+        data = bytearray(build_message(MESSAGE_TYPE_FRAME, "abc123", 1, b"payload"))
+        data[0] = PROTOCOL_VERSION + 1
+        with self.assertRaises(ProtocolError):
+            parse_message(bytes(data))
+
+    def test_bad_utf8_session_id(self):
+        """A session id that isn't UTF-8 is a protocol error, not a UnicodeDecodeError"""
+        data = HEADER.pack(PROTOCOL_VERSION, MESSAGE_TYPE_FRAME, 2, 1) + b"\xff\xfe" + b"payload"
+        with self.assertRaises(ProtocolError):
+            parse_message(data)
+
+    def test_session_id_too_long(self):
+        with self.assertRaises(ProtocolError):
+            build_message(MESSAGE_TYPE_FRAME, "x" * 256, 1, b"")
+
+if __name__ == '__main__':
+    unittest.main()
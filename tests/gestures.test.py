@@ -0,0 +1,109 @@
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+# The Python server modules live in ../python
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+
+from gestures import (FINGER_BASES, FINGER_TIPS, INDEX_TIP, MIDDLE_TIP, GestureDebouncer, classify,
+                      landmark_array, midpoint, stack_landmarks)
+from landmark_filter import OneEuroFilter
+from frame_flow import MIN_CLIENT_FPS
+
+def make_hand(fingers_up):
+    """(21, 3) landmarks with each finger (thumb, index, middle, ring, pinky) pointing up or down"""
+    points = np.full((21, 3), 0.5, dtype=np.float32)
+    for tip, base, up in zip(FINGER_TIPS, FINGER_BASES, fingers_up):
+        points[base, 1] = 0.5
+        points[tip, 1] = 0.3 if up else 0.7
+    return points
+
+class TestGestureClassification(unittest.TestCase):
+    def test_poses(self):
+        """Each pose maps to the same gesture as the original per-landmark rules"""
+        self.assertEqual(classify(make_hand([False, True, False, False, False])), "drawing")
+        self.assertEqual(classify(make_hand([False, True, True, False, False])), "erase")
+        self.assertEqual(classify(make_hand([True, True, True, True, True])), "idle")
+        # Unrecognized poses fall back to drawing
+        self.assertEqual(classify(make_hand([False, False, False, False, False])), "drawing")
+        self.assertEqual(classify(make_hand([True, True, True, False, False])), "drawing")
+
+    def test_batch_matches_single_hands(self):
+        """Classifying a batch gives the same result as classifying each hand"""
+        hands = np.random.default_rng(0).uniform(0, 1, size=(200, 21, 3)).astype(np.float32)
+        batch = classify(hands)
+        self.assertEqual(batch.shape, (200,))
+        self.assertEqual(batch.tolist(), [classify(hand) for hand in hands])
+        self.assertEqual(len(set(batch.tolist())), 3)
+
+    def test_landmark_lists_and_level_fingers(self):
+        """Landmark lists classify like arrays, and a finger level with its base counts as neither up nor down"""
+        hands = np.random.default_rng(2).uniform(0, 1, size=(50, 21, 3)).astype(np.float32)
+        hands[::2, FINGER_TIPS, 1] = hands[::2, FINGER_BASES, 1]  # Every other hand has all fingers level
+        for hand in hands:
+            landmarks = SimpleNamespace(landmark=[SimpleNamespace(x=x, y=y, z=z) for x, y, z in hand.tolist()])
+            self.assertEqual(classify(landmarks), classify(hand))
+        self.assertEqual(classify(hands).tolist(), [classify(hand) for hand in hands])
+
+    def test_landmark_conversion_and_midpoint(self):
+        """MediaPipe-style landmark lists convert to arrays used for fingertip math"""
+        values = np.random.default_rng(1).uniform(0, 1, size=(21, 3))
+        landmarks = SimpleNamespace(landmark=[SimpleNamespace(x=x, y=y, z=z) for x, y, z in values.tolist()])
+        points = landmark_array(landmarks)
+        self.assertEqual((points.shape, points.dtype), ((21, 3), np.float32))
+        np.testing.assert_allclose(points, values, rtol=1e-6)
+        self.assertIs(landmark_array(points), points)
+
+        expected = (values[INDEX_TIP, :2] + values[MIDDLE_TIP, :2]) / 2
+        np.testing.assert_allclose(midpoint(points), expected, rtol=1e-6)
+        np.testing.assert_allclose(midpoint(stack_landmarks([landmarks, landmarks])), [expected, expected], rtol=1e-6)
+
+class TestGestureDebouncer(unittest.TestCase):
+    def test_switches_after_consecutive_frames(self):
+        """A new gesture only takes over once it has been seen for the configured number of frames"""
+        debouncer = GestureDebouncer(frames=3)
+        self.assertEqual([debouncer.update(g) for g in ["drawing", "drawing", "drawing", "drawing"]],
+                         ["idle", "idle", "drawing", "drawing"])
+
+    def test_flickers_are_ignored(self):
+        """Interrupted candidates never become the stable gesture"""
+        debouncer = GestureDebouncer(frames=3, initial="drawing")
+        frames = ["drawing", "erase", "drawing", "erase", "erase", "idle", "drawing"]
+        self.assertEqual({debouncer.update(g) for g in frames}, {"drawing"})
+        self.assertEqual(debouncer.suppressed, 3)
+
+        # frames=1 disables debouncing
+        debouncer = GestureDebouncer(frames=1)
+        self.assertEqual([debouncer.update(g) for g in ["erase", "drawing"]], ["erase", "drawing"])
+
+class TestOneEuroFilter(unittest.TestCase):
+    def test_reduces_jitter_and_follows_movement(self):
+        """Jitter around a still point is damped, while a fast movement is followed closely"""
+        rng = np.random.default_rng(0)
+        smoothing = OneEuroFilter(min_cutoff=1.0, beta=20.0)
+        still = [smoothing(0.5 + rng.normal(0, 0.005, size=2), i / 30) for i in range(60)]
+        self.assertLess(np.std(np.array(still)[10:] - 0.5), 0.0025)
+
+        # Sweep across the frame at 10 fps
+        smoothing = OneEuroFilter(min_cutoff=1.0, beta=20.0)
+        swept = [smoothing(np.array([i / 20, 0.5]), i / 10) for i in range(21)]
+        self.assertLess(abs(swept[-1][0] - 1.0), 0.05)
+
+    def test_restarts_after_a_gap(self):
+        smoothing = OneEuroFilter(min_cutoff=1.0, beta=0.0, reset_after=0.5)
+        smoothing(np.array([0.1, 0.1]), 0.0)
+        np.testing.assert_allclose(smoothing(np.array([0.9, 0.9]), 2.0), [0.9, 0.9])
+
+    def test_smooths_at_the_throttled_frame_rate(self):
+        """Samples at the slowest advertised frame rate are filtered, not treated as gaps"""
+        smoothing = OneEuroFilter(min_cutoff=1.0, beta=20.0)
+        period = 1.2 / MIN_CLIENT_FPS  # A slightly late frame at the minimum rate
+        smoothing(np.array([0.5, 0.5]), 0.0)
+        smoothed = smoothing(np.array([0.51, 0.5]), period)
+        self.assertLess(smoothed[0], 0.51)
+
+if __name__ == '__main__':
+    unittest.main()
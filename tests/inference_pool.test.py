@@ -0,0 +1,110 @@
+import unittest
+import asyncio
+import sys
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# The Python server modules live in ../python
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+
+from inference_pool import InferenceExecutor
+
+class FakeTracker:
+    """Stands in for a headless HandTracker"""
+    def __init__(self):
+        self.frames = 0
+
+    def process_frame(self, frame):
+        self.frames += 1
+        return None, "landmarks", "drawing", (frame.shape[1], frame.shape[0])
+
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
+
+def jpeg(width=64, height=48):
+    ok, encoded = cv2.imencode(".jpg", np.full((height, width, 3), 255, dtype=np.uint8))
+    return encoded.tobytes()
+
+class TestInferenceExecutor(unittest.TestCase):
+    def test_mode_selection(self):
+        """The mode comes from the argument or INFERENCE_MODE, and unknown modes are rejected"""
+        executor = InferenceExecutor(mode="thread", max_workers=2, pool_size=3)
+        self.assertIsInstance(executor._executor, ThreadPoolExecutor)
+        self.assertEqual(executor.tracker_pool.max_size, 3)
+        executor.shutdown()
+
+        os.environ["INFERENCE_MODE"] = "PROCESS"
+        try:
+            executor = InferenceExecutor(max_workers=2, pool_size=3)
+        finally:
+            del os.environ["INFERENCE_MODE"]
+        self.assertEqual(executor.mode, "process")
+        self.assertEqual(len(executor._workers), 2)
+        self.assertTrue(all(isinstance(worker, ProcessPoolExecutor) for worker in executor._workers))
+        executor.shutdown()
+
+        with self.assertRaises(ValueError):
+            InferenceExecutor(mode="gpu")
+
+    def test_process_mode_pins_clients_to_the_least_loaded_worker(self):
+        executor = InferenceExecutor(mode="process", max_workers=2)
+        first, second = executor._worker_for("a"), executor._worker_for("b")
+        self.assertIsNot(first, second)
+        self.assertIs(executor._worker_for("a"), first)
+        self.assertEqual(executor._worker_load, [1, 1])
+        executor.shutdown()
+
+    def test_thread_mode_runs_the_client_tracker(self):
+        """Frames are decoded and tracked on the worker threads; undecodable frames give None"""
+        trackers = []
+        def factory():
+            trackers.append(FakeTracker())
+            return trackers[-1]
+        executor = InferenceExecutor(mode="thread", max_workers=2, tracker_factory=factory)
+        self.assertFalse(executor.ready)
+
+        async def run():
+            result = await executor.process_frame("a", memoryview(jpeg()))
+            broken = await executor.process_frame("a", b"not a jpeg")
+            return result, broken
+        result, broken = asyncio.run(run())
+        self.assertEqual(result, ("landmarks", "drawing", (64, 48)))
+        self.assertIsNone(broken)
+        self.assertTrue(executor.ready)
+
+        executor.release("a")
+        executor.shutdown()  # Waits for the release, which runs on the pool
+        self.assertEqual(len(executor.tracker_pool), 0)
+        self.assertEqual(trackers[0].frames, 1)
+
+    def test_shutdown_rejects_new_frames(self):
+        executor = InferenceExecutor(mode="thread", max_workers=1, tracker_factory=FakeTracker)
+        executor.shutdown()
+        with self.assertRaises(RuntimeError):
+            asyncio.run(executor.process_frame("a", jpeg()))
+
+    def test_falls_back_to_threads_when_workers_cannot_start(self):
+        """Worker processes that fail to start switch the executor to thread mode"""
+        executor = InferenceExecutor(mode="process", max_workers=1, tracker_factory=FakeTracker)
+        for worker in executor._workers:
+            worker.shutdown()
+        # A worker whose initializer fails breaks its pool on the first frame
+        executor._workers = [ProcessPoolExecutor(max_workers=1, initializer=os.chdir,
+                                                 initargs=(os.path.join(os.sep, "missing", "directory"),))]
+        executor._worker_load = [0]
+
+        result = asyncio.run(executor.process_frame("a", jpeg()))
+        self.assertEqual(executor.mode, "thread")
+        self.assertEqual(result, ("landmarks", "drawing", (64, 48)))
+        executor.release("a")
+        executor.shutdown()
+        self.assertEqual(len(executor.tracker_pool), 0)
+
+if __name__ == '__main__':
+    unittest.main()
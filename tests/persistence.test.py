@@ -0,0 +1,119 @@
+import unittest
+import sys
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+
+import numpy as np
+
+# The Python server modules live in ../python
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+
+from canvas import Canvas
+from persistence import Persistence
+
+def drawn_canvas(width=640, height=480):
+    canvas = Canvas(width, height)
+    canvas.draw_line((10, 10), (200, 150), (0, 0, 255))
+    return canvas.get_canvas()
+
+class TestPersistence(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "drawings.db")
+        self.store = Persistence(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_save_and_load(self):
+        """Drawings are stored losslessly, in WAL mode, with a small thumbnail"""
+        image = drawn_canvas()
+        drawing_id = self.store.save_drawing(image, session_id="abc")
+
+        np.testing.assert_array_equal(self.store.load_drawing(drawing_id), image)
+        self.assertEqual(self.store.connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        metadata = self.store.get_drawings()[0]
+        self.assertEqual((metadata["session_id"], metadata["width"], metadata["height"]), ("abc", 640, 480))
+        thumbnail = self.store.load_thumbnail(drawing_id)
+        self.assertTrue(thumbnail.startswith(b"\x89PNG"))
+        self.assertIsNone(self.store.load_drawing(drawing_id + 1))
+
+    def test_batch_rolls_back(self):
+        """A failing batch leaves no drawings behind"""
+        with self.assertRaises(RuntimeError):
+            with self.store.batch():
+                self.store.save_drawing(drawn_canvas())
+                raise RuntimeError("interrupted")
+        self.assertEqual(self.store.count_drawings(), 0)
+
+        self.store.save_drawings([drawn_canvas(), drawn_canvas()], session_id="abc")
+        self.assertEqual(self.store.count_drawings("abc"), 2)
+
+    def test_pagination_and_filters(self):
+        """Listing pages through matching drawings newest first"""
+        small = drawn_canvas(320, 240)
+        with self.store.batch():
+            for i in range(7):
+                self.store.save_drawing(small, session_id="a" if i % 2 else "b", created_at=1000 + i)
+            self.store.save_drawing(drawn_canvas(), session_id="a", created_at=2000)
+
+        ids = [drawing["id"] for drawing in self.store.iter_drawings(page_size=3)]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(ids), 8)
+
+        session_a = list(self.store.iter_drawings(session_id="a", page_size=2))
+        self.assertEqual([d["created_at"] for d in session_a], [2000, 1005, 1003, 1001])
+        self.assertEqual(len(list(self.store.iter_drawings(min_width=640))), 1)
+        self.assertEqual(len(list(self.store.iter_drawings(since=1003, until=1006))), 3)
+
+        first_page = self.store.get_drawings(limit=5)
+        second_page = self.store.get_drawings(limit=5, before_id=first_page[-1]["id"])
+        self.assertEqual([d["id"] for d in first_page + second_page], ids)
+
+        thumbnails = list(self.store.iter_thumbnails(session_id="b", page_size=2))
+        self.assertEqual(len(thumbnails), 4)
+
+    def test_legacy_table_is_kept_aside(self):
+        """An old pickle table is renamed instead of being read"""
+        self.store.close()
+        legacy_path = os.path.join(self.directory, "legacy.db")
+        connection = sqlite3.connect(legacy_path)
+        connection.execute("CREATE TABLE drawings (id INTEGER PRIMARY KEY, data BLOB)")
+        connection.execute("INSERT INTO drawings (data) VALUES (?)", (pickle.dumps([1, 2, 3]),))
+        connection.commit()
+        connection.close()
+
+        self.store = Persistence(legacy_path)
+        self.assertEqual(self.store.count_drawings(), 0)
+        legacy_rows = self.store.connection.execute("SELECT COUNT(*) FROM drawings_legacy").fetchone()[0]
+        self.assertEqual(legacy_rows, 1)
+        self.store.save_drawing(drawn_canvas())
+        self.assertEqual(self.store.count_drawings(), 1)
+
+    def test_existing_legacy_table_is_not_overwritten(self):
+        """A second legacy table is kept under a new name when drawings_legacy already exists"""
+        self.store.close()
+        legacy_path = os.path.join(self.directory, "legacy.db")
+        connection = sqlite3.connect(legacy_path)
+        connection.execute("CREATE TABLE drawings_legacy (id INTEGER PRIMARY KEY, data BLOB)")
+        connection.execute("CREATE TABLE drawings (id INTEGER PRIMARY KEY, data BLOB)")
+        connection.execute("INSERT INTO drawings (data) VALUES (?)", (pickle.dumps([1, 2, 3]),))
+        connection.commit()
+        connection.close()
+
+        self.store = Persistence(legacy_path)
+        legacy_rows = self.store.connection.execute("SELECT COUNT(*) FROM drawings_legacy_2").fetchone()[0]
+        self.assertEqual(legacy_rows, 1)
+        self.assertEqual(self.store.count_drawings(), 0)
+
+    def test_database_errors_propagate(self):
+        """A database that can't be opened raises instead of leaving a half-initialised store"""
+        with self.assertRaises(sqlite3.Error):
+            Persistence(self.directory)
+
+if __name__ == '__main__':
+    unittest.main()
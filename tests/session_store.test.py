@@ -0,0 +1,124 @@
+import asyncio
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import threading
+
+# The Python server modules live in ../python
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+
+from canvas import Canvas
+from session_store import SessionStore
+
+def new_session_state(room_id=None, canvas=None):
+    return {
+        "canvas": canvas if canvas is not None else Canvas(),
+        "room_id": room_id,
+        "clients": set(),
+        "lock": threading.Lock(),
+        "seq": 0
+    }
+
+class TestSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = SessionStore(new_session_state, Canvas, directory=self.directory, idle_ttl=600)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_hibernate_and_rehydrate(self):
+        """A hibernated session keeps its canvas, room and sequence number"""
+        state = new_session_state("room-1")
+        state["canvas"].draw_line((10, 10), (100, 100), (0, 0, 255))
+        state["seq"] = 7
+        self.store["abc"] = state
+        expected = state["canvas"].get_canvas()
+
+        self.assertTrue(self.store.hibernate("abc"))
+        self.assertNotIn("abc", self.store)
+        self.assertIn("abc", self.store.hibernated)
+        with self.assertRaises(KeyError):
+            self.store["abc"]  # Plain lookups never decode a hibernated session
+
+        restored = asyncio.run(self.store.rehydrate("abc"))
+        self.assertEqual(restored["room_id"], "room-1")
+        self.assertEqual(restored["seq"], 7)
+        self.assertTrue((restored["canvas"].get_canvas() == expected).all())
+
+    def test_sessions_with_clients_are_not_hibernated(self):
+        """Sessions with connected clients stay in memory"""
+        self.store["abc"] = new_session_state()
+        self.store["abc"]["clients"].add(object())
+        self.store.max_bytes = 1
+        self.assertEqual(self.store.eviction_candidates(), [])
+        self.assertFalse(self.store.hibernate("abc"))
+
+    def test_memory_budget_evicts_least_recently_used(self):
+        """Over budget, the least recently used idle sessions are evicted first"""
+        for session_id in ["a", "b", "c"]:
+            self.store[session_id] = new_session_state()
+        self.store["a"]  # Use "a" so "b" becomes the least recently used
+        self.store.max_bytes = 2 * SessionStore.session_bytes(self.store["c"])
+        self.assertEqual(self.store.eviction_candidates(), ["b"])
+
+    def test_hibernated_sessions_survive_restart(self):
+        """A new store picks up sessions hibernated by a previous one"""
+        self.store["abc"] = new_session_state("room-1")
+        self.store.hibernate("abc")
+        store = SessionStore(new_session_state, Canvas, directory=self.directory)
+        self.assertIn("abc", store.hibernated)
+        self.assertEqual(asyncio.run(store.rehydrate("abc"))["room_id"], "room-1")
+
+    def test_snapshot_cache_counts_towards_the_budget(self):
+        """Cached snapshot encodings are part of a session's memory use"""
+        from snapshot_cache import SnapshotCache
+        state = new_session_state()
+        state["snapshots"] = SnapshotCache(state["canvas"])
+        before = SessionStore.session_bytes(state)
+        data_url = state["snapshots"].data_url()
+        self.assertEqual(SessionStore.session_bytes(state), before + len(data_url) + len(state["snapshots"].encoded()))
+
+    def test_rehydrate_off_the_event_loop(self):
+        """rehydrate() restores a hibernated session with its canvas decoded in a worker thread"""
+        state = new_session_state("room-1")
+        state["canvas"].draw_line((10, 10), (100, 100), (0, 0, 255))
+        self.store["abc"] = state
+        expected = state["canvas"].get_canvas()
+        self.store.hibernate("abc")
+
+        restored = asyncio.run(self.store.rehydrate("abc"))
+        self.assertIn("abc", self.store.resident)
+        self.assertEqual(restored["room_id"], "room-1")
+        self.assertTrue((restored["canvas"].get_canvas() == expected).all())
+        self.assertEqual(self.store.rehydrations, 1)
+        self.assertIsNone(asyncio.run(self.store.rehydrate("missing")))
+
+    def test_session_ids_map_to_distinct_files(self):
+        """Ids that share a basename or contain path separators get their own files in the directory"""
+        for session_id in ["abc", "../abc", "x/abc"]:
+            self.store[session_id] = new_session_state(session_id)
+            self.store.hibernate(session_id)
+        self.assertEqual(len(os.listdir(self.directory)), 6)
+
+        store = SessionStore(new_session_state, Canvas, directory=self.directory)
+        for session_id in ["abc", "../abc", "x/abc"]:
+            self.assertEqual(asyncio.run(store.rehydrate(session_id))["room_id"], session_id)
+
+    def test_expired_hibernated_sessions_are_deleted(self):
+        """Hibernated files older than disk_ttl are removed from disk"""
+        self.store.disk_ttl = 60
+        for session_id in ["old", "new"]:
+            self.store[session_id] = new_session_state()
+            self.store.hibernate(session_id)
+        self.store.hibernated["old"] -= 120
+
+        self.assertEqual(self.store.expire_hibernated(), ["old"])
+        self.assertNotIn("old", self.store.hibernated)
+        self.assertIn("new", self.store.hibernated)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+if __name__ == '__main__':
+    unittest.main()
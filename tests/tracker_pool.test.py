@@ -0,0 +1,139 @@
+import unittest
+import sys
+import os
+import threading
+
+# The Python server modules live in ../python
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+
+from tracker_pool import TrackerPool, TrackerPoolFull
+
+class FakeTracker:
+    def __init__(self):
+        self.running = 0
+        self.overlaps = 0
+        self.resets = 0
+        self.closed = False
+
+    def process_frame(self, frame):
+        self.running += 1
+        if self.running > 1:
+            self.overlaps += 1
+        if callable(frame):
+            frame()  # Lets a test act while this frame is being processed
+        self.running -= 1
+        return None, None, "idle", None
+
+    def reset(self):
+        if self.running:
+            self.overlaps += 1
+        self.resets += 1
+
+    def close(self):
+        self.closed = True
+
+class TestTrackerPool(unittest.TestCase):
+    def setUp(self):
+        self.trackers = []
+        def factory():
+            self.trackers.append(FakeTracker())
+            return self.trackers[-1]
+        self.pool = TrackerPool(max_size=1, idle_timeout=60, tracker_factory=factory)
+
+    def test_clients_beyond_the_limit_are_rejected(self):
+        """A full pool turns new clients away instead of taking over an active client's tracker"""
+        self.pool.process_frame("a", None)
+        with self.assertRaises(TrackerPoolFull):
+            self.pool.process_frame("b", None)
+        self.assertEqual(self.trackers[0].resets, 0)
+
+        self.pool.release("a")
+        self.pool.process_frame("b", None)
+        self.assertEqual(len(self.trackers), 1)  # The released graph is reused
+
+    def test_released_lease_is_not_used_concurrently(self):
+        """A frame whose lease was released mid-flight never shares the tracker with the next lease"""
+        stale = self.pool.acquire("a")
+        self.pool.release("a")
+        lease = self.pool.acquire("b")
+        self.assertIs(stale.tracker, lease.tracker)
+        self.assertIs(lease.pooled.owner, lease)  # The stale lease no longer owns the tracker
+
+        # "a" gets a lease again after "b" leaves, while "b" is still processing a frame
+        def release_during_frame():
+            thread = threading.Thread(target=self.pool.release, args=("b",))
+            thread.start()
+            thread.join(0.05)
+        self.pool.process_frame("b", release_during_frame)
+        self.pool.process_frame("a", None)
+        self.assertEqual(self.trackers[0].overlaps, 0)
+        self.assertEqual(len(self.pool), 1)
+
+    def test_idle_leases_are_evicted_for_new_clients(self):
+        """A client that stopped sending frames frees its tracker for a waiting one"""
+        self.pool.idle_timeout = 0.01
+        self.pool.process_frame("a", None)
+        threading.Event().wait(0.02)
+        self.pool.process_frame("b", None)
+        self.assertEqual(self.trackers[0].resets, 1)
+
+    def test_building_a_tracker_does_not_block_other_clients(self):
+        """acquire() for a client with a tracker returns while another client's tracker is built"""
+        self.pool.max_size = 2
+        self.pool.process_frame("a", None)
+        building, finish = threading.Event(), threading.Event()
+        factory = self.pool.tracker_factory
+        def slow_factory():
+            building.set()
+            finish.wait(5)
+            return factory()
+        self.pool.tracker_factory = slow_factory
+        thread = threading.Thread(target=self.pool.acquire, args=("b",))
+        thread.start()
+        building.wait(5)
+
+        acquired = threading.Thread(target=self.pool.acquire, args=("a",))
+        acquired.start()
+        acquired.join(1)
+        self.assertFalse(acquired.is_alive())
+        with self.assertRaises(TrackerPoolFull):
+            self.pool.acquire("c")  # The slot being built is reserved
+        finish.set()
+        thread.join(5)
+        self.assertEqual(len(self.pool), 2)
+
+    def test_failed_build_frees_its_slot(self):
+        """A tracker that fails to build doesn't keep its reserved slot"""
+        factory = self.pool.tracker_factory
+        def failing_factory():
+            raise RuntimeError("MediaPipe failed to load")
+        self.pool.tracker_factory = failing_factory
+        with self.assertRaises(RuntimeError):
+            self.pool.acquire("a")
+        self.pool.tracker_factory = factory
+        self.pool.process_frame("a", None)
+        self.assertEqual(len(self.pool), 1)
+
+    def test_release_does_not_wait_for_a_running_frame(self):
+        """Releasing a lease returns at once; the tracker is reset before the next lease uses it"""
+        released = []
+        def release_during_frame():
+            thread = threading.Thread(target=self.pool.release, args=("a",))
+            thread.start()
+            thread.join(1)
+            released.append(not thread.is_alive())
+        self.pool.process_frame("a", release_during_frame)
+        self.assertEqual(released, [True])
+        self.assertEqual(self.trackers[0].resets, 0)
+        self.pool.process_frame("b", None)
+        self.assertEqual(self.trackers[0].resets, 1)
+        self.assertEqual(self.trackers[0].overlaps, 0)
+
+    def test_ready_once_a_tracker_was_built(self):
+        """The pool reports ready after the first tracker was built, with or without warm_up()"""
+        self.assertFalse(self.pool.ready.is_set())
+        self.pool.process_frame("a", None)
+        self.assertTrue(self.pool.ready.is_set())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,14 @@
 import unittest
+import asyncio
 import json
 import sys
 import os
 
+import numpy as np
+
+# The Python server modules live in ../python
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+
 # Mock WebSocket server implementation for testing
 class MockWebSocketServer:
     def __init__(self):
@@ -159,5 +165,190 @@ class TestWebSocketServer(unittest.TestCase):
         self.assertEqual(session_data["drawing_layers"][2]["layer_id"], "foreground")
         self.assertEqual(session_data["drawing_layers"][2]["zIndex"], 2)
 
+class FakeWebSocket:
+    """Feeds JSON messages to WebSocketServer.handle_client and records what is sent back"""
+    def __init__(self, messages):
+        self.messages = messages
+        self.sent = []
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for message in self.messages:
+            yield json.dumps(message)
+
+    async def send(self, message):
+        self.sent.append(message)
+
+class TestPerClientGestures(unittest.TestCase):
+    """Gesture debouncing and strokes of the real server, with hand tracking stubbed out"""
+    def setUp(self):
+        from websocket_server import WebSocketServer
+        self.server = WebSocketServer()
+        self.session_id = self.server.create_session()
+        self.frames = {}  # client key -> list of (points, gesture) results to return
+
+        async def fake_inference(client_key, image_data):
+            points, gesture = self.frames[client_key].pop(0)
+            return points, gesture, tuple(points[8, :2].tolist())
+        self.server.inference.process_frame = fake_inference
+
+    def hand(self, x, y):
+        points = np.zeros((21, 3), dtype=np.float32)
+        points[8] = (x, y, 0)
+        return points
+
+    def run_frame(self, websocket, client_key):
+        asyncio.run(self.server.process_frame(websocket, self.session_id, client_key, b""))
+
+    def test_clients_debounce_gestures_separately(self):
+        """An idle participant isn't drawn while another one draws"""
+        drawer, watcher = object(), object()
+        self.frames["a"] = [(self.hand(0.1 + 0.05 * i, 0.5), "drawing") for i in range(6)]
+        self.frames["b"] = [(self.hand(0.9, 0.1), "idle") for _ in range(6)]
+        for _ in range(6):
+            self.run_frame(drawer, "a")
+            self.run_frame(watcher, "b")
+
+        canvas = self.server.sessions[self.session_id]["canvas"].get_canvas()
+        self.assertTrue((canvas[240] < 255).any())  # The drawer's stroke
+        self.assertTrue((canvas[:100, 500:] == 255).all())  # Nothing near the idle hand
+        self.assertEqual(self.server.gesture_states[watcher]["prev_gesture"], "idle")
+        self.assertEqual(self.server.gesture_states[drawer]["prev_gesture"], "drawing")
+
+    def test_strokes_of_clients_are_not_joined(self):
+        """Two participants drawing at once each continue their own stroke"""
+        left, right = object(), object()
+        self.frames["a"] = [(self.hand(0.1, 0.2 + 0.02 * i), "drawing") for i in range(6)]
+        self.frames["b"] = [(self.hand(0.9, 0.2 + 0.02 * i), "drawing") for i in range(6)]
+        for _ in range(6):
+            self.run_frame(left, "a")
+            self.run_frame(right, "b")
+
+        canvas = self.server.sessions[self.session_id]["canvas"].get_canvas()
+        self.assertTrue((canvas[:, 200:440] == 255).all())  # No line across the canvas
+
+    def test_undo_action_does_not_undo_server_canvas(self):
+        """The web client's local undo notification leaves the shared canvas alone; "undo" undoes it"""
+        canvas = self.server.sessions[self.session_id]["canvas"]
+        canvas.draw((0.1, 0.5))
+        canvas.draw((0.5, 0.5))
+        canvas.reset_previous_points()
+        drawn = canvas.get_canvas().copy()
+
+        websocket = FakeWebSocket([{"type": "undo_action", "session_id": self.session_id}])
+        self.server.client_sessions[websocket] = self.session_id
+        asyncio.run(self.server.handle_client(websocket))
+        np.testing.assert_array_equal(canvas.get_canvas(), drawn)
+
+        websocket = FakeWebSocket([{"type": "undo"}])
+        self.server.client_sessions[websocket] = self.session_id
+        asyncio.run(self.server.handle_client(websocket))
+        self.assertTrue((canvas.get_canvas() == 255).all())
+
+class TestSessionRestore(unittest.TestCase):
+    def test_unindexed_session_is_restored_from_mongodb(self):
+        """create_session restores a saved canvas even before the session index has loaded"""
+        from canvas import Canvas
+        from websocket_server import WebSocketServer
+        server = WebSocketServer()
+        saved = Canvas()
+        saved.draw_line((10, 10), (200, 200), (0, 0, 255))
+
+        async def get_session(session_id):
+            return {"sessionId": session_id, "roomId": "room-1", "canvasData": saved.to_data_url()}
+
+        async def create_user(user_name, session_id, room_id):
+            return True, {}
+        server.session_db.get_session = get_session
+        server.session_db.create_user = create_user
+        self.assertNotIn("saved", server.session_index)
+
+        websocket = FakeWebSocket([{"type": "create_session", "user_name": "ana",
+                                    "room_id": "room-1", "session_id": "saved"}])
+        asyncio.run(server.handle_client(websocket))
+        np.testing.assert_array_equal(server.sessions["saved"]["canvas"].get_canvas(), saved.get_canvas())
+
+    def test_hibernated_session_is_rehydrated_on_join(self):
+        """Joining a hibernated session brings it back through the async rehydrate path"""
+        import tempfile
+        from session_store import SessionStore
+        from websocket_server import WebSocketServer
+        server = WebSocketServer()
+        directory = tempfile.mkdtemp()
+        server.sessions = SessionStore(server.new_session_state, server.new_canvas, directory=directory)
+        session_id = server.create_session()
+        server.sessions[session_id]["canvas"].draw_line((10, 10), (200, 200), (0, 0, 255))
+        drawn = server.sessions[session_id]["canvas"].get_canvas().copy()
+        self.assertTrue(server.sessions.hibernate(session_id))
+        self.assertNotIn(session_id, server.sessions)
+
+        async def create_user(user_name, session_id, room_id):
+            return True, {}
+        server.session_db.create_user = create_user
+        websocket = FakeWebSocket([{"type": "join_session", "user_name": "ana", "session_id": session_id}])
+        asyncio.run(server.handle_client(websocket))
+        self.assertEqual(server.sessions.rehydrations, 1)
+        np.testing.assert_array_equal(server.sessions[session_id]["canvas"].get_canvas(), drawn)
+        os.rmdir(directory)
+
+class TestHealthChecks(unittest.TestCase):
+    """The HTTP health check endpoints answered by the real server's process_request hook"""
+    def setUp(self):
+        from websocket_server import WebSocketServer
+        self.server = WebSocketServer()
+        self.server.started_at = 0
+
+    def get(self, *paths):
+        """GET each path from a listening server; returns [(status, JSON body or None)]"""
+        import websockets
+
+        async def request(port, path):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("ascii"))
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            status = int(head.split()[1])
+            length = [line.split(b":")[1] for line in head.split(b"\r\n") if line.lower().startswith(b"content-length")]
+            body = await reader.readexactly(int(length[0])) if length else b""
+            writer.close()
+            return status, head, body
+
+        async def run():
+            async with websockets.serve(self.server.handle_client, "127.0.0.1", 0,
+                                        process_request=self.server.process_request) as listening:
+                port = listening.sockets[0].getsockname()[1]
+                return [await request(port, path) for path in paths]
+        return asyncio.run(run())
+
+    def test_health_is_ok_before_hand_tracking_loads(self):
+        (status, head, body), = self.get("/health")
+        self.assertEqual(status, 200)
+        self.assertIn(b"Content-Type: application/json", head)
+        self.assertFalse(json.loads(body)["inference_ready"])
+
+    def test_ready_once_hand_tracking_has_loaded(self):
+        """/ready returns 503 until the first tracker is built, then 200"""
+        (status, _, body), = self.get("/ready?probe=1")
+        self.assertEqual(status, 503)
+        self.assertFalse(json.loads(body)["inference_ready"])
+
+        self.server.inference.tracker_pool.ready.set()
+        (status, _, body), = self.get("/ready")
+        self.assertEqual(status, 200)
+        self.assertTrue(json.loads(body)["inference_ready"])
+
+    def test_other_paths_are_upgraded_to_websockets(self):
+        (status, _, _), = self.get("/")
+        self.assertNotIn(status, (200, 503))  # Handed on to the WebSocket handshake
+
+    def test_legacy_process_request_signature(self):
+        """websockets < 14 passes (path, headers) and expects a (status, headers, body) tuple"""
+        status, headers, body = asyncio.run(self.server.process_request("/ready", {}))
+        self.assertEqual(status, 503)
+        self.assertIn(("Content-Type", "application/json"), headers)
+        self.assertIsNone(asyncio.run(self.server.process_request("/socket", {})))
+
 if __name__ == '__main__':
     unittest.main()